@@ -0,0 +1,49 @@
+"""Workload replay for the CockroachDB MCP Server.
+
+Replays a workload log captured with `--capture-file` (or MCP_WORKLOAD_CAPTURE)
+against a database with concurrent workers, and prints the latency comparison
+with the capture as JSON. Use it to validate schema and index changes.
+
+Usage:
+    python benchmarks/replay_workload.py workload.log --url postgresql://root@localhost:26257/defaultdb \
+        [--workers 4] [--speed 1] [--include-writes] [--limit N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.common.workload import load_workload, replay_workload
+
+
+async def replay(args) -> dict:
+    import asyncpg
+
+    entries = load_workload(args.path, read_only=not args.include_writes, limit=args.limit)
+    pool = await asyncpg.create_pool(args.url, min_size=0, max_size=args.workers, command_timeout=60)
+    try:
+        return await replay_workload(pool, entries, args.workers, args.speed)
+    finally:
+        await pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Workload log to replay")
+    parser.add_argument("--url", required=True, help="Connection URI of the database to replay against")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent workers")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed relative to the capture, 0 for back to back")
+    parser.add_argument("--include-writes", action="store_true", help="Also replay write statements")
+    parser.add_argument("--limit", type=int, help="Maximum number of statements to replay")
+    args = parser.parse_args()
+
+    report = asyncio.run(replay(args))
+    print(json.dumps(report, indent=2, default=str))
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
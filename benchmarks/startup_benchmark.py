@@ -0,0 +1,109 @@
+"""Startup benchmark for the CockroachDB MCP Server.
+
+Spawns the server over stdio, as MCP clients do for every session, and measures the
+time until it answers `initialize`, then `tools/list` (which loads the tool modules).
+Exits with a non-zero status when the median time to `initialize` exceeds the budget.
+
+Most of the startup time is spent importing the MCP SDK (its `mcp.types` models alone
+take about 150 ms), which the server needs to answer `initialize`. The time for a
+process that only imports the SDK is reported too, as the floor of the measurements.
+On the reference machine, the medians were about 470-630 ms to `initialize` and
+550-720 ms to `tools/list`, with an SDK import floor of about 430-530 ms.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 10] [--budget-ms 700]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-03-26",
+        "capabilities": {},
+        "clientInfo": {"name": "startup-benchmark", "version": "0.1.0"}
+    }
+}
+INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+LIST_TOOLS = {"jsonrpc": "2.0", "id": 2, "method": "tools/list"}
+
+
+def send(process, message):
+    process.stdin.write(json.dumps(message) + "\n")
+    process.stdin.flush()
+
+
+def wait_for_response(process, request_id):
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("The server exited before answering")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+
+def measure_once():
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", "from src.main import main; main()"],
+        cwd=REPO_DIR,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
+    )
+    try:
+        send(process, INITIALIZE)
+        wait_for_response(process, 1)
+        initialize_time = time.perf_counter() - start
+
+        send(process, INITIALIZED)
+        send(process, LIST_TOOLS)
+        tools = wait_for_response(process, 2)["result"]["tools"]
+        list_tools_time = time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+    return initialize_time, list_tools_time, len(tools)
+
+
+def measure_sdk_import():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import mcp.server.fastmcp"], cwd=REPO_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Number of server starts to measure (default: 10)")
+    parser.add_argument("--budget-ms", type=float, default=700, help="Budget for the median time to initialize (default: 700)")
+    args = parser.parse_args()
+
+    # The first start may compile bytecode, which clients only pay once
+    measure_once()
+
+    results = [measure_once() for _ in range(args.runs)]
+    initialize_ms = statistics.median(r[0] for r in results) * 1000
+    list_tools_ms = statistics.median(r[1] for r in results) * 1000
+    sdk_import_ms = statistics.median(measure_sdk_import() for _ in range(args.runs)) * 1000
+
+    print(f"initialize: {initialize_ms:.1f} ms (median of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print(f"tools/list: {list_tools_ms:.1f} ms ({results[0][2]} tools)")
+    print(f"MCP SDK import: {sdk_import_ms:.1f} ms (floor)")
+
+    if initialize_ms > args.budget_ms:
+        print("Startup is over budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from src.common.config import MCP_CONFIG
+
+# Tools are admitted by workload class. Tools not listed here are interactive.
+TOOL_CLASSES = {
+    "introspection": [
+        "get_cluster_status",
+        "show_running_queries",
+        "get_replication_status",
+        "find_hot_ranges",
+        "analyze_performance",
+        "advise_indexes",
+        "get_active_connections",
+        "get_database_settings",
+        "describe_table",
+        "analyze_schema",
+        "table_stats",
+    ],
+    "admin": [
+        "connect_database",
+        "create_database",
+        "drop_database",
+        "create_table",
+        "drop_table",
+        "bulk_import",
+        "batched_mutation",
+        "manage_job",
+        "create_index",
+        "drop_index",
+        "create_view",
+        "drop_view",
+        "replay_workload",
+    ],
+}
+
+# Additional limits for the heaviest tools, applied before their class limit
+TOOL_CONCURRENCY = {
+    "analyze_performance": 2,
+    "advise_indexes": 1,
+    "get_replication_status": 2,
+    "tail_table": 4,
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """A concurrency limit with a bounded queue of waiting calls."""
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.semaphore = asyncio.Semaphore(limit)
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_duration = 0.0
+
+    def retry_after(self) -> float:
+        # Time for the calls ahead of a new one to drain, from the average call duration
+        return round(max(1.0, self.avg_duration * (self.waiting + 1) / self.limit), 1)
+
+    async def acquire(self, deadline: float):
+        if not self.semaphore.locked():
+            # A slot is free, this does not wait
+            await self.semaphore.acquire()
+        elif self.waiting >= self.queue_size:
+            self.rejected += 1
+            raise AdmissionRejected(f"Too many concurrent {self.name} calls, try again later", self.retry_after())
+        else:
+            self.waiting += 1
+            try:
+                timeout = max(0.0, deadline - time.monotonic())
+                await asyncio.wait_for(self.semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise AdmissionRejected(f"Timed out waiting for a slot for {self.name} calls, try again later", self.retry_after())
+            finally:
+                self.waiting -= 1
+
+        self.running += 1
+        self.admitted += 1
+
+    def release(self, duration: float):
+        self.running -= 1
+        self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration if self.avg_duration else duration
+        self.semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_duration": self.avg_duration
+        }
+
+
+class AdmissionController:
+    """Admits tool calls through per-tool and per-class gates.
+
+    Each workload class has its own concurrency limit, so a burst of heavy
+    introspection or DDL calls cannot take the connections interactive queries need.
+    Calls wait in a bounded queue up to a deadline, and are rejected with a
+    retry-after hint when the queue is full or the deadline passes.
+    """
+
+    def __init__(self):
+        queue_size = MCP_CONFIG["admission_queue_size"]
+        self.classes = {
+            "interactive": AdmissionGate("interactive", MCP_CONFIG["interactive_concurrency"], queue_size),
+            "introspection": AdmissionGate("introspection", MCP_CONFIG["introspection_concurrency"], queue_size),
+            "admin": AdmissionGate("admin", MCP_CONFIG["admin_concurrency"], queue_size),
+        }
+        self.tools = {
+            tool: AdmissionGate(tool, limit, queue_size) for tool, limit in TOOL_CONCURRENCY.items()
+        }
+
+    def classify(self, tool_name: str) -> str:
+        for workload_class, tools in TOOL_CLASSES.items():
+            if tool_name in tools:
+                return workload_class
+        return "interactive"
+
+    def gates(self, tool_name: str) -> List[AdmissionGate]:
+        tool_gate: Optional[AdmissionGate] = self.tools.get(tool_name)
+        class_gate = self.classes[self.classify(tool_name)]
+        return [tool_gate, class_gate] if tool_gate else [class_gate]
+
+    @asynccontextmanager
+    async def admit(self, tool_name: str) -> AsyncIterator[None]:
+        deadline = time.monotonic() + MCP_CONFIG["admission_timeout"]
+        acquired: List[AdmissionGate] = []
+        start_time = time.monotonic()
+        try:
+            for gate in self.gates(tool_name):
+                await gate.acquire(deadline)
+                acquired.append(gate)
+            start_time = time.monotonic()
+            yield
+        finally:
+            duration = time.monotonic() - start_time
+            for gate in reversed(acquired):
+                gate.release(duration)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "classes": {name: gate.stats() for name, gate in self.classes.items()},
+            "tools": {name: gate.stats() for name, gate in self.tools.items()}
+        }
+
+_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    # Built on first use, once the CLI configuration has been applied
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+
+    return _controller
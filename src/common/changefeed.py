@@ -0,0 +1,99 @@
+import asyncio
+import json
+import re
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+# Called with the table name and the primary keys of the rows changed in a batch of
+# changefeed events, e.g. to invalidate local caches
+_change_listeners: List[Callable[[str, List[Any]], None]] = []
+
+_COPY_ESCAPE = re.compile(r"\\(?:([0-7]{1,3})|(.))")
+_COPY_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+# A resolved (HLC) timestamp: wall time in nanoseconds, and an optional logical counter
+_CURSOR = re.compile(r"^\d+(\.\d+)?$")
+
+
+def on_table_change(listener: Callable[[str, List[Any]], None]) -> Callable[[str, List[Any]], None]:
+    """Register a listener for the row changes seen by changefeeds. Can be used as a decorator."""
+    _change_listeners.append(listener)
+    return listener
+
+
+def notify_table_change(table: str, keys: List[Any]):
+    for listener in _change_listeners:
+        try:
+            listener(table, keys)
+        except Exception as e:
+            print(f"Change listener failed for {table}: {e}", file=sys.stderr)
+
+
+def changefeed_statement(table: str, resolved: float, cursor: Optional[str] = None, diff: bool = False,
+                         experimental: bool = False) -> str:
+    """A core changefeed on a table, streamed through COPY so that rows arrive as they are emitted.
+
+    Without a cursor, only changes made from now on are emitted, not the current rows.
+    """
+    options = ["updated", f"resolved = '{float(resolved)}s'"]
+    if cursor:
+        if not _CURSOR.fullmatch(cursor):
+            raise ValueError(f"Invalid cursor, expected a resolved timestamp: {cursor}")
+        options.append(f"cursor = '{cursor}'")
+    else:
+        options.append("no_initial_scan")
+    if diff:
+        options.append("diff")
+
+    create = "EXPERIMENTAL CHANGEFEED FOR" if experimental else "CREATE CHANGEFEED FOR TABLE"
+    return f"COPY ({create} {table} WITH {', '.join(options)}) TO STDOUT"
+
+
+def decode_copy_field(field: str) -> Optional[str]:
+    """Decode a field of COPY text output: \\N is NULL, and backslashes escape special characters."""
+    if field == "\\N":
+        return None
+
+    def unescape(match: re.Match) -> str:
+        if match.group(1):
+            return chr(int(match.group(1), 8))
+        return _COPY_ESCAPES.get(match.group(2), match.group(2))
+
+    return _COPY_ESCAPE.sub(unescape, field)
+
+
+def parse_changefeed_row(line: str) -> Dict[str, Any]:
+    """Turn a changefeed row (table, key, value) into a change event, or a resolved timestamp."""
+    table, key, value = (decode_copy_field(field) for field in (line.split("\t") + [None, None])[:3])
+    message = json.loads(value) if value else {}
+    if "resolved" in message:
+        return {"resolved": message["resolved"]}
+
+    event = {
+        "table": table,
+        "key": json.loads(key) if key else None,
+        "operation": "delete" if message.get("after") is None else "upsert",
+        "after": message.get("after"),
+        "updated": message.get("updated")
+    }
+    if "before" in message:
+        event["before"] = message["before"]
+    return event
+
+
+async def read_changefeed(conn, statement: str, buffer: asyncio.Queue):
+    """Stream a changefeed into a bounded buffer.
+
+    When the buffer is full, reading stops until it drains, which holds back the
+    changefeed on the server rather than growing the buffer.
+    """
+    pending = b""
+
+    async def output(chunk: bytes):
+        nonlocal pending
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line:
+                await buffer.put(parse_changefeed_row(line.decode()))
+
+    await conn.copy_from_query(statement, output=output, timeout=None)
@@ -1,8 +1,26 @@
-from dotenv import load_dotenv
 import os
 import urllib.parse
 
-load_dotenv()
+def load_env_file():
+    """Load a .env file into the environment, only importing dotenv when there is one.
+
+    Like dotenv's own lookup, the file is searched in the current directory and in
+    the directories above this package.
+    """
+    directories = [os.getcwd()]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while directory not in directories and os.path.dirname(directory) != directory:
+        directories.append(directory)
+        directory = os.path.dirname(directory)
+
+    for directory in directories:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+
+load_env_file()
 
 CRDB_CONFIG = {
              "host": os.getenv('CRDB_HOST', '127.0.0.1'),
@@ -13,7 +31,63 @@ CRDB_CONFIG = {
              "ssl_ca_cert": os.getenv('CRDB_SSL_CA_PATH', None),
              "ssl_key": os.getenv('CRDB_SSL_KEYFILE', None),
              "ssl_cert": os.getenv('CRDB_SSL_CERTFILE', None),
-             "ssl_mode": os.getenv('CRDB_SSL_MODE', 'disable')}
+             "ssl_mode": os.getenv('CRDB_SSL_MODE', 'disable'),
+             "pool_min_size": int(os.getenv('CRDB_POOL_MIN_SIZE', 5)),
+             "pool_max_size": int(os.getenv('CRDB_POOL_MAX_SIZE', 20)),
+             "introspection_pool_size": int(os.getenv('CRDB_INTROSPECTION_POOL_SIZE', 4)),
+             "admin_pool_size": int(os.getenv('CRDB_ADMIN_POOL_SIZE', 4)),
+             "http_url": os.getenv('CRDB_HTTP_URL', None)}
+
+def parse_session_settings(value: str) -> dict:
+    """Parse session settings given as 'name=value,name=value'."""
+    settings = {}
+    for setting in (value or "").split(","):
+        name, separator, setting_value = setting.partition("=")
+        if separator and name.strip():
+            settings[name.strip()] = setting_value.strip()
+    return settings
+
+# Session settings of the connections of each workload class's pool, on top of which
+# CRDB_<CLASS>_SETTINGS are applied. The application name attributes the statements
+# of each class in the cluster's statement statistics.
+POOL_SETTINGS = {
+             "interactive": {"application_name": "mcp-cockroachdb",
+                             **parse_session_settings(os.getenv('CRDB_INTERACTIVE_SETTINGS'))},
+             "introspection": {"application_name": "mcp-cockroachdb/introspection",
+                               "default_transaction_priority": "low",
+                               "statement_timeout": "60s",
+                               **parse_session_settings(os.getenv('CRDB_INTROSPECTION_SETTINGS'))},
+             "admin": {"application_name": "mcp-cockroachdb/admin",
+                       **parse_session_settings(os.getenv('CRDB_ADMIN_SETTINGS'))}}
+
+MCP_TRANSPORTS = ['stdio', 'sse', 'streamable-http']
+
+# What execute_query does with statements whose plan exceeds the guard thresholds
+GUARD_ACTIONS = ['off', 'reject', 'limit', 'follower_read']
+
+MCP_CONFIG = {
+             "transport": os.getenv('MCP_TRANSPORT', 'stdio'),
+             "host": os.getenv('MCP_HOST', '127.0.0.1'),
+             "port": int(os.getenv('MCP_PORT', 8000)),
+             "keep_alive": int(os.getenv('MCP_KEEP_ALIVE', 75)),
+             "workers": int(os.getenv('MCP_WORKERS', 1)),
+             "graceful_timeout": int(os.getenv('MCP_GRACEFUL_TIMEOUT', 30)),
+             "interactive_concurrency": int(os.getenv('MCP_INTERACTIVE_CONCURRENCY', 14)),
+             "introspection_concurrency": int(os.getenv('MCP_INTROSPECTION_CONCURRENCY', 4)),
+             "admin_concurrency": int(os.getenv('MCP_ADMIN_CONCURRENCY', 2)),
+             "admission_queue_size": int(os.getenv('MCP_ADMISSION_QUEUE_SIZE', 32)),
+             "admission_timeout": float(os.getenv('MCP_ADMISSION_TIMEOUT', 10)),
+             "max_rows": int(os.getenv('MCP_MAX_ROWS', 1000)),
+             "batch_concurrency": int(os.getenv('MCP_BATCH_CONCURRENCY', 8)),
+             "query_guard": os.getenv('MCP_QUERY_GUARD', 'off'),
+             "guard_max_rows": int(os.getenv('MCP_GUARD_MAX_ROWS', 10000000)),
+             "guard_full_scan_rows": int(os.getenv('MCP_GUARD_FULL_SCAN_ROWS', 100000)),
+             "guard_limit_rows": max(1, int(os.getenv('MCP_GUARD_LIMIT_ROWS', 100))),
+             "spill_max_rows": int(os.getenv('MCP_SPILL_MAX_ROWS', 1000000)),
+             "spill_dir": os.getenv('MCP_SPILL_DIR', None),
+             "spill_ttl": int(os.getenv('MCP_SPILL_TTL', 3600)),
+             "spill_budget": int(os.getenv('MCP_SPILL_BUDGET_MB', 1024)) * 1024 * 1024,
+             "workload_capture": os.getenv('MCP_WORKLOAD_CAPTURE', None)}
 
 def parse_crdb_uri(uri: str) -> dict:
     """Parse a CRDB URI and return connection parameters."""
@@ -70,9 +144,25 @@ def parse_crdb_uri(uri: str) -> dict:
 
 def set_crdb_config_from_cli(config: dict):
     for key, value in config.items():
-        if key == 'port':
-            # Keep port as integer
+        if key in ('port', 'pool_min_size', 'pool_max_size', 'introspection_pool_size', 'admin_pool_size'):
+            # Keep port and pool sizes as integers
             CRDB_CONFIG[key] = int(value)
         else:
             # Convert other values to strings
             CRDB_CONFIG[key] = str(value) if value is not None else None
+
+def set_mcp_config_from_cli(config: dict):
+    for key, value in config.items():
+        if key == 'transport' and value not in MCP_TRANSPORTS:
+            raise ValueError(f"Unsupported transport: {value}")
+        if key == 'query_guard' and value not in GUARD_ACTIONS:
+            raise ValueError(f"Unsupported query guard action: {value}")
+        if key == 'admission_timeout':
+            MCP_CONFIG[key] = float(value)
+        elif key in ('port', 'keep_alive', 'workers', 'graceful_timeout', 'interactive_concurrency',
+                     'introspection_concurrency', 'admin_concurrency', 'admission_queue_size', 'max_rows', 'batch_concurrency',
+                     'spill_max_rows', 'spill_ttl', 'spill_budget', 'guard_max_rows', 'guard_full_scan_rows',
+                     'guard_limit_rows'):
+            MCP_CONFIG[key] = int(value)
+        else:
+            MCP_CONFIG[key] = str(value)
@@ -1,54 +1,250 @@
-import asyncpg
+from __future__ import annotations
+import anyio
+import asyncio
+import functools
 import sys
-from typing import Optional, Dict, List
-from src.common.config import CRDB_CONFIG
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional, Tuple
+from src.common.config import CRDB_CONFIG, POOL_SETTINGS
+
+if TYPE_CHECKING:
+    # asyncpg is only imported with the first pool, to keep server startup fast
+    import asyncpg
+    from src.common.pg_connection import CockroachConnection
+
+# Database selected by the client session on whose behalf a connection is acquired.
+# Empty means the pool's own database.
+session_database: ContextVar[str] = ContextVar("session_database", default="")
+
+
+# Workload class of the tool on whose behalf a connection is acquired, which picks its pool
+workload_class: ContextVar[str] = ContextVar("workload_class", default="interactive")
+
+# Seconds to connect and cancel the statements of a session whose caller stopped waiting
+CANCEL_TIMEOUT = 5
 
 
 class CockroachConnectionPool:
-    _instance: Optional[asyncpg.Pool] = None
+    """One connection pool per workload class.
+
+    Interactive, introspection and admin tools get connections from separate pools,
+    each with its own size and session settings, so slow introspection queries or DDL
+    cannot take the connections interactive queries need. The introspection and admin
+    pool sizes are carved out of the connection budget, and the interactive pool gets the rest.
+    A class left with no connections uses the interactive pool.
+    """
+    _pools: Dict[str, asyncpg.Pool] = {}
+    _acquisitions: Dict[str, int] = {}
+    _retired: set = set()
+    _building: Dict[str, asyncio.Lock] = {}
     database_url: str = ""
     current_database:str = ""
-    query_history: List[Dict] = []
 
     @classmethod
-    async def get_connection_pool(cls) -> asyncpg.Pool:
-        url = create_default_url()
-        if not cls._instance or cls._instance._closed:
-            await cls.create_connection_pool(url)
+    async def get_connection_pool(cls, workload: Optional[str] = None) -> asyncpg.Pool:
+        workload = pool_workload(workload or workload_class.get())
+        pool = cls._pools.get(workload)
+        if pool and not pool._closed:
+            return pool
+
+        # Single flight: concurrent first callers wait for one pool instead of each creating theirs
+        async with cls.build_lock(workload):
+            pool = cls._pools.get(workload)
+            if not pool or pool._closed:
+                pool = await cls.create_connection_pool(cls.database_url or create_default_url(), workload)
 
-        return cls._instance
+        return pool
 
     @classmethod
     async def refresh_connection_pool(cls, host: str, port: int, database: str, username: str, password: str, 
                                 sslmode: str, sslcert: str, sslkey: str, sslrootcert: str) -> asyncpg.Pool:
 
         database_url = create_url(host, port, database, username, password, sslmode, sslcert, sslkey, sslrootcert)
-        return await cls.create_connection_pool(database_url)
+        workload = pool_workload(workload_class.get())
+        async with cls.build_lock(workload):
+            return await cls.create_connection_pool(database_url, workload)
+
+    @classmethod
+    def build_lock(cls, workload: str) -> asyncio.Lock:
+        if workload not in cls._building:
+            cls._building[workload] = asyncio.Lock()
+        return cls._building[workload]
 
     @classmethod
-    async def create_connection_pool(cls, database_url: str) -> asyncpg.Pool:
+    async def create_connection_pool(cls, database_url: str, workload: str = "interactive") -> asyncpg.Pool:
+        import asyncpg
+        from src.common.pg_connection import CockroachConnection
+
+        workload = pool_workload(workload)
         try:
             if database_url:
-                cls._instance = await asyncpg.create_pool(
+                min_size, max_size = pool_size(workload)
+                pool = await asyncpg.create_pool(
                     database_url,
-                    min_size=5,
-                    max_size=20,
-                    command_timeout=60
+                    min_size=min_size,
+                    max_size=max_size,
+                    command_timeout=60,
+                    connection_class=CockroachConnection,
+                    server_settings=POOL_SETTINGS.get(workload, {}),
+                    init=init_connection,
+                    setup=functools.partial(bind_session_database, workload=workload),
+                    reset=functools.partial(reset_connection, workload=workload,
+                                            database=extract_database(database_url))
                 )
+                if database_url != cls.database_url:
+                    # The other classes' pools reconnect to the new database on their next use
+                    cls.retire_pools()
+                cls.retire_pool(workload)
+                cls._pools[workload] = pool
+                cls._acquisitions.setdefault(workload, 0)
                 cls.database_url = database_url
                 cls.current_database = extract_database(database_url)
+                return pool
         except Exception as e:
             print(f"Cannot create connection pool: {e}", file=sys.stderr)
             raise
 
-        return cls._instance
+        return cls._pools.get(workload)
+
+    @classmethod
+    async def connect(cls, workload: Optional[str] = None) -> asyncpg.Connection:
+        """Open a connection outside the pools, for statements that hold it for a long time.
+
+        It has the session settings of the workload class, and uses the calling session's database.
+        """
+        import asyncpg
+
+        workload = workload or workload_class.get()
+        conn = await asyncpg.connect(cls.database_url or create_default_url(), server_settings=POOL_SETTINGS.get(workload, {}))
+        database = session_database.get()
+        if database:
+            await conn.execute(f'SET database = "{database}"')
+        return conn
+
+    @classmethod
+    def retire_pool(cls, workload: str):
+        """Close a replaced pool once the connections still in use are released."""
+        pool = cls._pools.pop(workload, None)
+        if pool and not pool._closed:
+            task = asyncio.ensure_future(pool.close())
+            cls._retired.add(task)
+            task.add_done_callback(cls._retired.discard)
+
+    @classmethod
+    def retire_pools(cls):
+        for workload in list(cls._pools):
+            cls.retire_pool(workload)
+
+    @classmethod
+    async def cancel_session_queries(cls, session_id: str):
+        """Cancel the statements running in a session, e.g. when the client stops waiting for them."""
+        pools = [pool for pool in cls._pools.values() if not pool._closed]
+        if not pools:
+            return
+
+        # On a dedicated connection with a deadline: the pools may be exhausted by the statements to cancel
+        conn = await asyncio.wait_for(cls.connect("admin"), CANCEL_TIMEOUT)
+        try:
+            await conn.execute(
+                "CANCEL QUERIES IF EXISTS (SELECT query_id FROM [SHOW CLUSTER QUERIES] WHERE session_id = $1)",
+                session_id, timeout=CANCEL_TIMEOUT
+            )
+        finally:
+            await conn.close(timeout=CANCEL_TIMEOUT)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            workload: {
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "min_size": pool.get_min_size(),
+                "max_size": pool.get_max_size(),
+                "in_use": pool.get_size() - pool.get_idle_size(),
+                "acquisitions": cls._acquisitions.get(workload, 0),
+                "application_name": POOL_SETTINGS.get(workload, {}).get("application_name")
+            }
+            for workload, pool in cls._pools.items() if not pool._closed
+        }
 
     @classmethod
     async def close(cls):
-        if cls._instance:
-            await cls._instance.close()
-            cls.database_url = ""
-            cls.current_database = ""
+        pools = list(cls._pools.values())
+        cls._pools.clear()
+        for pool in pools:
+            await pool.close()
+        cls.database_url = ""
+        cls.current_database = ""
+
+def pool_size(workload: str) -> Tuple[int, int]:
+    """Minimum and maximum size of a workload class's pool.
+
+    All pools together stay within the connection budget (pool_max_size), of which the
+    interactive pool keeps at least one connection. Introspection and admin pools open
+    their connections on demand, and may get none.
+    """
+    budget = max(1, CRDB_CONFIG["pool_max_size"])
+    introspection = max(0, min(CRDB_CONFIG["introspection_pool_size"], budget - 1))
+    admin = max(0, min(CRDB_CONFIG["admin_pool_size"], budget - 1 - introspection))
+    if workload == "introspection":
+        return 0, introspection
+    if workload == "admin":
+        return 0, admin
+
+    max_size = budget - introspection - admin
+    return min(CRDB_CONFIG["pool_min_size"], max_size), max_size
+
+def pool_workload(workload: str) -> str:
+    """The class whose pool serves a workload class: the interactive pool when its own share is empty."""
+    return workload if pool_size(workload)[1] else "interactive"
+
+async def bind_session_database(conn: asyncpg.Connection, workload: str = "interactive"):
+    """Point an acquired connection at the database selected by the calling session."""
+    CockroachConnectionPool._acquisitions[workload] = CockroachConnectionPool._acquisitions.get(workload, 0) + 1
+    database = session_database.get()
+    if database and database != CockroachConnectionPool.current_database:
+        await conn.execute(f'SET database = "{database}"')
+
+async def init_connection(conn: CockroachConnection):
+    conn.session_id = await conn.fetchval("SHOW session_id")
+
+async def reset_connection(conn: CockroachConnection, workload: str = "interactive", database: str = ""):
+    """Put a released connection back on the pool's database and session settings.
+
+    Tools and user statements may change any session variable, and asyncpg does not
+    reset CockroachDB sessions on release, so all of them are reset here.
+    """
+    statements = ["RESET ALL"]
+    if database:
+        statements.append(f'SET database = "{database}"')
+    for name, value in POOL_SETTINGS.get(workload, {}).items():
+        value = str(value).replace("'", "''")
+        statements.append(f"SET {name} = '{value}'")
+    await conn.execute("; ".join(statements))
+
+@asynccontextmanager
+async def statement_scope(conn: CockroachConnection, timeout: Optional[float] = None) -> AsyncIterator[Optional[float]]:
+    """Run statements with a per-call timeout, and stop them on the cluster if the call is aborted.
+
+    Yields the client-side timeout to pass to asyncpg. It leaves the cluster time to
+    enforce `statement_timeout` itself before the client gives up.
+    """
+    client_timeout = None
+    if timeout:
+        await conn.execute(f"SET statement_timeout = '{int(timeout * 1000)}ms'")
+        client_timeout = timeout + 5
+
+    try:
+        yield client_timeout
+    except asyncio.CancelledError:
+        # Nobody is waiting for the result anymore
+        with anyio.CancelScope(shield=True):
+            try:
+                await CockroachConnectionPool.cancel_session_queries(conn.session_id)
+            except Exception as e:
+                print(f"Cannot cancel queries of session {conn.session_id}: {e}", file=sys.stderr)
+        raise
 
 def create_default_url() -> str:
     url = f'''postgresql://{CRDB_CONFIG["username"]}@{CRDB_CONFIG["host"]}:{CRDB_CONFIG["port"]}/{CRDB_CONFIG["database"]}'''
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from src.common.config import MCP_CONFIG
+from src.common.plan import normalize_query, parse_plan, walk_plan
+
+# Number of cached verdicts, and seconds before a verdict is checked again (table statistics change)
+GUARD_CACHE_SIZE = 1024
+GUARD_CACHE_TTL = 300
+
+# Operators that read all their input before returning a row: a LIMIT above them does not stop the scans below
+_BLOCKING_OPERATORS = ("sort", "top-k", "group", "distinct", "window", "hash join", "cross join")
+
+
+def assess_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Judge a parsed plan against the guard thresholds."""
+    reasons = []
+    for node in walk_plan(plan["root"]):
+        rows = node["estimated_rows"] or 0
+        if node["full_scan"] and rows > MCP_CONFIG["guard_full_scan_rows"]:
+            reasons.append(f"full scan of {node.get('table')} (~{rows} rows)")
+        if "cross join" in node["operator"]:
+            reasons.append(f"cross join (~{rows} rows)")
+
+    max_rows = max((node["estimated_rows"] or 0 for node in walk_plan(plan["root"])), default=0)
+    if max_rows > MCP_CONFIG["guard_max_rows"]:
+        reasons.append(f"an operator processes ~{max_rows} rows, above {MCP_CONFIG['guard_max_rows']}")
+
+    return {
+        "allowed": not reasons,
+        "reasons": reasons,
+        "limitable": not any(node["operator"].startswith(_BLOCKING_OPERATORS) for node in walk_plan(plan["root"])),
+        "fingerprint": plan["fingerprint"],
+        "estimated_rows": plan["estimated_rows"],
+        "max_estimated_rows": max_rows,
+        "full_scan_tables": plan["full_scan_tables"],
+        "suggested_indexes": plan["index_recommendations"]
+    }
+
+
+class QueryGuard:
+    """Checks the estimated cost of statements before they run, from their EXPLAIN.
+
+    Statements whose plan scans large tables in full, has cross joins, or processes
+    more rows than allowed are flagged, with the indexes the optimizer recommends.
+    Verdicts are cached per database and statement fingerprint (the normalized
+    statement text), so repeated statements are not explained again.
+    """
+
+    def __init__(self, max_entries: int = GUARD_CACHE_SIZE, ttl: float = GUARD_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.verdicts: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.flagged = 0
+
+    async def check(self, conn, query: str, params: Optional[List[Any]], database: str,
+                    timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The verdict on a statement, or None for statements that cannot be explained."""
+        key = (database, normalize_query(query))
+        cached = self.verdicts.get(key)
+        if cached and time.monotonic() - cached["time"] < self.ttl:
+            self.verdicts.move_to_end(key)
+            self.hits += 1
+            return {**cached["verdict"], "checked": True, "cached": True}
+
+        self.misses += 1
+        try:
+            rows = await conn.fetch(f"EXPLAIN {query}", *(params or []), timeout=timeout)
+        except Exception:
+            # DDL, SET and other statements without a plan, or an EXPLAIN that timed out
+            return None
+
+        verdict = assess_plan(parse_plan([row.get('info', row.get('plan', '')) for row in rows]))
+        if not verdict["allowed"]:
+            self.flagged += 1
+        self.verdicts[key] = {"time": time.monotonic(), "verdict": verdict}
+        while len(self.verdicts) > self.max_entries:
+            self.verdicts.popitem(last=False)
+        return {**verdict, "checked": True, "cached": False}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "action": MCP_CONFIG["query_guard"],
+            "cached_verdicts": len(self.verdicts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flagged": self.flagged
+        }
+
+
+query_guard = QueryGuard()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio
+import json
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from src.common.connection import CockroachConnectionPool
+
+SCHEMA_CHANGE_JOB_TYPES = ["SCHEMA CHANGE", "NEW SCHEMA CHANGE"]
+JOB_ACTIONS = {"pause": "PAUSE JOB", "resume": "RESUME JOB", "cancel": "CANCEL JOB"}
+
+# Last progress sample of each import job, to report the rates between two polls
+_import_samples: Dict[int, Dict[str, Any]] = {}
+
+# Statements left running on their own connection after their job was not found in time
+_background_tasks: set = set()
+
+
+def identifier_pattern(name: str) -> str:
+    """Regular expression matching a whole identifier in a job description, quoted or not."""
+    quoted = re.escape('"' + name.replace('"', '""') + '"')
+    return rf'(^|[^A-Za-z0-9_$"])({re.escape(name)}|{quoted})($|[^A-Za-z0-9_$"])'
+
+
+async def find_job(conn, job_types: List[str], names: List[str], since: datetime) -> Optional[int]:
+    """Find the most recent job of the given types, started by this user, whose description names all of `names`.
+
+    Job descriptions are the formatted statements, with qualified names, so each name is matched
+    as a whole identifier: a job on index "idx" of table "t" does not match "idx_2" or "items".
+    """
+    conditions = " ".join([f"AND description ~ ${i + 3}" for i in range(len(names))])
+    return await conn.fetchval(f"""
+    SELECT job_id FROM [SHOW JOBS]
+    WHERE job_type = ANY($1) AND created >= $2 AND user_name = current_user {conditions}
+    ORDER BY created DESC
+    LIMIT 1
+    """, job_types, since, *[identifier_pattern(name) for name in names])
+
+
+async def submit_schema_change(sql: str, names: List[str], timeout: float = 30) -> Dict[str, Any]:
+    """Run a schema change without waiting for its backfill.
+
+    The statement runs on a dedicated connection rather than a pooled one. As soon as its
+    job shows up in SHOW JOBS, the statement has committed, and the connection is closed:
+    the job keeps running in the cluster and is followed with get_job_status.
+    Statements that complete without a job, or before it is found, return their outcome.
+    Its job is found by the names of the objects the statement changes.
+    """
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    async with pool.acquire() as conn:
+        since = await conn.fetchval("SELECT now()")
+
+    ddl_conn = await CockroachConnectionPool.connect("admin")
+
+    task = asyncio.create_task(ddl_conn.execute(sql, timeout=None))
+    deadline = time.monotonic() + timeout
+    job_id = None
+    try:
+        while time.monotonic() < deadline:
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            async with pool.acquire() as conn:
+                job_id = await find_job(conn, SCHEMA_CHANGE_JOB_TYPES, names, since)
+            if done:
+                task.result()
+                return {"job_id": job_id, "status": "succeeded"}
+            if job_id:
+                return {"job_id": job_id, "status": "running"}
+
+        return {"job_id": None, "status": "running"}
+    finally:
+        if not task.done() and job_id:
+            # Committed: closing the session does not stop the job
+            task.cancel()
+            ddl_conn.terminate()
+        elif not task.done():
+            # Not known to be committed yet, let the statement finish on its own connection
+            _background_tasks.add(task)
+            task.add_done_callback(lambda t: (_background_tasks.discard(t), asyncio.ensure_future(ddl_conn.close())))
+        else:
+            await ddl_conn.close()
+
+
+async def get_job(conn, job_id: int) -> Optional[Dict[str, Any]]:
+    row = await conn.fetchrow(f"""
+    SELECT
+        job_id,
+        job_type,
+        description,
+        user_name,
+        status,
+        running_status,
+        created,
+        started,
+        finished,
+        modified,
+        fraction_completed,
+        error,
+        coordinator_id
+    FROM [SHOW JOB {int(job_id)}]
+    """)
+    if not row:
+        return None
+
+    job = job_progress(dict(row))
+    if job["job_type"] == "IMPORT":
+        job.update(await get_import_progress(conn, job))
+    return job
+
+
+def job_progress(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the elapsed time and a linear estimate of the time remaining to a job row."""
+    started = job.get("started")
+    fraction = job.get("fraction_completed")
+    end = job.get("finished") or datetime.now(timezone.utc)
+
+    elapsed = None
+    if started:
+        if started.tzinfo is None:
+            started = started.replace(tzinfo=timezone.utc)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        elapsed = max(0.0, (end - started).total_seconds())
+
+    remaining = None
+    if job.get("status") == "running" and elapsed is not None and fraction:
+        remaining = elapsed * (1 - fraction) / fraction
+
+    job["elapsed_seconds"] = elapsed
+    job["estimated_seconds_remaining"] = remaining
+    return job
+
+
+async def get_import_progress(conn, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Rows and bytes ingested by an import job, with the average rates and the rates since the previous poll.
+
+    The counts come from the job's progress record. Each index gets an entry count, the
+    primary index one being the number of rows.
+    """
+    try:
+        progress = await conn.fetchval("""
+        SELECT crdb_internal.pb_to_json('cockroach.sql.jobs.jobspb.Progress', progress)
+        FROM crdb_internal.system_jobs
+        WHERE id = $1
+        """, job["job_id"])
+    except Exception:
+        return {}
+    if progress is None:
+        return {}
+
+    summary = (json.loads(progress) if isinstance(progress, str) else progress).get("import", {}).get("summary", {})
+    rows = max([int(count) for count in (summary.get("entryCounts") or {}).values()], default=0)
+    size = int(summary.get("dataSize") or 0)
+
+    now = time.monotonic()
+    elapsed = job.get("elapsed_seconds")
+    result = {
+        "rows": rows,
+        "bytes": size,
+        "rows_per_second": rows / elapsed if elapsed else None,
+        "bytes_per_second": size / elapsed if elapsed else None,
+        "recent_rows_per_second": None,
+        "recent_bytes_per_second": None
+    }
+
+    previous = _import_samples.get(job["job_id"])
+    if previous and now > previous["time"]:
+        result["recent_rows_per_second"] = (rows - previous["rows"]) / (now - previous["time"])
+        result["recent_bytes_per_second"] = (size - previous["bytes"]) / (now - previous["time"])
+    if job["status"] in ("running", "paused", "pending"):
+        _import_samples[job["job_id"]] = {"time": now, "rows": rows, "bytes": size}
+    else:
+        _import_samples.pop(job["job_id"], None)
+
+    return result
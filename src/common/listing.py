@@ -0,0 +1,42 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def listing_query(query: str, params: Optional[List[Any]] = None, columns: Optional[List[str]] = None,
+                  name_column: Optional[str] = None, name_filter: Optional[str] = None,
+                  order_by: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """Wrap a listing query so that projection, filtering and ordering happen in the database.
+
+    Args:
+        query: The listing query, without ORDER BY.
+        params: Parameters of the listing query.
+        columns: Columns to return (default: all columns).
+        name_column: Column matched by `name_filter`.
+        name_filter: Case-insensitive pattern the name column must contain.
+        order_by: ORDER BY expression, applied to the outer query.
+    """
+    params = list(params or [])
+    projection = ", ".join(quote_identifier(col) for col in columns) if columns else "*"
+    wrapped = f"SELECT {projection} FROM ({query}) AS listing"
+
+    if name_filter and name_column:
+        params.append(name_filter)
+        wrapped += f" WHERE {quote_identifier(name_column)}::STRING ILIKE '%' || ${len(params)} || '%'"
+    if order_by:
+        wrapped += f" ORDER BY {order_by}"
+
+    return wrapped, params
+
+
+def listing_result(rows: List[Any], columnar: bool = False) -> Union[List[Dict], Dict[str, List]]:
+    """Return rows as a list of dicts, or in columnar form with column names listed once."""
+    if not columnar:
+        return [dict(row) for row in rows]
+
+    return {
+        "columns": list(rows[0].keys()) if rows else [],
+        "rows": [list(row.values()) for row in rows]
+    }
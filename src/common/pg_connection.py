@@ -0,0 +1,10 @@
+import asyncpg
+
+
+class CockroachConnection(asyncpg.Connection):
+    """A pooled connection that knows its CockroachDB session.
+
+    `session_id` identifies the connection's session on the cluster, so its running
+    statement can be cancelled from another connection.
+    """
+    __slots__ = ('session_id',)
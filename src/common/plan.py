@@ -0,0 +1,191 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from src.common.sql import scan_statement
+
+# Number of queries, and of plans per query, kept in the plan history
+PLAN_HISTORY_QUERIES = 256
+PLAN_HISTORY_DEPTH = 10
+
+_ROW_COUNT = re.compile(r"^[\d,]+")
+_TREE_CHARS = "│├└─ "
+
+
+def parse_row_count(value: Optional[str]) -> Optional[int]:
+    """Parse a row count such as '1,000 (100% of the table; stats collected 2 minutes ago)'."""
+    match = _ROW_COUNT.match(value or "")
+    return int(match.group(0).replace(",", "")) if match else None
+
+
+def parse_plan(lines: List[str]) -> Dict[str, Any]:
+    """Parse the text output of EXPLAIN or EXPLAIN ANALYZE into a tree.
+
+    Plan-level attributes (distribution, vectorized, timings) come before the tree.
+    Each operator starts with a bullet, its position giving its depth, and is
+    followed by its attributes. Index recommendations come after the tree.
+    """
+    plan: Dict[str, Any] = {"attributes": {}, "root": None, "index_recommendations": []}
+    stack: List[tuple] = []  # (bullet position, node)
+    node: Optional[Dict[str, Any]] = None
+    in_recommendations = False
+
+    for line in lines:
+        if not line.strip():
+            continue
+        if line.startswith("index recommendations"):
+            in_recommendations = True
+            continue
+        if in_recommendations:
+            text = line.strip()
+            if text.startswith("SQL command:"):
+                plan["index_recommendations"].append(text[len("SQL command:"):].strip())
+            continue
+
+        position = line.find("•")
+        if position >= 0:
+            node = {"operator": line[position + 1:].strip(), "attributes": {}, "children": []}
+            while stack and stack[-1][0] >= position:
+                stack.pop()
+            if stack:
+                stack[-1][1]["children"].append(node)
+            elif plan["root"] is None:
+                plan["root"] = node
+            stack.append((position, node))
+            continue
+
+        key, separator, value = line.strip(_TREE_CHARS).partition(":")
+        if not separator:
+            continue
+        attributes = node["attributes"] if node else plan["attributes"]
+        attributes[key.strip()] = value.strip()
+
+    for node in walk_plan(plan["root"]):
+        describe_node(node)
+
+    attributes = plan["attributes"]
+    nodes = list(walk_plan(plan["root"]))
+    plan["distribution"] = attributes.get("distribution")
+    plan["vectorized"] = attributes.get("vectorized") == "true" if "vectorized" in attributes else None
+    plan["full_scan"] = any(node["full_scan"] for node in nodes)
+    plan["full_scan_tables"] = sorted({node["table"] for node in nodes if node["full_scan"] and node.get("table")})
+    plan["estimated_rows"] = plan["root"]["estimated_rows"] if plan["root"] else None
+    plan["fingerprint"] = plan_fingerprint(plan)
+    return plan
+
+
+def describe_node(node: Dict[str, Any]):
+    attributes = node["attributes"]
+    node["estimated_rows"] = parse_row_count(attributes.get("estimated row count"))
+    node["actual_rows"] = parse_row_count(attributes.get("actual row count"))
+    if "table" in attributes:
+        table, _, index = attributes["table"].partition("@")
+        node["table"] = table
+        node["index"] = index or None
+    if "spans" in attributes:
+        node["spans"] = attributes["spans"]
+    node["full_scan"] = "FULL SCAN" in attributes.get("spans", "")
+
+
+def walk_plan(node: Optional[Dict[str, Any]]):
+    if node:
+        yield node
+        for child in node["children"]:
+            yield from walk_plan(child)
+
+
+def plan_shape(node: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The parts of a plan that make it a different plan: operators, indexes and scan kinds, not row estimates."""
+    if not node:
+        return None
+    return {
+        "operator": node["operator"],
+        "index": f"{node.get('table')}@{node.get('index')}" if node.get("table") else None,
+        "full_scan": node["full_scan"],
+        "children": [plan_shape(child) for child in node["children"]]
+    }
+
+
+def plan_fingerprint(plan: Dict[str, Any]) -> str:
+    shape = {"distribution": plan["distribution"], "vectorized": plan["vectorized"], "root": plan_shape(plan["root"])}
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def flatten_plan(node: Optional[Dict[str, Any]], path: str = "") -> Dict[str, Dict[str, Any]]:
+    """Index the nodes of a plan by their position, e.g. '0/1' for the second child of the root."""
+    if not node:
+        return {}
+    path = path or "0"
+    nodes = {path: node}
+    for i, child in enumerate(node["children"]):
+        nodes.update(flatten_plan(child, f"{path}/{i}"))
+    return nodes
+
+
+def diff_plans(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Compare two parsed plans node by node."""
+    changes = []
+    for key in ("distribution", "vectorized"):
+        if before[key] != after[key]:
+            changes.append({"change": key, "before": before[key], "after": after[key]})
+
+    before_nodes, after_nodes = flatten_plan(before["root"]), flatten_plan(after["root"])
+    for path in sorted(set(before_nodes) | set(after_nodes)):
+        old, new = before_nodes.get(path), after_nodes.get(path)
+        if old is None:
+            changes.append({"change": "operator added", "path": path, "after": summarize_node(new)})
+        elif new is None:
+            changes.append({"change": "operator removed", "path": path, "before": summarize_node(old)})
+        elif (old["operator"], old.get("table"), old.get("index"), old["full_scan"]) != \
+                (new["operator"], new.get("table"), new.get("index"), new["full_scan"]):
+            changes.append({"change": "operator changed", "path": path,
+                            "before": summarize_node(old), "after": summarize_node(new)})
+        elif old["estimated_rows"] != new["estimated_rows"]:
+            changes.append({"change": "estimated rows", "path": path,
+                            "before": old["estimated_rows"], "after": new["estimated_rows"]})
+
+    return {
+        "same_plan": before["fingerprint"] == after["fingerprint"],
+        "before_fingerprint": before["fingerprint"],
+        "after_fingerprint": after["fingerprint"],
+        "new_full_scans": sorted(set(after["full_scan_tables"]) - set(before["full_scan_tables"])),
+        "changes": changes
+    }
+
+
+def summarize_node(node: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: node.get(key) for key in ("operator", "table", "index", "spans", "estimated_rows", "full_scan")}
+
+
+def normalize_query(query: str) -> str:
+    statement, _ = scan_statement(query)
+    return " ".join(statement.split())
+
+
+class PlanHistory:
+    """The recent plans of each explained query, to detect and diff plan changes over time."""
+
+    def __init__(self, max_queries: int = PLAN_HISTORY_QUERIES, depth: int = PLAN_HISTORY_DEPTH):
+        self.max_queries = max_queries
+        self.depth = depth
+        self.plans: OrderedDict = OrderedDict()
+
+    def record(self, query: str, plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Add a plan to the history of a query, and return the previous one."""
+        key = normalize_query(query)
+        history = self.plans.pop(key, None) or deque(maxlen=self.depth)
+        self.plans[key] = history
+        while len(self.plans) > self.max_queries:
+            self.plans.popitem(last=False)
+
+        previous = history[-1] if history else None
+        history.append({"timestamp": datetime.now().isoformat(), "fingerprint": plan["fingerprint"], "plan": plan})
+        return previous
+
+    def get(self, query: str) -> List[Dict[str, Any]]:
+        return list(self.plans.get(normalize_query(query), []))
+
+
+plan_history = PlanHistory()
@@ -0,0 +1,145 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Integer types, whose split points can be checked without a round trip
+_INT_TYPES = ("INT", "INT2", "INT4", "INT8", "BIGINT", "SMALLINT", "INTEGER", "SERIAL")
+
+
+def parse_key_component(component: str) -> Optional[str]:
+    """Turn a component of a pretty-printed key (1000, "abc", 1.5) into SQL text, or None."""
+    if not component or component in ("Min", "Max", "NULL", "PrefixEnd") or component.startswith("<"):
+        return None
+    if component.startswith('"') and component.endswith('"'):
+        try:
+            return json.loads(component)
+        except ValueError:
+            return component[1:-1]
+    return component
+
+
+async def read_range_starts(conn, table_name: str, db_schema: str, with_stats: bool = False) -> List[Dict[str, Any]]:
+    """The ranges of a table's primary index, in key order, with the value of the first primary key
+    column at which each starts as text (None when it has none), not checked against the column type.
+
+    Range start keys are read from the range descriptors, e.g. /Table/104/1/1000 for the
+    range of table 104's primary index (1) starting at 1000. With `with_stats`, each range
+    also gets its live key count, from its MVCC statistics.
+    """
+    table_id = await conn.fetchval("SELECT $1::REGCLASS::INT", f'"{db_schema}"."{table_name}"')
+    index_id = await conn.fetchval("""
+    SELECT index_id FROM crdb_internal.table_indexes
+    WHERE descriptor_id = $1 AND index_type = 'primary'
+    """, table_id)
+
+    prefix = f"/Table/{table_id}/{index_id}/"
+    stats = ", crdb_internal.range_stats(start_key) AS stats" if with_stats else ""
+    rows = await conn.fetch(f"""
+    SELECT range_id, start_pretty{stats} FROM crdb_internal.ranges_no_leases
+    WHERE start_pretty LIKE '%' || $1 || '%'
+    ORDER BY start_key
+    """, prefix)
+
+    starts = []
+    for row in rows:
+        key = row["start_pretty"]
+        live_count = None
+        if with_stats and row["stats"]:
+            range_stats = json.loads(row["stats"]) if isinstance(row["stats"], str) else row["stats"]
+            live_count = int(range_stats.get("live_count", range_stats.get("liveCount", 0)))
+        starts.append({
+            "range_id": row["range_id"],
+            "start": parse_key_component(key[key.index(prefix) + len(prefix):].split("/")[0]),
+            "live_count": live_count
+        })
+
+    return starts
+
+
+async def get_primary_ranges(conn, table_name: str, db_schema: str, key_type: str,
+                             with_stats: bool = False) -> List[Dict[str, Any]]:
+    """The ranges of a table's primary index, with the value of the first primary key column at which each starts.
+
+    Ranges whose start cannot be cast to the column type are merged into the previous one.
+    With `with_stats`, each range also gets its live key count, from its MVCC statistics.
+    """
+    starts = await read_range_starts(conn, table_name, db_schema, with_stats)
+    valid = await valid_points(conn, [r["start"] for r in starts if r["start"] is not None], key_type)
+
+    ranges: List[Dict[str, Any]] = []
+    for r in starts:
+        point = r["start"] if r["start"] in valid else None
+        if point is None and ranges:
+            # Not a usable split point: count the range with the previous one
+            ranges[-1]["range_ids"].append(r["range_id"])
+            ranges[-1]["live_counts"].append(r["live_count"])
+        elif point is not None:
+            ranges.append({"start": point, "range_ids": [r["range_id"]], "live_counts": [r["live_count"]]})
+
+    return ranges
+
+
+def is_integer_type(key_type: str) -> bool:
+    return key_type.upper() in _INT_TYPES
+
+
+async def valid_points(conn, points: List[str], key_type: str) -> Set[str]:
+    """The points that can be cast to the key type, checked in one round trip.
+
+    When some cannot, the others are found by checking them one by one.
+    """
+    if is_integer_type(key_type):
+        return {point for point in points if point.lstrip("-").isdigit()}
+    if not points:
+        return set()
+    try:
+        await conn.fetchval(f"SELECT count(p::{key_type}) FROM unnest($1::STRING[]) AS p", points)
+        return set(points)
+    except Exception:
+        return {point for point in points if await is_valid_point(conn, point, key_type)}
+
+
+async def is_valid_point(conn, point: str, key_type: str) -> bool:
+    if is_integer_type(key_type):
+        return point.lstrip("-").isdigit()
+    try:
+        await conn.fetchval(f"SELECT $1::STRING::{key_type}", point)
+        return True
+    except Exception:
+        return False
+
+
+async def get_split_points(conn, table_name: str, db_schema: str, key_type: str,
+                           max_points: Optional[int] = None) -> List[str]:
+    """Values of the first primary key column at which the table's primary index ranges start.
+
+    At most `max_points` evenly spread points are kept, and only those are checked against the column type.
+    """
+    points = [r["start"] for r in await read_range_starts(conn, table_name, db_schema) if r["start"] is not None]
+    if max_points and len(points) > max_points:
+        step = len(points) / max_points
+        points = [points[int(i * step)] for i in range(max_points)]
+
+    valid = await valid_points(conn, points, key_type)
+    return [point for point in points if point in valid]
+
+
+def key_spans(split_points: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Cut the key space at the split points: [(None, p1), (p1, p2), ..., (pn, None)]."""
+    bounds: List[Optional[str]] = [None] + list(dict.fromkeys(split_points)) + [None]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def span_condition(column: str, key_type: str, span: Tuple[Optional[str], Optional[str]],
+                   first_param: int) -> Tuple[str, List[Any]]:
+    """SQL condition restricting `column` to a span, with its parameters numbered from `first_param`."""
+    conditions = []
+    params: List[Any] = []
+    start, end = span
+    if start is not None:
+        params.append(start)
+        conditions.append(f"{column} >= ${first_param + len(params) - 1}::STRING::{key_type}")
+    if end is not None:
+        params.append(end)
+        conditions.append(f"{column} < ${first_param + len(params) - 1}::STRING::{key_type}")
+
+    return " AND ".join(conditions) or "TRUE", params
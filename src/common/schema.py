@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import json
+import sys
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+from src.common.connection import CockroachConnectionPool
+from src.common.listing import quote_identifier
+
+SCHEMA_URI = "cockroachdb://schema/{database}"
+TABLE_URI = "cockroachdb://schema/{database}/{schema}/{table}"
+
+# Seconds during which a schema snapshot is served without checking the descriptor versions
+SCHEMA_CHECK_INTERVAL = 1.0
+
+_SYSTEM_SCHEMAS = "('pg_catalog', 'information_schema', 'crdb_internal', 'pg_extension')"
+
+
+def schema_uri(database: str) -> str:
+    return SCHEMA_URI.format(database=database)
+
+
+def table_uri(database: str, schema: str, table: str) -> str:
+    return TABLE_URI.format(database=database, schema=schema, table=table)
+
+
+async def get_descriptor_versions(conn, database: str) -> Dict[Tuple[str, str], str]:
+    """The descriptor id and version of each table and view of a database. Any schema change bumps them."""
+    rows = await conn.fetch("""
+    SELECT schema_name, name, table_id, version FROM crdb_internal.tables
+    WHERE database_name = $1 AND drop_time IS NULL
+    """, database)
+    return {(row["schema_name"], row["name"]): f"{row['table_id']}.{row['version']}" for row in rows}
+
+
+def schema_version(versions: Dict[Tuple[str, str], str]) -> str:
+    return hashlib.sha256(json.dumps(sorted(versions.values())).encode()).hexdigest()[:16]
+
+
+async def build_schema(conn, database: str) -> Dict[str, Any]:
+    """Read the tables (with their columns, indexes and foreign keys) and the views of a database."""
+    catalog = quote_identifier(database)
+    tables = await conn.fetch(f"""
+    SELECT table_schema, table_name FROM {catalog}.information_schema.tables
+    WHERE table_type = 'BASE TABLE' AND table_schema NOT IN {_SYSTEM_SCHEMAS}
+    ORDER BY table_schema, table_name
+    """)
+    columns = await conn.fetch(f"""
+    SELECT table_schema, table_name, column_name, data_type, is_nullable, column_default
+    FROM {catalog}.information_schema.columns
+    WHERE table_schema NOT IN {_SYSTEM_SCHEMAS}
+    ORDER BY table_schema, table_name, ordinal_position
+    """)
+    indexes = await conn.fetch(f"""
+    SELECT table_schema, table_name, index_name, non_unique, column_name, direction, storing, implicit
+    FROM {catalog}.information_schema.statistics
+    WHERE table_schema NOT IN {_SYSTEM_SCHEMAS}
+    ORDER BY table_schema, table_name, index_name, seq_in_index
+    """)
+    foreign_keys = await conn.fetch(f"""
+    SELECT
+        rc.constraint_schema AS table_schema,
+        rc.table_name,
+        rc.constraint_name,
+        kcu.column_name,
+        rc.referenced_table_name,
+        ref.table_schema AS referenced_schema,
+        ref.column_name AS referenced_column,
+        rc.update_rule,
+        rc.delete_rule
+    FROM {catalog}.information_schema.referential_constraints rc
+    JOIN {catalog}.information_schema.key_column_usage kcu
+        ON kcu.constraint_schema = rc.constraint_schema AND kcu.table_name = rc.table_name
+        AND kcu.constraint_name = rc.constraint_name
+    JOIN {catalog}.information_schema.key_column_usage ref
+        ON ref.constraint_schema = rc.unique_constraint_schema AND ref.table_name = rc.referenced_table_name
+        AND ref.constraint_name = rc.unique_constraint_name AND ref.ordinal_position = kcu.position_in_unique_constraint
+    ORDER BY rc.constraint_schema, rc.table_name, rc.constraint_name, kcu.ordinal_position
+    """)
+    views = await conn.fetch(f"""
+    SELECT table_schema, table_name, view_definition FROM {catalog}.information_schema.views
+    WHERE table_schema NOT IN {_SYSTEM_SCHEMAS}
+    ORDER BY table_schema, table_name
+    """)
+
+    schema: Dict[Tuple[str, str], Dict[str, Any]] = {
+        (row["table_schema"], row["table_name"]): {
+            "schema": row["table_schema"], "name": row["table_name"], "columns": [], "indexes": [], "foreign_keys": []
+        }
+        for row in tables
+    }
+    for row in columns:
+        table = schema.get((row["table_schema"], row["table_name"]))
+        if table:
+            table["columns"].append({
+                "name": row["column_name"],
+                "type": row["data_type"],
+                "nullable": row["is_nullable"] == "YES",
+                "default": row["column_default"]
+            })
+    for row in indexes:
+        table = schema.get((row["table_schema"], row["table_name"]))
+        if not table:
+            continue
+        if not table["indexes"] or table["indexes"][-1]["name"] != row["index_name"]:
+            table["indexes"].append({"name": row["index_name"], "unique": row["non_unique"] == "NO", "columns": [], "storing": []})
+        index = table["indexes"][-1]
+        if row["storing"] == "YES":
+            index["storing"].append(row["column_name"])
+        elif row["implicit"] != "YES":
+            index["columns"].append({"name": row["column_name"], "direction": row["direction"]})
+    for row in foreign_keys:
+        table = schema.get((row["table_schema"], row["table_name"]))
+        if not table:
+            continue
+        if not table["foreign_keys"] or table["foreign_keys"][-1]["name"] != row["constraint_name"]:
+            table["foreign_keys"].append({
+                "name": row["constraint_name"],
+                "columns": [],
+                "referenced_table": f'{row["referenced_schema"]}.{row["referenced_table_name"]}',
+                "referenced_columns": [],
+                "on_update": row["update_rule"],
+                "on_delete": row["delete_rule"]
+            })
+        table["foreign_keys"][-1]["columns"].append(row["column_name"])
+        table["foreign_keys"][-1]["referenced_columns"].append(row["referenced_column"])
+
+    return {
+        "tables": schema,
+        "views": [
+            {"schema": row["table_schema"], "name": row["table_name"], "definition": row["view_definition"]}
+            for row in views
+        ]
+    }
+
+
+class SchemaCache:
+    """Precomputed schema resources of each database, versioned by their descriptor versions.
+
+    Reading a resource only checks the descriptor versions, at most once per check interval,
+    and the bodies are rebuilt when they changed. Every body carries its version, to be
+    compared by clients caching it. Sessions subscribed to a resource are sent an update
+    notification when a refresh finds that it changed.
+    """
+
+    def __init__(self, check_interval: float = SCHEMA_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.snapshots: Dict[str, Dict[str, Any]] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.subscribers: Dict[str, weakref.WeakSet] = {}
+
+    async def get(self, database: str) -> Dict[str, Any]:
+        snapshot = self.snapshots.get(database)
+        if snapshot and time.monotonic() - snapshot["checked"] < self.check_interval:
+            return snapshot
+
+        lock = self.locks.setdefault(database, asyncio.Lock())
+        async with lock:
+            snapshot = self.snapshots.get(database)
+            if snapshot and time.monotonic() - snapshot["checked"] < self.check_interval:
+                return snapshot
+            return await self.refresh(database)
+
+    async def refresh(self, database: str) -> Dict[str, Any]:
+        pool = await CockroachConnectionPool.get_connection_pool("introspection")
+        previous = self.snapshots.get(database)
+        async with pool.acquire() as conn:
+            versions = await get_descriptor_versions(conn, database)
+            if previous and previous["table_versions"] == versions:
+                previous["checked"] = time.monotonic()
+                return previous
+            schema = await build_schema(conn, database)
+
+        version = schema_version(versions)
+        tables = {}
+        for key, table in schema["tables"].items():
+            table_body = {"database": database, "version": versions.get(key), **table}
+            tables[key] = json.dumps(table_body, default=str)
+        body = {
+            "database": database,
+            "version": version,
+            "tables": [
+                {**table, "uri": table_uri(database, table["schema"], table["name"]), "version": versions.get(key)}
+                for key, table in schema["tables"].items()
+            ],
+            "views": [{**view, "version": versions.get((view["schema"], view["name"]))} for view in schema["views"]]
+        }
+        snapshot = {
+            "version": version,
+            "table_versions": versions,
+            "body": json.dumps(body, default=str),
+            "tables": tables,
+            "checked": time.monotonic()
+        }
+        self.snapshots[database] = snapshot
+
+        if previous:
+            changed = [schema_uri(database)] + [
+                table_uri(database, schema_name, table)
+                for (schema_name, table) in set(versions) | set(previous["table_versions"])
+                if versions.get((schema_name, table)) != previous["table_versions"].get((schema_name, table))
+            ]
+            await self.notify(changed)
+        return snapshot
+
+    async def read_schema(self, database: str) -> str:
+        return (await self.get(database))["body"]
+
+    async def read_table(self, database: str, schema: str, table: str) -> str:
+        body = (await self.get(database))["tables"].get((schema, table))
+        if body is None:
+            raise ValueError(f"Table '{schema}.{table}' does not exist in database '{database}'")
+        return body
+
+    def subscribe(self, uri: str, session):
+        self.subscribers.setdefault(uri, weakref.WeakSet()).add(session)
+
+    def unsubscribe(self, uri: str, session):
+        if uri in self.subscribers:
+            self.subscribers[uri].discard(session)
+
+    async def notify(self, uris: List[str]):
+        from pydantic import AnyUrl
+
+        for uri in uris:
+            for session in list(self.subscribers.get(uri, ())):
+                try:
+                    await session.send_resource_updated(AnyUrl(uri))
+                except Exception as e:
+                    print(f"Cannot notify a session of the update of {uri}: {e}", file=sys.stderr)
+
+    async def check_subscribed(self):
+        """Refresh the databases whose resources have subscribers, e.g. after a schema change."""
+        databases = {database for database in self.snapshots
+                     if any(uri == schema_uri(database) or uri.startswith(schema_uri(database) + "/")
+                            for uri, sessions in self.subscribers.items() if len(sessions))}
+        for database in databases:
+            async with self.locks.setdefault(database, asyncio.Lock()):
+                await self.refresh(database)
+
+
+schema_cache = SchemaCache()
@@ -1,24 +1,121 @@
-import asyncpg
-from src.common.connection import CockroachConnectionPool
-from dataclasses import dataclass
-from typing import Dict, List
-from typing import AsyncIterator
+from __future__ import annotations
+import importlib
+import json
+import sys
+from src.common.admission import AdmissionRejected, get_admission_controller
+from src.common.config import MCP_CONFIG
+from src.common.connection import CockroachConnectionPool, session_database, workload_class
+from src.common.schema import schema_cache
+from src.common.session import get_session_state
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional
 from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP
+from mcp.types import TextContent
+
+if TYPE_CHECKING:
+    import asyncpg
+
+# Tool modules register their tools and resources when imported. They are loaded on the
+# first tools or resources request, so the server answers initialize without them.
+TOOL_MODULES = [
+    "src.tools.cluster_monitoring",
+    "src.tools.database_operations",
+    "src.tools.table_management",
+    "src.tools.query_engine",
+]
 
 @dataclass
 class AppContext:
-    pool: asyncpg.Pool
+    pool: Optional[asyncpg.Pool]
 
 @asynccontextmanager
 async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
-    # Initialize on startup
+    # The pool is created by the first tool call rather than on startup, so clients are
+    # not kept waiting for CockroachDB connections. Network transports enter the lifespan
+    # once per client session, so there the shared pool is only closed when the server stops.
     try:
-        pool = await CockroachConnectionPool.get_connection_pool()
-        yield AppContext(pool=pool)
+        yield AppContext(pool=CockroachConnectionPool._pools.get("interactive"))
     finally:
-        await CockroachConnectionPool.close()
+        if MCP_CONFIG["transport"] == "stdio":
+            await CockroachConnectionPool.close()
+
+class CockroachMCP(FastMCP):
+    tools_loaded: bool = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._mcp_server.subscribe_resource()(self.subscribe_resource)
+        self._mcp_server.unsubscribe_resource()(self.unsubscribe_resource)
+
+        # The low-level server does not advertise subscriptions even with their handlers
+        get_capabilities = self._mcp_server.get_capabilities
+        def get_subscribable_capabilities(*args, **kwargs):
+            capabilities = get_capabilities(*args, **kwargs)
+            if capabilities.resources:
+                capabilities.resources.subscribe = True
+            return capabilities
+        self._mcp_server.get_capabilities = get_subscribable_capabilities
+
+    def load_tools(self):
+        if not self.tools_loaded:
+            for module in TOOL_MODULES:
+                importlib.import_module(module)
+            self.tools_loaded = True
+
+    async def list_tools(self):
+        self.load_tools()
+        return await super().list_tools()
+
+    async def list_resources(self):
+        self.load_tools()
+        return await super().list_resources()
+
+    async def list_resource_templates(self):
+        self.load_tools()
+        return await super().list_resource_templates()
+
+    async def read_resource(self, uri):
+        self.load_tools()
+        return await super().read_resource(uri)
+
+    async def subscribe_resource(self, uri):
+        schema_cache.subscribe(str(uri), self._mcp_server.request_context.session)
+
+    async def unsubscribe_resource(self, uri):
+        schema_cache.unsubscribe(str(uri), self._mcp_server.request_context.session)
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]):
+        self.load_tools()
+
+        # Connections acquired while the tool runs are bound to the session's database,
+        # and come from the pool of the tool's workload class
+        state = get_session_state(self.get_context())
+        token = session_database.set(state.current_database)
+        controller = get_admission_controller()
+        class_token = workload_class.set(controller.classify(name))
+        try:
+            async with controller.admit(name):
+                result = await super().call_tool(name, arguments)
+            if controller.classify(name) == "admin" or name in ("execute_query", "execute_transaction"):
+                await self.notify_schema_changes()
+            return result
+        except AdmissionRejected as e:
+            return [TextContent(type="text", text=json.dumps({
+                "success": False,
+                "error": str(e),
+                "retry_after": e.retry_after
+            }))]
+        finally:
+            workload_class.reset(class_token)
+            session_database.reset(token)
+
+    async def notify_schema_changes(self):
+        # The tool may have changed the schema: let the sessions subscribed to schema resources know
+        try:
+            await schema_cache.check_subscribed()
+        except Exception as e:
+            print(f"Cannot check the schema for changes: {e}", file=sys.stderr)
 
 # Initialize FastMCP server if pool is not None
-mcp = FastMCP("CockroachDB MCP Server", lifespan=app_lifespan, json_response=True)
+mcp = CockroachMCP("CockroachDB MCP Server", lifespan=app_lifespan, json_response=True)
@@ -0,0 +1,33 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+from weakref import WeakKeyDictionary
+from mcp.server.fastmcp import Context
+from src.common.connection import CockroachConnectionPool
+
+
+@dataclass
+class SessionState:
+    """State owned by a single MCP client session.
+
+    Sessions share the connection pool but each one keeps its own current
+    database and query history, so concurrent clients of a network transport
+    do not see each other's switches or queries.
+    """
+    current_database: str = ""
+    query_history: List[Dict] = field(default_factory=list)
+
+# Keyed by the MCP ServerSession, so the state goes away with the client session.
+_sessions: "WeakKeyDictionary[object, SessionState]" = WeakKeyDictionary()
+
+def get_session_state(ctx: Context) -> SessionState:
+    session = ctx.session
+    state = _sessions.get(session)
+    if state is None:
+        state = SessionState()
+        _sessions[session] = state
+
+    return state
+
+def get_current_database(ctx: Context) -> str:
+    """Return the database the session works in, defaulting to the pool's database."""
+    return get_session_state(ctx).current_database or CockroachConnectionPool.current_database
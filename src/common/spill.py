@@ -0,0 +1,142 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+import uuid
+from array import array
+from typing import Any, Dict, List, Optional
+from src.common.config import MCP_CONFIG
+
+RESULT_URI = "cockroachdb://results/{result_id}/{page}"
+
+_OFFSET = struct.Struct("<Q")
+
+
+def spill_directory() -> str:
+    directory = MCP_CONFIG["spill_dir"] or os.path.join(tempfile.gettempdir(), "mcp-cockroachdb-results")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def result_uri(result_id: str, page: int) -> str:
+    return RESULT_URI.format(result_id=result_id, page=page)
+
+
+class SpillWriter:
+    """Writes a result set too large to return inline to a local file, to page through it later.
+
+    The `.rows` file has a JSON header with the columns and the page size, followed by one
+    compact JSON array per row. The `.idx` file holds the byte offset of each row and the end
+    offset of the last one, as little-endian 64-bit integers, so any page is read by slicing
+    both files without parsing the rows before it. Writing stops at the disk budget.
+    """
+
+    def __init__(self, columns: List[str], page_size: int):
+        self.result_id = uuid.uuid4().hex
+        self.path = os.path.join(spill_directory(), self.result_id)
+        self.file = open(self.path + ".rows.tmp", "wb")
+        self.columns = columns
+        self.budget = MCP_CONFIG["spill_budget"]
+        self.offsets = array("Q")
+        self.full = False
+
+        header = json.dumps({"columns": columns, "page_size": page_size}, separators=(",", ":")).encode() + b"\n"
+        self.file.write(header)
+        self.size = len(header)
+
+    def write(self, row: Dict[str, Any]) -> bool:
+        """Append a row. Returns False once the budget is reached; the row was not written."""
+        line = json.dumps([row.get(column) for column in self.columns], separators=(",", ":"), default=str).encode() + b"\n"
+        if self.budget and self.size + len(line) + 8 * (len(self.offsets) + 2) > self.budget:
+            self.full = True
+            return False
+        self.offsets.append(self.size)
+        self.file.write(line)
+        self.size += len(line)
+        return True
+
+    def close(self) -> Dict[str, Any]:
+        self.offsets.append(self.size)
+        self.file.close()
+        with open(self.path + ".idx", "wb") as index:
+            index.write(b"".join(_OFFSET.pack(offset) for offset in self.offsets))
+        # The rows file shows up once complete, with its index
+        os.replace(self.path + ".rows.tmp", self.path + ".rows")
+        evict_spills(keep=self.result_id)
+        return {"result_id": self.result_id, "row_count": len(self.offsets) - 1, "bytes": self.size, "full": self.full}
+
+    def discard(self):
+        self.file.close()
+        for path in (self.path + ".rows.tmp", self.path + ".idx"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def read_spill(result_id: str, page: int) -> Dict[str, Any]:
+    """Read a page of a spilled result set."""
+    if not result_id.isalnum():
+        raise ValueError(f"Invalid result id: {result_id}")
+    evict_spills()
+    path = os.path.join(spill_directory(), result_id)
+    if not os.path.exists(path + ".rows"):
+        raise ValueError(f"Result {result_id} does not exist or has expired")
+
+    with open(path + ".rows", "rb") as rows_file, open(path + ".idx", "rb") as index_file:
+        with mmap.mmap(rows_file.fileno(), 0, access=mmap.ACCESS_READ) as rows, \
+                mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            header = json.loads(rows[:rows.find(b"\n")])
+            row_count = len(index) // _OFFSET.size - 1
+            page_size = header["page_size"]
+            pages = max(1, -(-row_count // page_size))
+            if page < 0 or page >= pages:
+                raise ValueError(f"Page {page} is out of range, the result has {pages} pages")
+
+            first, last = page * page_size, min(row_count, (page + 1) * page_size)
+            start = _OFFSET.unpack_from(index, first * _OFFSET.size)[0]
+            end = _OFFSET.unpack_from(index, last * _OFFSET.size)[0]
+            lines = rows[start:end].splitlines()
+
+    return {
+        "result_id": result_id,
+        "page": page,
+        "pages": pages,
+        "row_count": row_count,
+        "columns": header["columns"],
+        "rows": [dict(zip(header["columns"], json.loads(line))) for line in lines],
+        "next_page_uri": result_uri(result_id, page + 1) if page + 1 < pages else None
+    }
+
+
+def evict_spills(keep: Optional[str] = None):
+    """Delete spilled results older than the TTL, then the oldest ones until they fit in the disk budget."""
+    directory = spill_directory()
+    now = time.time()
+    spills = []
+    for name in os.listdir(directory):
+        result_id, _, extension = name.partition(".")
+        if extension != "rows":
+            continue
+        path = os.path.join(directory, result_id)
+        try:
+            stat = os.stat(path + ".rows")
+            size = stat.st_size + (os.path.getsize(path + ".idx") if os.path.exists(path + ".idx") else 0)
+        except OSError:
+            continue
+        spills.append((stat.st_mtime, result_id, path, size))
+
+    spills.sort()
+    total = sum(spill[3] for spill in spills)
+    for mtime, result_id, path, size in spills:
+        expired = MCP_CONFIG["spill_ttl"] and now - mtime > MCP_CONFIG["spill_ttl"]
+        over_budget = MCP_CONFIG["spill_budget"] and total > MCP_CONFIG["spill_budget"]
+        if result_id == keep or not (expired or over_budget):
+            continue
+        for extension in (".rows", ".idx"):
+            try:
+                os.remove(path + extension)
+            except OSError as e:
+                print(f"Cannot remove spilled result {result_id}: {e}", file=sys.stderr)
+        total -= size
@@ -0,0 +1,161 @@
+import re
+from typing import List, Optional, Tuple
+
+# Statements whose result rows can be wrapped in an outer SELECT
+READ_KEYWORDS = {"select", "with", "values", "table"}
+# Statements that can be used as a data source between square brackets
+SHOW_KEYWORDS = {"show"}
+# SHOW forms, by the word after SHOW, that return rows usable as [SHOW ...] data sources
+SHOW_SOURCES = {
+    "backup", "cluster", "columns", "constraints", "create", "databases", "full", "grants", "index",
+    "indexes", "jobs", "job", "keys", "partitions", "queries", "range", "ranges", "regions", "roles",
+    "schedules", "schemas", "sequences", "sessions", "statements", "statistics", "tables", "types",
+    "users", "zone",
+}
+WRITE_KEYWORDS = {"insert", "update", "upsert", "delete"}
+
+_DOLLAR_QUOTE = re.compile(r"\$([A-Za-z_][A-Za-z_0-9]*)?\$")
+
+# An assignment of a literal, optionally cast, to a column: "status = 'archived'", "n = 0", "x = NULL::INT"
+_CONSTANT_ASSIGNMENT = (r"""\s*(?:"(?:[^"]|"")+"|[a-z_][a-z_0-9]*)\s*=\s*"""
+                        r"(?:'(?:[^']|'')*'|[-+]?\d+(?:\.\d+)?|null|true|false)"
+                        r"(?:\s*::\s*[a-z_][a-z_0-9 ]*(?:\[\])?)?\s*")
+_CONSTANT_SET_CLAUSE = re.compile(rf"{_CONSTANT_ASSIGNMENT}(?:,{_CONSTANT_ASSIGNMENT})*", re.IGNORECASE)
+
+
+def scan_statement(query: str) -> Tuple[str, List[Tuple[str, int]]]:
+    """Lightweight lexical pass over a SQL statement.
+
+    Returns the statement without comments and trailing semicolons, and its
+    keywords/identifiers (and semicolons) with their parenthesis depth. String literals, quoted
+    identifiers and dollar-quoted bodies are kept in the text but never reported
+    as words, so their content cannot be mistaken for SQL.
+    """
+    text = []
+    words = []
+    depth = 0
+    i = 0
+    n = len(query)
+    while i < n:
+        c = query[i]
+        if c == "-" and query.startswith("--", i):
+            end = query.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if c == "/" and query.startswith("/*", i):
+            end = query.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            text.append(" ")
+            continue
+        if c in ("'", '"'):
+            end = i + 1
+            while end < n:
+                if query[end] == c:
+                    if end + 1 < n and query[end + 1] == c:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            text.append(query[i:end + 1])
+            i = end + 1
+            continue
+        if c == "$":
+            match = _DOLLAR_QUOTE.match(query, i)
+            if match:
+                end = query.find(match.group(0), match.end())
+                end = n if end < 0 else end + len(match.group(0))
+                text.append(query[i:end])
+                i = end
+                continue
+        if c.isalpha() or c == "_":
+            end = i + 1
+            while end < n and (query[end].isalnum() or query[end] in "_$"):
+                end += 1
+            words.append((query[i:end].lower(), depth))
+            text.append(query[i:end])
+            i = end
+            continue
+        if c == ";":
+            words.append((";", depth))
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        text.append(c)
+        i += 1
+
+    statement = "".join(text).strip()
+    while statement.endswith(";"):
+        statement = statement[:-1].rstrip()
+
+    return statement, words
+
+
+def is_single_statement(statement: str) -> bool:
+    # Scan again without the trailing semicolons: any semicolon left separates statements
+    _, words = scan_statement(statement)
+    return not any(word == ";" for word, _ in words)
+
+
+def is_constant_set_clause(set_clause: str) -> bool:
+    """Whether an UPDATE SET clause only assigns literals, so applying it twice changes nothing more."""
+    statement, _ = scan_statement(set_clause)
+    return bool(_CONSTANT_SET_CLAUSE.fullmatch(statement))
+
+
+def is_read_query(query: str) -> bool:
+    """Whether the statement is a read returning rows (SELECT, UNION, CTE, VALUES, TABLE, SHOW)."""
+    statement, words = scan_statement(query)
+    if not words or words[0][0] not in READ_KEYWORDS | SHOW_KEYWORDS:
+        return False
+    if not is_single_statement(statement):
+        return False
+
+    # A CTE may wrap a mutation (WITH x AS (...) DELETE ...), which cannot be wrapped.
+    return not any(word in WRITE_KEYWORDS for word, _ in words)
+
+
+def has_system_time(words: List[Tuple[str, int]]) -> bool:
+    """Whether the statement itself (not a subquery) has an AS OF SYSTEM TIME clause."""
+    top_level = [word for word, depth in words if depth == 0]
+    return any(top_level[i:i + 4] == ["as", "of", "system", "time"] for i in range(len(top_level) - 3))
+
+
+def apply_row_limit(query: str, limit: int) -> Optional[str]:
+    """Rewrite a read query so that the database returns at most `limit` rows.
+
+    The statement is wrapped in an outer SELECT rather than suffixed, so it keeps
+    working with trailing semicolons, existing LIMIT/OFFSET clauses, UNIONs and CTEs.
+    Returns None when the statement cannot be wrapped: AS OF SYSTEM TIME is only
+    accepted on the top-level statement, and only some SHOW forms are data sources.
+    """
+    if not is_read_query(query):
+        return None
+
+    statement, words = scan_statement(query)
+    if has_system_time(words):
+        return None
+    if words[0][0] in SHOW_KEYWORDS:
+        if len(words) < 2 or words[1][0] not in SHOW_SOURCES:
+            return None
+        return f"SELECT * FROM [{statement}] LIMIT {int(limit)}"
+    return f"SELECT * FROM ({statement}) AS limited_result LIMIT {int(limit)}"
+
+
+def check_system_time(as_of_system_time: str) -> str:
+    """Reject AS OF SYSTEM TIME values that could end the quoted literal they are put in."""
+    if not isinstance(as_of_system_time, str) or "'" in as_of_system_time:
+        raise ValueError(f"Invalid AS OF SYSTEM TIME value: {as_of_system_time}")
+    return as_of_system_time
+
+
+async def resolve_system_time(conn, as_of_system_time: str) -> str:
+    """Turn an AS OF SYSTEM TIME expression into an absolute timestamp, so later pages read the same snapshot."""
+    check_system_time(as_of_system_time)
+
+    if as_of_system_time.startswith("-"):
+        return await conn.fetchval("SELECT (now() + $1::INTERVAL)::TIMESTAMP::STRING", as_of_system_time)
+    if as_of_system_time.lower().startswith("follower_read_timestamp"):
+        return await conn.fetchval("SELECT follower_read_timestamp()::TIMESTAMP::STRING")
+
+    return as_of_system_time
@@ -0,0 +1,35 @@
+import socket
+import uvicorn
+from typing import List, Optional
+from starlette.applications import Starlette
+from src.common.config import MCP_CONFIG
+from src.common.connection import CockroachConnectionPool
+from src.common.server import mcp
+
+def create_http_app(transport: str) -> Starlette:
+    """Build the ASGI application serving the MCP server over a network transport."""
+    if transport == "sse":
+        return mcp.sse_app()
+    elif transport == "streamable-http":
+        return mcp.streamable_http_app()
+    else:
+        raise ValueError(f"Unsupported network transport: {transport}")
+
+async def serve_http(transport: str, sockets: Optional[List[socket.socket]] = None):
+    """Serve every client session from one process and one shared connection pool.
+
+    Pre-forked workers pass the listening socket they inherited from the supervisor.
+    """
+    config = uvicorn.Config(
+        create_http_app(transport),
+        host=MCP_CONFIG["host"],
+        port=MCP_CONFIG["port"],
+        timeout_keep_alive=MCP_CONFIG["keep_alive"],
+        timeout_graceful_shutdown=MCP_CONFIG["graceful_timeout"],
+        log_level=mcp.settings.log_level.lower()
+    )
+    server = uvicorn.Server(config)
+    try:
+        await server.serve(sockets=sockets)
+    finally:
+        await CockroachConnectionPool.close()
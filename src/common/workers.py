@@ -0,0 +1,158 @@
+import os
+import signal
+import socket
+import sys
+import time
+import anyio
+from typing import Dict
+from src.common.config import CRDB_CONFIG, MCP_CONFIG
+from src.common.server import mcp
+from src.common.transport import serve_http
+
+
+def split_pool_budget(worker_count: int) -> Dict[str, int]:
+    """Each worker's share of the connection budget.
+
+    Every workload class with a pool keeps at least one connection per worker, so
+    introspection and admin calls never fall back to the interactive pool. Raises
+    ValueError when the budget is too small for that.
+    """
+    budget = CRDB_CONFIG["pool_max_size"] // worker_count
+    shares = {
+        key: max(1, CRDB_CONFIG[key] // worker_count) if CRDB_CONFIG[key] > 0 else 0
+        for key in ("introspection_pool_size", "admin_pool_size")
+    }
+    # The interactive pool keeps at least one connection: trim the largest share first
+    while sum(shares.values()) > budget - 1 and max(shares.values()) > 1:
+        largest = max(shares, key=shares.get)
+        shares[largest] -= 1
+    if sum(shares.values()) > budget - 1:
+        classes = 1 + sum(1 for share in shares.values() if share)
+        raise ValueError(f"{worker_count} workers need a pool size of at least {worker_count * classes}, "
+                         f"one connection per workload class each, but it is {CRDB_CONFIG['pool_max_size']}")
+
+    return {"pool_max_size": budget, **shares}
+
+
+class PreforkServer:
+    """Supervisor running several worker processes on one shared listening socket.
+
+    The supervisor binds the socket and forks the workers. Each worker runs its own
+    event loop and connection pool, sized so that all pools together stay within the
+    configured connection budget. Workers are respawned when they die. SIGHUP restarts
+    them one at a time, and SIGTERM/SIGINT stop them gracefully.
+    """
+
+    def __init__(self, transport: str, workers: int):
+        if transport != "streamable-http":
+            raise ValueError("Multiple workers are only supported with the streamable-http transport")
+        if not hasattr(os, "fork"):
+            raise ValueError("Multiple workers require a platform supporting fork()")
+        # Refuse a worker count the connection budget cannot cover
+        split_pool_budget(workers)
+
+        self.transport = transport
+        self.worker_count = workers
+        self.workers: Dict[int, int] = {}  # pid -> worker number
+        self.sock: socket.socket = None
+        self.stopping = False
+        self.reloading = False
+
+    def run(self):
+        # Client sessions are not shared between processes, so a request may land on any
+        # worker only if the transport does not keep sessions in memory.
+        mcp.settings.stateless_http = True
+        # Load the tools once, before forking, so the workers share them
+        mcp.load_tools()
+
+        self.sock = socket.create_server((MCP_CONFIG["host"], MCP_CONFIG["port"]), backlog=2048)
+        self.sock.set_inheritable(True)
+
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+
+        for number in range(self.worker_count):
+            self.spawn(number)
+
+        try:
+            while not self.stopping:
+                if self.reloading:
+                    self.reloading = False
+                    self.rolling_restart()
+                self.reap(respawn=True)
+                time.sleep(0.5)
+        finally:
+            for pid in list(self.workers):
+                self.stop_worker(pid)
+            self.sock.close()
+
+    def spawn(self, number: int):
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker()
+        self.workers[pid] = number
+        print(f"Started worker {number} (pid {pid})", file=sys.stderr)
+
+    def run_worker(self):
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        # Split the connection budget and the admission limits between the workers
+        CRDB_CONFIG.update(split_pool_budget(self.worker_count))
+        CRDB_CONFIG["pool_min_size"] = min(CRDB_CONFIG["pool_min_size"], CRDB_CONFIG["pool_max_size"])
+        for key in ("interactive_concurrency", "introspection_concurrency", "admin_concurrency"):
+            MCP_CONFIG[key] = max(1, MCP_CONFIG[key] // self.worker_count)
+
+        exit_code = 0
+        try:
+            anyio.run(serve_http, self.transport, [self.sock])
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def reap(self, respawn: bool = False):
+        while self.workers:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            number = self.workers.pop(pid, None)
+            if number is not None and respawn and not self.stopping:
+                print(f"Worker {number} (pid {pid}) exited, respawning", file=sys.stderr)
+                self.spawn(number)
+
+    def rolling_restart(self):
+        # Stop before starting the replacement, so the connection budget is never exceeded
+        # while the remaining workers keep serving.
+        for pid, number in list(self.workers.items()):
+            if self.stopping:
+                return
+            self.stop_worker(pid)
+            self.spawn(number)
+
+    def stop_worker(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+            return
+
+        deadline = time.monotonic() + MCP_CONFIG["graceful_timeout"] + 5
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def handle_reload(self, signum, frame):
+        self.reloading = True
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
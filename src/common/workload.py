@@ -0,0 +1,276 @@
+from __future__ import annotations
+import asyncio
+import base64
+import datetime
+import gzip
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+from src.common.config import MCP_CONFIG
+from src.common.plan import normalize_query
+from src.common.sql import is_read_query
+
+if TYPE_CHECKING:
+    import asyncpg
+
+
+class WorkloadRecorder:
+    """Writes the statements run by the tools to a local log, to replay them later.
+
+    The log has one compact JSON object per statement or transaction:
+    `t` the wall-clock time it started (seconds since the epoch), `q` the statement (or
+    the list of statements of a transaction), `p` its parameters, `d` its duration, `c`
+    the number of statements in flight when it started, `a` the AS OF SYSTEM TIME expression
+    of the read-only transaction it ran in, if any, and `e` the error if it failed. Statements
+    are logged as executed, with the row limits the tools added.
+    Each process writes its own log, named after the configured path with its start time
+    and process id, e.g. `workload.log.1700000000-1234.gz`, so that workers and restarts
+    never write to the same file. Paths ending in `.gz` are compressed.
+    """
+
+    def __init__(self, path: str):
+        self.path = run_log_path(path, int(time.time()), os.getpid())
+        self.file = gzip.open(self.path, "xt") if self.path.endswith(".gz") else open(self.path, "x", buffering=1)
+        self.in_flight = 0
+
+    @contextmanager
+    def record(self, query: Any, params: Optional[List[Any]] = None,
+               as_of: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Record a statement around its execution. Set `error` in the yielded entry when it fails."""
+        entry: Dict[str, Any] = {"t": round(time.time(), 6), "q": query, "c": self.in_flight}
+        if params:
+            entry["p"] = params
+        if as_of:
+            entry["a"] = as_of
+        self.in_flight += 1
+        start_time = time.monotonic()
+        try:
+            yield entry
+        finally:
+            self.in_flight -= 1
+            entry["d"] = round(time.monotonic() - start_time, 6)
+            try:
+                try:
+                    line = json.dumps(entry, separators=(",", ":"), default=encode_param)
+                except TypeError as e:
+                    # Logged as failed, so that it is not replayed with other parameters
+                    line = json.dumps({**entry, "p": None, "e": f"Parameters cannot be recorded: {e}"},
+                                      separators=(",", ":"), default=str)
+                self.file.write(line + "\n")
+            except Exception as e:
+                print(f"Cannot write to the workload log: {e}", file=sys.stderr)
+
+    def close(self):
+        self.file.close()
+
+
+def run_log_path(path: str, started: int, pid: int) -> str:
+    """The log of one process: the run id goes before the .gz extension."""
+    base, extension = (path[:-3], ".gz") if path.endswith(".gz") else (path, "")
+    return f"{base}.{started}-{pid}{extension}"
+
+
+def run_log_paths(path: str) -> List[str]:
+    """The logs of every process and run written for a configured capture path, or the path itself."""
+    if os.path.isfile(path):
+        return [path]
+    base, extension = (path[:-3], ".gz") if path.endswith(".gz") else (path, "")
+    pattern = re.compile(re.escape(os.path.basename(base)) + r"\.\d+-\d+" + re.escape(extension))
+    directory = os.path.dirname(base) or "."
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if pattern.fullmatch(name))
+    if not paths:
+        raise ValueError(f"No workload log found at {path}")
+    return paths
+
+
+def encode_param(value: Any) -> Dict[str, Any]:
+    """Encode a parameter JSON cannot represent, tagged with its type so it is decoded as such."""
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"$interval": value.total_seconds()}
+    if isinstance(value, uuid.UUID):
+        return {"$uuid": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode()}
+    raise TypeError(f"{type(value).__name__} is not supported")
+
+
+_PARAM_DECODERS = {
+    "$decimal": Decimal,
+    "$datetime": datetime.datetime.fromisoformat,
+    "$date": datetime.date.fromisoformat,
+    "$time": datetime.time.fromisoformat,
+    "$interval": lambda seconds: datetime.timedelta(seconds=seconds),
+    "$uuid": uuid.UUID,
+    "$bytes": base64.b64decode,
+}
+
+
+def decode_param(value: Dict[str, Any]) -> Any:
+    if len(value) == 1:
+        tag, encoded = next(iter(value.items()))
+        if tag in _PARAM_DECODERS:
+            return _PARAM_DECODERS[tag](encoded)
+    return value
+
+
+_recorder: Optional[WorkloadRecorder] = None
+
+def get_workload_recorder() -> Optional[WorkloadRecorder]:
+    """The recorder of the configured capture log, or None when capture is off."""
+    global _recorder
+    if _recorder is None and MCP_CONFIG["workload_capture"]:
+        _recorder = WorkloadRecorder(MCP_CONFIG["workload_capture"])
+
+    return _recorder
+
+@contextmanager
+def capture(query: Any, params: Optional[List[Any]] = None,
+            as_of: Optional[str] = None) -> Iterator[Optional[Dict[str, Any]]]:
+    recorder = get_workload_recorder()
+    if not recorder:
+        yield None
+        return
+
+    with recorder.record(query, params, as_of) as entry:
+        yield entry
+
+
+def load_workload(path: str, read_only: bool = True, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Read the successful statements of a workload log, in start order.
+
+    The path is a log file, or a configured capture path whose per-process logs are merged.
+    """
+    entries = []
+    for log_path in run_log_paths(path):
+        with (gzip.open(log_path, "rt") if log_path.endswith(".gz") else open(log_path)) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line, object_hook=decode_param)
+                if entry.get("e"):
+                    continue
+                queries = entry["q"] if isinstance(entry["q"], list) else [entry["q"]]
+                if read_only and not all(is_read_query(query) for query in queries):
+                    continue
+                entries.append(entry)
+
+    entries.sort(key=lambda e: e["t"])
+    return entries[:limit] if limit else entries
+
+
+async def replay_workload(pool: asyncpg.Pool, entries: List[Dict[str, Any]], workers: int = 4,
+                          speed: float = 1.0) -> Dict[str, Any]:
+    """Replay logged statements with concurrent workers, and compare their latencies with the capture.
+
+    Statements start at their captured offset from the first statement divided by `speed`;
+    a speed of 0 replays them back to back. Transactions are replayed as transactions.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for entry in entries:
+        queue.put_nowait(entry)
+    first = min((entry["t"] for entry in entries), default=0.0)
+
+    results: List[Dict[str, Any]] = []
+    started = time.monotonic()
+
+    async def worker():
+        while not queue.empty():
+            entry = queue.get_nowait()
+            if speed > 0:
+                delay = (entry["t"] - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            lag = max(0.0, time.monotonic() - started - ((entry["t"] - first) / speed if speed > 0 else 0))
+            start_time = time.monotonic()
+            error = None
+            try:
+                async with pool.acquire() as conn:
+                    if isinstance(entry["q"], list):
+                        async with conn.transaction():
+                            for query in entry["q"]:
+                                await conn.fetch(query)
+                    elif entry.get("a"):
+                        async with conn.transaction(readonly=True):
+                            await conn.execute(f"SET TRANSACTION AS OF SYSTEM TIME {entry['a']}")
+                            await conn.fetch(entry["q"], *(entry.get("p") or []))
+                    else:
+                        await conn.fetch(entry["q"], *(entry.get("p") or []))
+            except Exception as e:
+                error = str(e)
+
+            results.append({
+                "query": entry["q"],
+                "original": entry["d"],
+                "replayed": time.monotonic() - start_time,
+                "lag": lag,
+                "error": error
+            })
+
+    await asyncio.gather(*[worker() for _ in range(max(1, workers))])
+    return compare_latencies(results, time.monotonic() - started)
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies:
+        return {"mean": None, "p50": None, "p95": None, "p99": None}
+
+    ordered = sorted(latencies)
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99)
+    }
+
+
+def compare_latencies(results: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    succeeded = [r for r in results if not r["error"]]
+
+    by_statement: Dict[str, Dict[str, Any]] = {}
+    for r in succeeded:
+        key = " ; ".join(r["query"]) if isinstance(r["query"], list) else normalize_query(r["query"])
+        stats = by_statement.setdefault(key, {"statement": key, "original": [], "replayed": []})
+        stats["original"].append(r["original"])
+        stats["replayed"].append(r["replayed"])
+
+    statements = []
+    for stats in by_statement.values():
+        original, replayed = statistics.fmean(stats["original"]), statistics.fmean(stats["replayed"])
+        statements.append({
+            "statement": stats["statement"],
+            "executions": len(stats["original"]),
+            "original_mean": original,
+            "replayed_mean": replayed,
+            "change": (replayed - original) / original if original else None
+        })
+    statements.sort(key=lambda s: s["replayed_mean"] - s["original_mean"], reverse=True)
+
+    return {
+        "statements_replayed": len(results),
+        "errors": len(results) - len(succeeded),
+        "error_samples": [{"query": r["query"], "error": r["error"]} for r in results if r["error"]][:10],
+        "duration": duration,
+        "max_lag": max((r["lag"] for r in results), default=0.0),
+        "original": latency_summary([r["original"] for r in succeeded]),
+        "replayed": latency_summary([r["replayed"] for r in succeeded]),
+        "statements": statements
+    }
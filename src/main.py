@@ -1,11 +1,10 @@
 import sys
+import anyio
 import click
-from src.common.config import parse_crdb_uri, set_crdb_config_from_cli
+from src.common.config import GUARD_ACTIONS, MCP_CONFIG, MCP_TRANSPORTS, parse_crdb_uri, set_crdb_config_from_cli, set_mcp_config_from_cli
 from src.common.server import mcp
-import src.tools.cluster_monitoring
-import src.tools.database_operations
-import src.tools.table_management
-import src.tools.query_engine
+from src.common.transport import serve_http
+from src.common.workers import PreforkServer, split_pool_budget
 
 class CockroachMCPServer:
     def __init__(self):
@@ -13,7 +12,15 @@ class CockroachMCPServer:
 
     def run(self):
         if mcp:
-            mcp.run()
+            transport = MCP_CONFIG["transport"]
+            if transport == "stdio":
+                mcp.run()
+            else:
+                print(f"Serving {transport} on {MCP_CONFIG['host']}:{MCP_CONFIG['port']}", file=sys.stderr)
+                if MCP_CONFIG["workers"] > 1:
+                    PreforkServer(transport, MCP_CONFIG["workers"]).run()
+                else:
+                    anyio.run(serve_http, transport)
 
 @click.command()
 @click.option('--url', help='CockroachDB connection URI (cockroach://<username>:<password>@<host>:<port>/<database> or postgresql://<username>:<password>@<host>:<port>/<database>)')
@@ -26,10 +33,40 @@ class CockroachMCPServer:
 @click.option('--ssl-key', help='Path to SSL Client key file')
 @click.option('--ssl-cert', help='Path to SSL Client certificate file')
 @click.option('--ssl-ca-cert', help='Path to CA (Root) certificate file')
+@click.option('--transport', type=click.Choice(MCP_TRANSPORTS), help='MCP transport. Network transports (sse, streamable-http) serve many clients from one shared connection pool. Default is stdio.')
+@click.option('--http-host', help='Address the sse/streamable-http transport listens on (default: 127.0.0.1)')
+@click.option('--http-port', type=int, help='Port the sse/streamable-http transport listens on (default: 8000)')
+@click.option('--keep-alive', type=int, help='Seconds to keep idle HTTP connections open (default: 75)')
+@click.option('--workers', type=int, help='Number of worker processes sharing the streamable-http socket (default: 1)')
+@click.option('--pool-size', type=int, help='Maximum number of CockroachDB connections, split between workers (default: 20)')
+@click.option('--capture-file', help='Log the statements run by the tools to files named after this path, one per process, to replay them with replay_workload (.gz to compress)')
+@click.option('--query-guard', type=click.Choice(GUARD_ACTIONS), help='What execute_query does with statements whose estimated cost exceeds the guard thresholds (default: off)')
 def cli(url, host, port, db, username, password,
-        ssl_mode, ssl_key, ssl_cert, ssl_ca_cert):
+        ssl_mode, ssl_key, ssl_cert, ssl_ca_cert,
+        transport, http_host, http_port, keep_alive, workers, pool_size, capture_file, query_guard):
     """CockroachDB MCP Server - Model Context Protocol server for CockroachDB."""
 
+    mcp_cfg = {}
+    if transport:
+        mcp_cfg['transport'] = transport
+    if http_host:
+        mcp_cfg['host'] = http_host
+    if http_port:
+        mcp_cfg['port'] = http_port
+    if keep_alive:
+        mcp_cfg['keep_alive'] = keep_alive
+    if workers:
+        mcp_cfg['workers'] = workers
+    if capture_file:
+        mcp_cfg['workload_capture'] = capture_file
+    if query_guard:
+        mcp_cfg['query_guard'] = query_guard
+    set_mcp_config_from_cli(mcp_cfg)
+
+    if MCP_CONFIG['workers'] > 1 and MCP_CONFIG['transport'] != 'streamable-http':
+        click.echo("Error: --workers requires the streamable-http transport", err=True)
+        sys.exit(1)
+
     # Handle CockroachDB URI if provided
     if url:
         try:
@@ -63,6 +100,16 @@ def cli(url, host, port, db, username, password,
         print(f"You are in CLI mode. You must fill in at least one of the two parameters --url or --host to launch the MCP server", file=sys.stderr)
         sys.exit(1)
 
+    if pool_size:
+        set_crdb_config_from_cli({'pool_max_size': pool_size})
+
+    if MCP_CONFIG['workers'] > 1:
+        try:
+            split_pool_budget(MCP_CONFIG['workers'])
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+
     # Start the server
     server = CockroachMCPServer()
     server.run()
@@ -1,8 +1,13 @@
 from mcp.server.fastmcp import Context
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from src.common.server import mcp
 from datetime import datetime
+from collections import deque
+import ssl
+from src.common.config import CRDB_CONFIG
 from src.common.connection import CockroachConnectionPool
+from src.common.session import get_current_database
+from src.common.listing import listing_query, listing_result
 
 @mcp.tool()   
 async def get_cluster_status(ctx: Context, detailed: bool = False) -> Dict[str, Any]:
@@ -50,13 +55,18 @@ async def get_cluster_status(ctx: Context, detailed: bool = False) -> Dict[str,
 
 
 @mcp.tool()   
-async def show_running_queries(ctx: Context, node_id: int = 1, user: str = 'root', min_duration: str = '1:0') -> Dict[str, Any]:
+async def show_running_queries(ctx: Context, node_id: int = 1, user: str = 'root', min_duration: str = '1:0',
+                               columns: Optional[List[str]] = None, name_filter: Optional[str] = None,
+                               columnar: bool = False) -> Dict[str, Any]:
     '''Show currently running queries on the cluster.
     
     Args:
         node_id (int): Node ID to filter (default: 1).
         user (str): Username to filter (default: 'root').
         min_duration (str): Minimum query duration (default: '1:0', format: 'minutes:seconds').
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return queries whose text contains this text (case-insensitive).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
     
     Returns:
         The queries running on the cluster.
@@ -78,69 +88,347 @@ async def show_running_queries(ctx: Context, node_id: int = 1, user: str = 'root
         
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
+
+        query, params = listing_query(query, columns=columns, name_column="query",
+                                      name_filter=name_filter, order_by="start")
         
         async with pool.acquire() as conn:
-            rows = await conn.fetch(query)
+            rows = await conn.fetch(query, *params)
             return {
                 "success": True,
-                "queries": [dict(row) for row in rows]
+                "queries": listing_result(rows, columnar)
             }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @mcp.tool()   
-async def get_replication_status(ctx: Context, table_name: str) -> Dict[str, Any]:
+async def get_replication_status(ctx: Context, table_name: str = "", mode: Optional[str] = None, replication_factor: int = 3,
+                                 page_size: int = 100, after_range_id: int = 0, sample_size: int = 20,
+                                 columnar: bool = False) -> Dict[str, Any]:
     '''Get replication and distribution status for a table or the whole database.
     
     Args:
         table_name (str): Table name to filter (default: "", for all tables).
+        mode (str): "summary" aggregates ranges per table, index and leaseholder locality in the database. "ranges" returns range-level detail one page at a time, in range ID order. "sample" returns a random sample of ranges (default: "ranges" for a table, "summary" otherwise).
+        replication_factor (int): Number of voting replicas each range should have, ranges with fewer are reported as under-replicated (default: 3).
+        page_size (int): Number of ranges per page in "ranges" mode (default: 100).
+        after_range_id (int): In "ranges" mode, start after this range ID. Pass the returned next_range_id to get the next page (default: 0).
+        sample_size (int): Number of ranges in "sample" mode (default: 20).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
     
     Returns:
         Details about range replication for a specific table or the current database.
     '''
+    mode = mode or ("ranges" if table_name else "summary")
+    if mode not in REPLICATION_MODES:
+        return {"success": False, "error": f"Invalid mode: {mode}. Expected one of {', '.join(REPLICATION_MODES)}."}
+
     pool = await CockroachConnectionPool.get_connection_pool()
     if not pool:
         raise Exception("Not connected to database")
 
     try:
+        if table_name:
+            ranges = f"SELECT $1::STRING AS table_name, index_name, range_id FROM [SHOW RANGES FROM TABLE {table_name} WITH INDEXES]"
+            params: List[Any] = [table_name]
+        else:
+            ranges = f"SELECT table_name, index_name, range_id FROM [SHOW RANGES FROM DATABASE {get_current_database(ctx)} WITH INDEXES]"
+            params = []
+
         async with pool.acquire() as conn:
-            if table_name:
-                # Specific table replication
-                query = f"""
-                SELECT 
-                    r.range_id,
-                    r.replicas,
-                    r.voting_replicas,
-                    r.replica_localities,
-                    r.lease_holder,
-                    r.range_size
-                FROM [SHOW RANGES FROM table {table_name}] t
-                left join  crdb_internal.ranges r
-                on r.range_id = t.range_id
-                """
+            if mode == "summary":
+                return await get_replication_summary(conn, ranges, params, replication_factor, columnar)
+
+            if mode == "ranges":
+                params.append(after_range_id)
+                picked = f"SELECT * FROM ({ranges}) AS s WHERE range_id > ${len(params)} ORDER BY range_id LIMIT {int(page_size)}"
             else:
-                # General replication status
-                query = """
-                SELECT 
-                    r.range_id,
-                    r.replicas,
-                    r.voting_replicas,
-                    r.replica_localities,
-                    r.lease_holder,
-                    r.range_size
-                FROM [SHOW RANGES FROM DATABASE """ + CockroachConnectionPool.current_database + """] d
-                left join  crdb_internal.ranges r
-                on r.range_id = d.range_id
-                """
-            
-            rows = await conn.fetch(query)
-            return {
-                "success": True,
-                "replication_status": [dict(row) for row in rows]
-            }
+                picked = f"SELECT * FROM ({ranges}) AS s ORDER BY random() LIMIT {int(sample_size)}"
+
+            # Leases and sizes are only looked up for the picked ranges. Ranges merged away since
+            # they were picked are kept without details, so a page keeps its size.
+            query = f"""
+            WITH picked AS ({picked})
+            SELECT 
+                p.table_name,
+                p.index_name,
+                p.range_id,
+                r.replicas,
+                r.voting_replicas,
+                r.replica_localities,
+                r.lease_holder,
+                r.range_size
+            FROM picked p
+            LEFT JOIN crdb_internal.ranges r
+            ON r.range_id = p.range_id
+            ORDER BY p.range_id
+            """
+            rows = await conn.fetch(query, *params)
+
+        result = {
+            "success": True,
+            "mode": mode,
+            "replication_status": listing_result(rows, columnar)
+        }
+        if mode == "ranges":
+            result["next_range_id"] = rows[-1]["range_id"] if len(rows) == page_size else None
+        return result
     except Exception as e:
         return {"success": False, "error": str(e)}
+
+REPLICATION_MODES = ("summary", "ranges", "sample")
+
+async def get_replication_summary(conn, ranges: str, params: List[Any], replication_factor: int,
+                                  columnar: bool) -> Dict[str, Any]:
+    """Aggregate the ranges in the database, so the response size depends on the schema rather than the range count.
+
+    Ranges are scanned once, grouped per table, index and leaseholder, and the two
+    views (per locality and per leaseholder) are rolled up from those groups.
+    A range holding several indexes is counted once for each of them.
+    """
+    params = params + [replication_factor]
+    rows = await conn.fetch(f"""
+    SELECT 
+        s.table_name,
+        s.index_name,
+        r.lease_holder,
+        n.locality AS lease_holder_locality,
+        count(*) AS range_count,
+        count(*) FILTER (WHERE coalesce(array_length(r.voting_replicas, 1), 0) < ${len(params)}) AS under_replicated_count,
+        coalesce(sum(r.range_size), 0) AS total_size,
+        max(r.range_size) AS max_range_size
+    FROM ({ranges}) AS s
+    JOIN crdb_internal.ranges r
+    ON r.range_id = s.range_id
+    LEFT JOIN crdb_internal.gossip_nodes n
+    ON n.node_id = r.lease_holder
+    GROUP BY s.table_name, s.index_name, r.lease_holder, n.locality
+    """, *params)
+
+    summary: Dict[tuple, Dict[str, Any]] = {}
+    lease_holders: Dict[Any, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["table_name"], row["index_name"], row["lease_holder_locality"])
+        group = summary.setdefault(key, {
+            "table_name": row["table_name"],
+            "index_name": row["index_name"],
+            "lease_holder_locality": row["lease_holder_locality"],
+            "range_count": 0,
+            "under_replicated_count": 0,
+            "total_size": 0,
+            "max_range_size": 0
+        })
+        group["range_count"] += row["range_count"]
+        group["under_replicated_count"] += row["under_replicated_count"]
+        group["total_size"] += row["total_size"]
+        group["max_range_size"] = max(group["max_range_size"], row["max_range_size"] or 0)
+
+        holder = lease_holders.setdefault(row["lease_holder"], {
+            "lease_holder": row["lease_holder"],
+            "lease_holder_locality": row["lease_holder_locality"],
+            "lease_count": 0,
+            "total_size": 0
+        })
+        holder["lease_count"] += row["range_count"]
+        holder["total_size"] += row["total_size"]
+
+    summary_rows = sorted(summary.values(), key=lambda g: (g["table_name"] or "", g["index_name"] or "", g["lease_holder_locality"] or ""))
+    holder_rows = sorted(lease_holders.values(), key=lambda h: h["lease_count"], reverse=True)
+
+    return {
+        "success": True,
+        "mode": "summary",
+        "replication_factor": replication_factor,
+        "range_count": sum(g["range_count"] for g in summary_rows),
+        "under_replicated_count": sum(g["under_replicated_count"] for g in summary_rows),
+        "summary": listing_result(summary_rows, columnar),
+        "lease_holders": listing_result(holder_rows, columnar)
+    }
+    
+@mcp.tool()
+async def find_hot_ranges(ctx: Context, order_by: str = "qps", limit: int = 20, node_id: Optional[int] = None,
+                          heating_factor: float = 1.5) -> Dict[str, Any]:
+    '''Find the ranges receiving the most load, and the ranges getting hotter since the previous calls.
+    
+    Args:
+        order_by (str): Rank ranges by "qps" or "cpu" (default: "qps").
+        limit (int): Number of ranges to return (default: 20).
+        node_id (int, optional): Only report the ranges of this node (default: all nodes).
+        heating_factor (float): A range is reported as heating when its load grew by at least this factor since the previous snapshot with the same node and order_by, or flagged as new when it was not in it (default: 1.5).
     
+    Returns:
+        The hottest ranges with their table, index, key span and load, and the ranges getting hotter.
+    '''
+    if order_by not in HOT_RANGE_METRICS:
+        return {"success": False, "error": f"Invalid order_by: {order_by}. Expected one of {', '.join(HOT_RANGE_METRICS)}."}
+
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    try:
+        hot_ranges = await fetch_hot_ranges(node_id)
+        metric = HOT_RANGE_METRICS[order_by]
+        hot_ranges.sort(key=lambda r: r[metric], reverse=True)
+        top = hot_ranges[:limit]
+
+        # Key spans come from the range descriptors, without looking up leases
+        async with pool.acquire() as conn:
+            spans = await conn.fetch("""
+            SELECT range_id, start_pretty, end_pretty
+            FROM crdb_internal.ranges_no_leases
+            WHERE range_id = ANY($1)
+            """, [r["range_id"] for r in top])
+        spans_by_range = {row["range_id"]: dict(row) for row in spans}
+        for r in top:
+            span = spans_by_range.get(r["range_id"], {})
+            r["start_key"] = span.get("start_pretty")
+            r["end_key"] = span.get("end_pretty")
+            # The last range of an index receives every insert of an ever-increasing key
+            r["index_tail"] = is_index_tail(r["start_key"], r["end_key"])
+
+        # Snapshots only compare with snapshots of the same node filter and ranking
+        snapshots = HOT_RANGE_SNAPSHOTS.setdefault((node_id, metric), deque(maxlen=10))
+        heating = compare_hot_range_snapshots(hot_ranges, metric, heating_factor,
+                                              snapshots[-1]["ranges"] if snapshots else None)
+        snapshots.append({
+            "timestamp": datetime.now().isoformat(),
+            "ranges": {r["range_id"]: {m: r[m] for m in HOT_RANGE_METRICS.values()}
+                       for r in hot_ranges[:HOT_RANGE_SNAPSHOT_SIZE]}
+        })
+
+        return {
+            "success": True,
+            "order_by": order_by,
+            "hot_ranges": top,
+            "heating_ranges": heating[:limit],
+            "previous_snapshot": snapshots[-2]["timestamp"] if len(snapshots) > 1 else None,
+            "timestamp": snapshots[-1]["timestamp"]
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+HOT_RANGE_METRICS = {"qps": "qps", "cpu": "cpu_time_per_second"}
+
+# Recent hot range snapshots per node filter and metric, compared between calls to find the ranges getting hotter
+HOT_RANGE_SNAPSHOTS: Dict[Tuple[Optional[int], str], deque] = {}
+# Ranges kept per snapshot, the hottest first
+HOT_RANGE_SNAPSHOT_SIZE = 5000
+
+_http_session: Optional[str] = None
+
+def get_http_url() -> str:
+    if CRDB_CONFIG.get("http_url"):
+        return CRDB_CONFIG["http_url"].rstrip("/")
+    secure = CRDB_CONFIG.get("ssl_mode") not in (None, "disable", "allow")
+    return f"{'https' if secure else 'http'}://{CRDB_CONFIG['host']}:8080"
+
+async def fetch_hot_ranges(node_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Read the hot ranges of the cluster from the HTTP status API.
+
+    The hot ranges report is not exposed through SQL. On secure clusters, the
+    server logs in with the SQL user's credentials and reuses the session.
+    """
+    global _http_session
+    import httpx
+
+    # Certificates are always verified, against the cluster's CA when one is configured
+    verify = ssl.create_default_context(cafile=CRDB_CONFIG["ssl_ca_cert"]) if CRDB_CONFIG.get("ssl_ca_cert") else True
+    async with httpx.AsyncClient(base_url=get_http_url(), verify=verify, timeout=30) as client:
+        for attempt in range(2):
+            if _http_session is None and CRDB_CONFIG.get("password"):
+                login = await client.post("/api/v2/login/", data={
+                    "username": CRDB_CONFIG["username"],
+                    "password": CRDB_CONFIG["password"]
+                })
+                login.raise_for_status()
+                _http_session = login.json()["session"]
+
+            headers = {"X-Cockroach-API-Session": _http_session} if _http_session else {}
+            cookies = {"session": _http_session} if _http_session else None
+            ranges = []
+            page_token = ""
+            while True:
+                response = await client.post("/_status/v2/hotranges", headers=headers, cookies=cookies, json={
+                    "node_id": str(node_id) if node_id else "",
+                    "page_size": 1000,
+                    "page_token": page_token
+                })
+                if response.status_code == 401 and attempt == 0 and _http_session:
+                    # The session expired, log in again
+                    _http_session = None
+                    break
+                response.raise_for_status()
+                body = response.json()
+                ranges.extend(body.get("ranges") or [])
+                page_token = body.get("next_page_token") or ""
+                if not page_token:
+                    return [format_hot_range(r) for r in ranges]
+
+    raise Exception("Could not authenticate to the CockroachDB HTTP API")
+
+def format_hot_range(hot_range: Dict[str, Any]) -> Dict[str, Any]:
+    # Recent versions report the schema objects of a range as lists
+    def names(single: str, many: str) -> Optional[str]:
+        return hot_range.get(single) or ", ".join(hot_range.get(many) or []) or None
+
+    return {
+        "range_id": int(hot_range.get("range_id", 0)),
+        "node_id": hot_range.get("node_id"),
+        "lease_holder": hot_range.get("leaseholder_node_id"),
+        "database_name": names("database_name", "databases"),
+        "table_name": names("table_name", "tables"),
+        "index_name": names("index_name", "indexes"),
+        "locality": hot_range.get("locality"),
+        "qps": float(hot_range.get("qps") or 0),
+        "cpu_time_per_second": float(hot_range.get("cpu_time_per_second") or 0),
+        "reads_per_second": float(hot_range.get("reads_per_second") or 0),
+        "writes_per_second": float(hot_range.get("writes_per_second") or 0),
+        "read_bytes_per_second": float(hot_range.get("read_bytes_per_second") or 0),
+        "write_bytes_per_second": float(hot_range.get("write_bytes_per_second") or 0)
+    }
+
+def is_index_tail(start_key: Optional[str], end_key: Optional[str]) -> bool:
+    """Whether a range ends at the end of the index it starts in, e.g. /Table/104/1/500 to /Table/105."""
+    def index_prefix(key: str) -> List[str]:
+        parts = key.split("/")
+        if "Table" not in parts:
+            return []
+        position = parts.index("Table")
+        return parts[position:position + 3]
+
+    if not start_key or not end_key:
+        return False
+    prefix = index_prefix(start_key)
+    return len(prefix) == 3 and index_prefix(end_key) != prefix
+
+def compare_hot_range_snapshots(hot_ranges: List[Dict[str, Any]], metric: str, heating_factor: float,
+                                previous: Optional[Dict[int, Dict[str, float]]]) -> List[Dict[str, Any]]:
+    """The ranges whose load grew by the heating factor since the previous snapshot.
+
+    Ranges missing from the previous snapshot have no known earlier load: they are
+    flagged as new after the others, rather than compared with 0.
+    """
+    if not previous:
+        return []
+
+    heating = []
+    new = []
+    for r in hot_ranges:
+        if r[metric] <= 0:
+            continue
+        entry = {"range_id": r["range_id"], "table_name": r["table_name"], "index_name": r["index_name"], metric: r[metric]}
+        if r["range_id"] not in previous:
+            new.append({**entry, "new": True, "previous": None, "increase": None})
+            continue
+        before = previous[r["range_id"]].get(metric, 0.0)
+        if r[metric] >= before * heating_factor:
+            heating.append({**entry, "new": False, "previous": before, "increase": r[metric] - before})
+
+    heating.sort(key=lambda h: h["increase"], reverse=True)
+    new.sort(key=lambda h: h[metric], reverse=True)
+    return heating + new
+
 def format_cluster_status(cluster_info: List[Any], nodes: List[Any]) -> Dict[str, Any]:
     formatted_cluster = {
         "cluster_settings": [dict(row) for row in cluster_info],
@@ -1,7 +1,11 @@
 from mcp.server.fastmcp import Context
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from src.common.server import mcp
-from src.common.connection import CockroachConnectionPool
+from src.common.connection import CockroachConnectionPool, session_database
+from src.common.session import get_session_state, get_current_database
+from src.common.admission import get_admission_controller
+from src.common.guard import query_guard
+from src.common.listing import listing_query, listing_result
 
 @mcp.tool()
 async def connect(ctx: Context) -> Dict[str, Any]:
@@ -61,6 +65,10 @@ async def connect_database(ctx: Context, host: str, database: str, port: int, us
             sslkey=sslkey,
             sslrootcert=sslrootcert
         )
+        # The session follows the database of the new pool
+        get_session_state(ctx).current_database = ""
+        session_database.set("")
+
         # Test connection
         async with pool.acquire() as conn:
             version = await conn.fetchval("SELECT version()")
@@ -80,9 +88,15 @@ async def connect_database(ctx: Context, host: str, database: str, port: int, us
         }
     
 @mcp.tool()
-async def list_databases(ctx: Context) -> Dict[str, Any]:
+async def list_databases(ctx: Context, columns: Optional[List[str]] = None, name_filter: Optional[str] = None,
+                         columnar: bool = False) -> Dict[str, Any]:
     """List all databases in the CockroachDB cluster.
 
+    Args:
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return databases whose name contains this text (case-insensitive).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
+
     Returns:
         A list of databases with row count or an error message.
     """
@@ -99,14 +113,15 @@ async def list_databases(ctx: Context) -> Dict[str, Any]:
         regions,
         survival_goal
     FROM [SHOW DATABASES]
-    ORDER BY database_name
     """
+    query, params = listing_query(query, columns=columns, name_column="database_name",
+                                  name_filter=name_filter, order_by="database_name")
 
     async with pool.acquire() as conn:
-        rows = await conn.fetch(query)
+        rows = await conn.fetch(query, *params)
 
     return {
-        "databases": [dict(row) for row in rows],
+        "databases": listing_result(rows, columnar),
         "count": len(rows)
     }
 
@@ -134,11 +149,9 @@ async def get_connection_status(ctx: Context) -> Dict[str, Any]:
         return {
             "connected": True,
             "details": dict(result),
-            "pool_stats": {
-                "size": pool.get_size(),
-                "min_size": pool.get_min_size(),
-                "max_size": pool.get_max_size()
-            }
+            "pool_stats": CockroachConnectionPool.stats(),
+            "admission": get_admission_controller().stats(),
+            "query_guard": query_guard.stats()
         }
 
     except Exception as e:
@@ -149,7 +162,7 @@ async def get_connection_status(ctx: Context) -> Dict[str, Any]:
 
 @mcp.tool()
 async def switch_database(ctx: Context, database: str) -> Dict[str, Any]:
-    """Switch the connection to a different database.
+    """Switch the current session to a different database.
 
     Args:
         database (str): Name of the database to switch to.
@@ -162,24 +175,18 @@ async def switch_database(ctx: Context, database: str) -> Dict[str, Any]:
         raise Exception("Not connected to database")
 
     try:
-        # Close current pool
-        pool.terminate()
-
-        # Create new pool with different database
-        # Extract connection info from current pool
-        dsn_parts = CockroachConnectionPool.database_url.split('/')
-        old_database = CockroachConnectionPool.current_database
-        base_dsn = '/'.join(dsn_parts[:-1])
-        old_path = dsn_parts[-1]
-        if "?" in old_path:
-            query = old_path[old_path.index("?"):] 
-        else: 
-            query = ""
-        
-        new_dsn = f"{base_dsn}/{database}{query}"
-
-        pool = await CockroachConnectionPool.create_connection_pool(new_dsn)
-        new_database = CockroachConnectionPool.current_database
+        # The pool is shared by every client session, so only this session moves.
+        # Its connections are pointed at the new database when they are acquired.
+        async with pool.acquire() as conn:
+            exists = await conn.fetchval("SELECT count(*) FROM [SHOW DATABASES] WHERE database_name = $1", database)
+        if not exists:
+            return {"success": False, "error": f"Database '{database}' does not exist."}
+
+        state = get_session_state(ctx)
+        old_database = get_current_database(ctx)
+        state.current_database = database
+        session_database.set(database)
+        new_database = get_current_database(ctx)
 
         return {
             "success": True,
@@ -194,9 +201,15 @@ async def switch_database(ctx: Context, database: str) -> Dict[str, Any]:
         }
 
 @mcp.tool()
-async def get_active_connections(ctx: Context) -> Dict[str, Any]:
+async def get_active_connections(ctx: Context, columns: Optional[List[str]] = None, name_filter: Optional[str] = None,
+                                 columnar: bool = False) -> Dict[str, Any]:
     """List active connections/sessions to the current database.
 
+    Args:
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return sessions whose application name contains this text (case-insensitive).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
+
     Returns:
         Active sessions on the cluster.
     """
@@ -215,33 +228,41 @@ async def get_active_connections(ctx: Context) -> Dict[str, Any]:
             session_start,
             status
         FROM [SHOW SESSIONS]
-        ORDER BY session_start DESC
         """
+        query, params = listing_query(query, columns=columns, name_column="application_name",
+                                      name_filter=name_filter, order_by="session_start DESC")
         async with pool.acquire() as conn:
-            rows = await conn.fetch(query)
+            rows = await conn.fetch(query, *params)
         return {
-            "connections": [dict(row) for row in rows],
+            "connections": listing_result(rows, columnar),
             "count": len(rows)
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @mcp.tool()
-async def get_database_settings(ctx: Context) -> Dict[str, Any]:
+async def get_database_settings(ctx: Context, columns: Optional[List[str]] = None, name_filter: Optional[str] = None,
+                                columnar: bool = False) -> Dict[str, Any]:
     """Retrieve current database or cluster settings.
 
+    Args:
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return settings whose name contains this text (case-insensitive), e.g. 'sql.defaults'.
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
+
     Returns:
-        All cluster settings.
+        The cluster settings.
     """
     pool = await CockroachConnectionPool.get_connection_pool()
     if not pool:
         raise Exception("Not connected to database")
     try:
-        query = "SHOW ALL CLUSTER SETTINGS"
+        query, params = listing_query("SELECT * FROM [SHOW ALL CLUSTER SETTINGS]", columns=columns,
+                                      name_column="variable", name_filter=name_filter, order_by="variable")
         async with pool.acquire() as conn:
-            rows = await conn.fetch(query)
+            rows = await conn.fetch(query, *params)
         return {
-            "settings": [dict(row) for row in rows],
+            "settings": listing_result(rows, columnar),
             "count": len(rows)
         }
     except Exception as e:
@@ -281,7 +302,7 @@ async def drop_database(ctx: Context, database_name: str) -> Dict[str, Any]:
     if(database_name == 'defaultdb'):
         return {"success": False, "error": "Cannot drop the default database."}
     
-    if(database_name.lower() == CockroachConnectionPool.current_database.lower()):
+    if(database_name.lower() == get_current_database(ctx).lower()):
         await switch_database(ctx, 'defaultdb')
 
     pool = await CockroachConnectionPool.get_connection_pool()
@@ -1,5 +1,15 @@
+import asyncio
+import json
+import re
 import time
-from src.common.connection import CockroachConnectionPool
+from src.common.config import MCP_CONFIG, POOL_SETTINGS
+from src.common.connection import CockroachConnectionPool, statement_scope
+from src.common.sql import apply_row_limit, check_system_time, is_read_query, resolve_system_time, scan_statement
+from src.common.plan import diff_plans, parse_plan, plan_history
+from src.common.spill import RESULT_URI, SpillWriter, read_spill, result_uri
+from src.common.workload import capture, load_workload, replay_workload as replay_entries
+from src.common.guard import query_guard
+from src.common.session import get_current_database, get_session_state
 from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
 from mcp.server.fastmcp import Context
@@ -7,21 +17,25 @@ from src.common.server import mcp
 
 @mcp.tool()
 async def execute_query(ctx: Context, query: str, params: Optional[List] = None, 
-                        format: str = "json", limit: Optional[int] = None) -> Dict[str, Any]:
+                        format: str = "json", limit: Optional[int] = None,
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
     '''Execute a SQL query with optional parameters and formatting.
     
     Args:
         query (str): SQL query to execute.
         params (List, optional): Query parameters.
         format (str): Output format ('json', 'csv', 'table').
-        limit (int, optional): Limit number of rows returned.
+        limit (int, optional): Limit number of rows returned. Read queries are limited by the database; without a limit, they are capped at the server's default row limit.
+        timeout (float, optional): Statement timeout in seconds for this call. The query is cancelled on the cluster when it expires or when the call is aborted.
     
     Returns:
-        The query resultset in json or csv format.
+        The query resultset in json or csv format, with 'truncated' set when more rows were available than returned.
+        When the server's query guard is on, statements whose plan exceeds its thresholds (large full scans, cross joins, too many estimated rows) are rejected, capped or read from followers, and 'guard' gives the reasons and suggested indexes. Statements that cannot be explained have 'guard' {"checked": false}; in reject mode, such reads are rejected.
+        Reads with a limit above the server's page size return their first page, and the rest is kept on the server: 'result_uri' and 'next_page_uri' are resources to read the following pages from, without running the query again.
     '''
     
     pool = await CockroachConnectionPool.get_connection_pool()
-    query_history = CockroachConnectionPool.query_history
+    query_history = get_session_state(ctx).query_history
     if not pool:
         raise Exception("Not connected to database")
 
@@ -31,16 +45,87 @@ async def execute_query(ctx: Context, query: str, params: Optional[List] = None,
     start_time = time.time()
     
     try:
-        # Add limit if specified
-        if limit:
-            query = f"{query} LIMIT {limit}"
-        
-        async with pool.acquire() as conn:
-            if params:
-                rows = await conn.fetch(query, *params)
+        # Cost guard: statements whose plan is too expensive are rejected, capped or sent to followers
+        guard = None
+        follower_read = False
+        if MCP_CONFIG["query_guard"] != "off":
+            async with pool.acquire() as conn:
+                async with statement_scope(conn, timeout) as client_timeout:
+                    guard = await query_guard.check(conn, query, params, get_current_database(ctx), client_timeout)
+            if guard is None:
+                guard = {"checked": False}
+                if MCP_CONFIG["query_guard"] == "reject" and is_read_query(query):
+                    # A read whose cost is unknown is not let through
+                    guard.update({"allowed": False, "reasons": ["the statement cannot be explained"]})
+        if guard and not guard.get("allowed", True):
+            # Only reads can be capped or served by followers
+            guard["action"] = MCP_CONFIG["query_guard"] if is_read_query(query) else "reject"
+            if guard["action"] == "limit" and not guard.get("limitable"):
+                # A LIMIT would not stop the flagged scans under sorts, aggregations or hash joins
+                guard["action"] = "reject"
+                guard["reasons"] = guard["reasons"] + ["a row limit would not bound the cost of this plan"]
+            if guard["action"] == "reject":
+                error = "Rejected by the query guard: " + "; ".join(guard["reasons"])
+                query_history.append({
+                    "query": query,
+                    "timestamp": datetime.now().isoformat(),
+                    "duration": time.time() - start_time,
+                    "row_count": 0,
+                    "success": False,
+                    "error": error
+                })
+                return {"success": False, "error": error, "guard": guard, "duration": time.time() - start_time}
+            elif guard["action"] == "limit":
+                limit = min(limit or MCP_CONFIG["guard_limit_rows"], MCP_CONFIG["guard_limit_rows"])
             else:
-                rows = await conn.fetch(query)
-        
+                follower_read = True
+
+        # Push the row limit down to the database: one extra row tells whether results were capped
+        page_size = MCP_CONFIG["max_rows"] or None
+        row_limit = limit or page_size
+        spill = False
+        limited_query = None
+        if limit and page_size and MCP_CONFIG["spill_max_rows"] and limit > page_size:
+            # Reads asking for more than a page are spilled to disk and paged through as a resource, rather than truncated
+            spill_limit = min(limit, MCP_CONFIG["spill_max_rows"])
+            limited_query = apply_row_limit(query, spill_limit + 1)
+            if limited_query:
+                spill, row_limit = True, spill_limit
+        if row_limit and not spill:
+            limited_query = apply_row_limit(query, row_limit + 1)
+        # The wrapped statement is executed and captured for replay, history keeps the statement as written
+        statement = limited_query or query
+        if not limited_query and not limit and not is_read_query(query):
+            # Statements that cannot be wrapped (DML, DDL, ...) are only capped on request,
+            # reads that cannot be wrapped (AS OF SYSTEM TIME, some SHOW forms) are capped here
+            row_limit = None
+
+        spilled = None
+        async with pool.acquire() as conn:
+            async with statement_scope(conn, timeout) as client_timeout:
+                with capture(statement, params, "follower_read_timestamp()" if follower_read else None) as captured:
+                    try:
+                        if spill:
+                            rows, spilled, truncated = await fetch_spilling(
+                                conn, statement, params or [], client_timeout, row_limit, page_size, follower_read)
+                        elif follower_read:
+                            async with conn.transaction(readonly=True):
+                                await conn.execute("SET TRANSACTION AS OF SYSTEM TIME follower_read_timestamp()")
+                                rows = await conn.fetch(statement, *(params or []), timeout=client_timeout)
+                        elif params:
+                            rows = await conn.fetch(statement, *params, timeout=client_timeout)
+                        else:
+                            rows = await conn.fetch(statement, timeout=client_timeout)
+                    except Exception as e:
+                        if captured is not None:
+                            captured["e"] = str(e)
+                        raise
+
+        if not spill:
+            truncated = bool(row_limit) and len(rows) > row_limit
+            if truncated:
+                rows = rows[:row_limit]
+
         duration = time.time() - start_time
         
         # Add to query history
@@ -48,21 +133,34 @@ async def execute_query(ctx: Context, query: str, params: Optional[List] = None,
             "query": query,
             "timestamp": datetime.now().isoformat(),
             "duration": duration,
-            "row_count": len(rows),
+            "row_count": spilled["row_count"] if spilled else len(rows),
             "success": True
         })
         
         # Format results
         formatted_result = format_result([dict(row) for row in rows], format)
         
-        return {
+        result = {
             "success": True,
             "rows": [dict(row) for row in rows],
             "row_count": len(rows),
             "duration": duration,
             "columns": list(dict(rows[0]).keys()) if rows else [],
-            "formatted_result": formatted_result
+            "formatted_result": formatted_result,
+            "truncated": truncated,
+            "row_limit": row_limit
         }
+        if guard:
+            result["guard"] = guard
+        if spilled:
+            # The rows returned are the first page of the result
+            result.update({
+                "total_rows": spilled["row_count"],
+                "pages": -(-spilled["row_count"] // page_size),
+                "result_uri": result_uri(spilled["result_id"], 0),
+                "next_page_uri": result_uri(spilled["result_id"], 1)
+            })
+        return result
         
     except Exception as e:
         duration = time.time() - start_time
@@ -84,11 +182,12 @@ async def execute_query(ctx: Context, query: str, params: Optional[List] = None,
         }
 
 @mcp.tool()
-async def execute_transaction(ctx: Context, queries: List[str]) -> Dict[str, Any]:
+async def execute_transaction(ctx: Context, queries: List[str], timeout: Optional[float] = None) -> Dict[str, Any]:
     '''Execute a list of SQL queries as a single transaction.
     
     Args:
         queries (List[str]): List of SQL queries to execute.
+        timeout (float, optional): Statement timeout in seconds, applied to each statement of the transaction. Statements are cancelled on the cluster when it expires or when the call is aborted.
     
     Returns:
         A success message or an error message.
@@ -101,40 +200,145 @@ async def execute_transaction(ctx: Context, queries: List[str]) -> Dict[str, Any
     results = []
     
     async with pool.acquire() as conn:
-        async with conn.transaction():
+        async with statement_scope(conn, timeout) as client_timeout, conn.transaction():
+            with capture(queries) as captured:
+                try:
+                    for query in queries:
+                        rows = await conn.fetch(query, timeout=client_timeout)
+                        results.append({
+                            "query": query,
+                            "row_count": len(rows),
+                            "rows": [dict(row) for row in rows]
+                        })
+                    
+                    return {
+                        "success": True,
+                        "results": results,
+                        "message": f"Transaction completed successfully with {len(queries)} statements"
+                    }
+                    
+                except Exception as e:
+                    if captured is not None:
+                        captured["e"] = str(e)
+                    return {
+                        "success": False,
+                        "error": str(e),
+                        "completed_statements": len(results),
+                        "total_statements": len(queries)
+                    }
+
+# Maximum number of queries of an execute_batch call
+MAX_BATCH_QUERIES = 50
+
+@mcp.tool()
+async def execute_batch(ctx: Context, queries: List[Union[str, Dict[str, Any]]], as_of_system_time: Optional[str] = None,
+                        limit: Optional[int] = None, timeout: Optional[float] = None,
+                        concurrency: int = 4) -> Dict[str, Any]:
+    '''Run several independent read-only queries concurrently in one call, instead of one execute_query call each.
+    
+    Args:
+        queries (List): Queries to run, each a SQL string or an object with 'query', and optionally 'params' and 'limit'.
+        as_of_system_time (str, optional): Read every query at the same point in time, e.g. '-10s' or 'follower_read_timestamp()', for a consistent view across the queries.
+        limit (int, optional): Row limit of queries without their own limit (default: the server's default row limit). Limits are capped at the server's default row limit.
+        timeout (float, optional): Statement timeout in seconds, applied to each query.
+        concurrency (int): Maximum number of queries running at once, each on its own connection (default: 4), capped by the pool size and the server's batch concurrency.
+    
+    Returns:
+        The result of each query in order, with its duration, and the total duration.
+    '''
+    
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    if len(queries) > MAX_BATCH_QUERIES:
+        return {"success": False, "error": f"A batch has at most {MAX_BATCH_QUERIES} queries."}
+    batch = [{"query": item} if isinstance(item, str) else dict(item) for item in queries]
+    for item in batch:
+        if not is_read_query(item.get("query") or ""):
+            return {"success": False, "error": f"Only read-only queries can be batched: {item.get('query')}"}
+
+    query_history = get_session_state(ctx).query_history
+    start_time = time.time()
+    try:
+        # Replays read at the same relative time, not at the resolved timestamp
+        replay_as_of = None
+        if as_of_system_time:
+            replay_as_of = "follower_read_timestamp()" if as_of_system_time.lower().startswith("follower_read_timestamp") \
+                else f"'{check_system_time(as_of_system_time)}'"
+            # One absolute timestamp, so that every query reads the same snapshot
+            async with pool.acquire() as conn:
+                as_of_system_time = await resolve_system_time(conn, as_of_system_time)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+    # A batch never takes more connections than the pool has, nor than the server allows
+    concurrency = max(1, min(concurrency, pool.get_max_size(), MCP_CONFIG["batch_concurrency"] or concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item: Dict[str, Any]) -> Dict[str, Any]:
+        row_limit = item.get("limit") or limit or MCP_CONFIG["max_rows"] or None
+        if row_limit and MCP_CONFIG["max_rows"]:
+            row_limit = min(row_limit, MCP_CONFIG["max_rows"])
+        query = item["query"]
+        params = item.get("params") or []
+        statement = apply_row_limit(query, row_limit + 1) if row_limit else None
+
+        async with semaphore:
+            query_start = time.time()
             try:
-                for query in queries:
-                    rows = await conn.fetch(query)
-                    results.append({
-                        "query": query,
-                        "row_count": len(rows),
-                        "rows": [dict(row) for row in rows]
-                    })
-                
-                return {
-                    "success": True,
-                    "results": results,
-                    "message": f"Transaction completed successfully with {len(queries)} statements"
-                }
-                
+                async with pool.acquire() as conn:
+                    async with statement_scope(conn, timeout) as client_timeout, conn.transaction(readonly=True):
+                        if as_of_system_time:
+                            await conn.execute(f"SET TRANSACTION AS OF SYSTEM TIME '{as_of_system_time}'")
+                        with capture(statement or query, params, replay_as_of) as captured:
+                            try:
+                                rows = await conn.fetch(statement or query, *params, timeout=client_timeout)
+                            except Exception as e:
+                                if captured is not None:
+                                    captured["e"] = str(e)
+                                raise
+                result = {"success": True, "truncated": bool(row_limit) and len(rows) > row_limit}
+                rows = rows[:row_limit] if row_limit else rows
+                result.update({
+                    "rows": [dict(row) for row in rows],
+                    "row_count": len(rows),
+                    "columns": list(dict(rows[0]).keys()) if rows else []
+                })
             except Exception as e:
-                return {
-                    "success": False,
-                    "error": str(e),
-                    "completed_statements": len(results),
-                    "total_statements": len(queries)
-                }
+                result = {"success": False, "error": str(e)}
+
+        duration = time.time() - query_start
+        query_history.append({
+            "query": query,
+            "timestamp": datetime.now().isoformat(),
+            "duration": duration,
+            "row_count": result.get("row_count", 0),
+            "success": result["success"],
+            **({"error": result["error"]} if not result["success"] else {})
+        })
+        return {"query": item["query"], **result, "duration": duration}
+
+    results = await asyncio.gather(*[run(item) for item in batch])
+    return {
+        "success": all(result["success"] for result in results),
+        "results": results,
+        "as_of_system_time": as_of_system_time,
+        "concurrency": concurrency,
+        "duration": time.time() - start_time
+    }
 
 @mcp.tool()  
-async def explain_query(ctx: Context, query: str, analyze: bool = False) -> Dict[str, Any]:
+async def explain_query(ctx: Context, query: str, analyze: bool = False, timeout: Optional[float] = None) -> Dict[str, Any]:
     '''Return CockroachDB's statement plan for a preparable statement. You can use this information to optimize the query. If you run it with Analyze, it executes the SQL query and generates a statement plan with execution statistics.
     
     Args:
         query (str): SQL query to explain.
         analyze (bool): If True, run EXPLAIN ANALYZE.
+        timeout (float, optional): Statement timeout in seconds for this call, useful with analyze since the query is executed.
     
     Returns:
-        A success message or an error message.
+        The plan as text and as a tree of operators (estimated and actual rows, tables, spans, full scans), its fingerprint, and the changes since the previous plan of the same query.
     '''
     
     pool = await CockroachConnectionPool.get_connection_pool()
@@ -145,23 +349,33 @@ async def explain_query(ctx: Context, query: str, analyze: bool = False) -> Dict
     
     try:
         async with pool.acquire() as conn:
-            rows = await conn.fetch(explain_query)
+            async with statement_scope(conn, timeout) as client_timeout:
+                rows = await conn.fetch(explain_query, timeout=client_timeout)
         
-        plan_text = "\n".join([row.get('info', row.get('plan', '')) for row in rows])
+        lines = [row.get('info', row.get('plan', '')) for row in rows]
+        plan_text = "\n".join(lines)
         if analyze:
              # Add to query history
-            query_history = CockroachConnectionPool.query_history
+            query_history = get_session_state(ctx).query_history
             query_history.append({
                 "query": explain_query,
                 "timestamp": datetime.now().isoformat(),
                 "row_count": len(rows),
                 "success": True
             })
+
+        plan = parse_plan(lines)
+        previous = plan_history.record(query, plan)
         
         return {
             "success": True,
             "plan": [dict(row) for row in rows],
             "plan_text": plan_text,
+            "plan_tree": plan,
+            "fingerprint": plan["fingerprint"],
+            "full_scan": plan["full_scan"],
+            "plan_changed": previous is not None and previous["fingerprint"] != plan["fingerprint"],
+            "plan_diff": diff_plans(previous["plan"], plan) if previous and previous["fingerprint"] != plan["fingerprint"] else None,
             "analyzed": analyze
         }
         
@@ -171,6 +385,51 @@ async def explain_query(ctx: Context, query: str, analyze: bool = False) -> Dict
             "error": str(e)
         }
 
+@mcp.tool()
+async def compare_plans(ctx: Context, query: str, other_query: Optional[str] = None,
+                        since: Optional[str] = None) -> Dict[str, Any]:
+    '''Compare the plan of a query with the plan of another query, or with an earlier plan of the same query, to catch plan regressions.
+    
+    Args:
+        query (str): SQL query to explain.
+        other_query (str, optional): Query whose plan the current plan is compared to, e.g. the same query with other predicates or hints.
+        since (str, optional): Without other_query, compare with the first plan recorded for the query at or after this ISO timestamp (default: the oldest recorded plan). Plans are recorded by explain_query and compare_plans.
+    
+    Returns:
+        The fingerprints of both plans and the operators, indexes, full scans and row estimates that changed.
+    '''
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    try:
+        history = plan_history.get(query)
+        async with pool.acquire() as conn:
+            plan = parse_plan([row["info"] for row in await conn.fetch(f"EXPLAIN {query}")])
+            if other_query:
+                other = parse_plan([row["info"] for row in await conn.fetch(f"EXPLAIN {other_query}")])
+                plan_history.record(other_query, other)
+        plan_history.record(query, plan)
+
+        if other_query:
+            return {"success": True, "compared_with": "other_query", "diff": diff_plans(other, plan)}
+
+        earlier = [entry for entry in history if not since or entry["timestamp"] >= since]
+        if not earlier:
+            return {
+                "success": True,
+                "compared_with": None,
+                "fingerprint": plan["fingerprint"],
+                "message": "No earlier plan recorded for this query, the current plan was recorded."
+            }
+        return {
+            "success": True,
+            "compared_with": earlier[0]["timestamp"],
+            "diff": diff_plans(earlier[0]["plan"], plan)
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 @mcp.tool()   
 async def analyze_performance(ctx: Context, query: str, time_range: str = "1:0") -> Dict[str, Any]:
     '''Analyze query performance statistics for a given query or time range.
@@ -267,6 +526,210 @@ async def analyze_performance(ctx: Context, query: str, time_range: str = "1:0")
         return {"success": False, "error": str(e)}
 
 
+@mcp.tool()
+async def advise_indexes(ctx: Context, time_range: str = "1:0", limit: int = 10) -> Dict[str, Any]:
+    '''Recommend indexes for the most expensive statements of the workload. Statements doing full scans or with index recommendations are taken from the statement statistics, their plans are checked with EXPLAIN, and each index is weighed against the writes it would slow down.
+    
+    Args:
+        time_range (str): Time range of statement statistics to analyze (default: '1:0', format: 'minutes:seconds').
+        limit (int): Maximum number of statements to analyze, the most expensive first (default: 10).
+    
+    Returns:
+        Ranked CREATE INDEX statements, with the arguments to apply them with create_index.
+    '''
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    try:
+        async with pool.acquire() as conn:
+            statements = await conn.fetch(STATEMENT_COSTS_QUERY + """
+            HAVING bool_or(full_scan) OR max(index_recommendations) != ''
+            ORDER BY total_latency DESC
+            LIMIT $2
+            """, time_range, limit)
+            writes = await conn.fetch(STATEMENT_COSTS_QUERY + """
+            HAVING sum(rows_written) > 0
+            """, time_range)
+
+            candidates: Dict[str, Dict[str, Any]] = {}
+            full_scans = []
+            for statement in statements:
+                plan_full_scan, explained, recommended = await confirm_statement_plan(conn, statement)
+                recommendations = [rec for rec in parse_index_recommendations(statement["index_recommendations"])
+                                   if not explained or rec["statement"] in recommended]
+                if not recommendations and (statement["full_scan"] or plan_full_scan):
+                    full_scans.append({"query": statement["query"], "total_latency": statement["total_latency"]})
+
+                for rec in recommendations:
+                    candidate = candidates.setdefault(rec["statement"], {
+                        **rec,
+                        "queries": [],
+                        "confirmed": False,
+                        "execution_count": 0,
+                        "total_latency": 0.0,
+                        "rows_read": 0.0
+                    })
+                    candidate["queries"].append(statement["query"])
+                    candidate["confirmed"] |= plan_full_scan or explained
+                    candidate["execution_count"] += statement["execution_count"]
+                    candidate["total_latency"] += statement["total_latency"]
+                    candidate["rows_read"] += statement["rows_read"]
+
+            for candidate in candidates.values():
+                table = candidate["create_index"]["table_name"]
+                candidate["rows_written"] = sum(w["rows_written"] for w in writes if written_table(w["query"]) == table)
+                index_count = await conn.fetchval(f"SELECT count(DISTINCT index_name) FROM [SHOW INDEXES FROM {candidate['table']}]")
+                # Every row written to the table is written once more, to the new index
+                candidate["write_amplification"] = round((index_count + 1) / max(index_count, 1), 2)
+                read_share = candidate["rows_read"] / ((candidate["rows_read"] + candidate["rows_written"]) or 1)
+                candidate["score"] = round(candidate["total_latency"] * read_share, 6)
+
+        ranked = sorted(candidates.values(), key=lambda c: (c["confirmed"], c["score"]), reverse=True)
+        return {
+            "success": True,
+            "recommendations": ranked,
+            "full_scans_without_recommendation": full_scans
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# Per fingerprint cost over a time range ($1), with the latest index recommendations and plan gist
+# The server's own introspection and admin statements are not part of the workload
+_OWN_APPLICATIONS = ", ".join(
+    "'" + POOL_SETTINGS[workload]["application_name"].replace("'", "''") + "'" for workload in ("introspection", "admin"))
+
+STATEMENT_COSTS_QUERY = """
+SELECT 
+    query,
+    bool_or(full_scan) AS full_scan,
+    sum(execution_count)::INT AS execution_count,
+    sum(execution_count * latency) AS total_latency,
+    sum(execution_count * rows_read) AS rows_read,
+    sum(execution_count * rows_written) AS rows_written,
+    max(index_recommendations) AS index_recommendations,
+    max(plan_gist) AS plan_gist
+FROM
+(SELECT 
+    fingerprint_id,
+    json_extract_path_text(metadata, 'query') AS query,
+    cast(json_extract_path_text(metadata, 'fullScan') AS BOOL) AS full_scan,
+    cast(json_extract_path_text(statistics, 'statistics', 'cnt') AS INT) AS execution_count,
+    cast(json_extract_path_text(statistics, 'statistics', 'svcLat', 'mean') AS FLOAT) AS latency,
+    cast(json_extract_path_text(statistics, 'statistics', 'rowsRead', 'mean') AS FLOAT) AS rows_read,
+    cast(json_extract_path_text(statistics, 'statistics', 'rowsWritten', 'mean') AS FLOAT) AS rows_written,
+    array_to_string(index_recommendations, e'\\n') AS index_recommendations,
+    statistics->'statistics'->'planGists'->>0 AS plan_gist
+FROM crdb_internal.statement_statistics
+WHERE aggregated_ts >= now() - $1::INTERVAL AND app_name NOT IN (""" + _OWN_APPLICATIONS + """))
+GROUP BY fingerprint_id, query
+"""
+
+_INDEX_RECOMMENDATION = re.compile(
+    r'CREATE\s+INDEX\s+(?:\S+\s+)?ON\s+(\S+)\s*\((.*?)\)(?:\s+STORING\s*\((.*?)\))?\s*;',
+    re.IGNORECASE)
+_WRITTEN_TABLE = re.compile(r'^\s*(?:INSERT\s+INTO|UPSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+([\w."]+)', re.IGNORECASE)
+
+def unqualified_name(name: str) -> str:
+    return name.split(".")[-1].strip('"')
+
+def parse_index_recommendations(recommendations: Optional[str]) -> List[Dict[str, Any]]:
+    """Parse index creations from recommendations such as 'creation : CREATE INDEX ON public.t (a) STORING (b);'."""
+    parsed = []
+    for match in _INDEX_RECOMMENDATION.finditer(recommendations or ""):
+        table, key, storing = match.group(1), match.group(2), match.group(3)
+        key_columns = [col.strip() for col in key.split(",") if col.strip()]
+        storing_columns = [col.strip().strip('"') for col in (storing or "").split(",") if col.strip()]
+        columns = [col.split()[0].strip('"') for col in key_columns]
+        parsed.append({
+            "statement": match.group(0),
+            "table": table,
+            "create_index": {
+                "table_name": unqualified_name(table),
+                "index_name": "_".join([unqualified_name(table)] + columns + ["idx"]),
+                "columns": columns,
+                "storing": storing_columns or None
+            }
+        })
+
+    return parsed
+
+def written_table(query: str) -> Optional[str]:
+    match = _WRITTEN_TABLE.match(query or "")
+    return unqualified_name(match.group(1)) if match else None
+
+async def confirm_statement_plan(conn, statement) -> tuple:
+    """Check a statement's plan.
+
+    The plan the statement was executed with is decoded from its plan gist, to tell whether it did a
+    full scan. Statements without constants replaced by placeholders are also explained again, which
+    returns the index recommendations for the current schema.
+
+    Returns whether the plan does a full scan, whether the statement could be explained, and the
+    recommended CREATE INDEX statements.
+    """
+    full_scan = False
+    if statement["plan_gist"]:
+        try:
+            plan = await conn.fetch("SELECT crdb_internal.decode_plan_gist($1) AS plan", statement["plan_gist"])
+            full_scan = any("FULL SCAN" in (row["plan"] or "").upper() for row in plan)
+        except Exception:
+            pass
+
+    query = statement["query"] or ""
+    _, words = scan_statement(query)
+    if not is_read_query(query) or any(word in ("_", "__more__") for word, _ in words) or re.search(r"\$\d", query):
+        return full_scan, False, set()
+
+    try:
+        rows = await conn.fetch(f"EXPLAIN {query}")
+    except Exception:
+        return full_scan, False, set()
+
+    plan = parse_plan([row["info"] for row in rows])
+    recommended = {match.group(0) for rec in plan["index_recommendations"] for match in _INDEX_RECOMMENDATION.finditer(rec)}
+    return full_scan or plan["full_scan"], True, recommended
+
+@mcp.tool()
+async def replay_workload(ctx: Context, path: Optional[str] = None, target_url: Optional[str] = None, workers: int = 4,
+                          speed: float = 1.0, read_only: bool = True, limit: Optional[int] = None) -> Dict[str, Any]:
+    '''Replay a captured workload log against a database with concurrent workers, and compare the latencies with the capture. Use it to validate schema and index changes before production.
+    
+    Args:
+        path (str, optional): Workload log to replay (default: the server's capture log).
+        target_url (str, optional): Connection URI of the database to replay against (default: the connected database).
+        workers (int): Number of concurrent workers (default: 4).
+        speed (float): Replay speed relative to the capture, e.g. 2 for twice as fast; 0 replays the statements back to back (default: 1).
+        read_only (bool): Only replay read statements, skipping writes and transactions that write (default: True).
+        limit (int, optional): Maximum number of statements to replay.
+    
+    Returns:
+        Latency percentiles of the capture and of the replay, per statement latency changes, errors and schedule lag.
+    '''
+    path = path or MCP_CONFIG["workload_capture"]
+    if not path:
+        return {"success": False, "error": "No workload log given, and workload capture is not enabled."}
+
+    try:
+        entries = load_workload(path, read_only, limit)
+        if target_url:
+            import asyncpg
+            pool = await asyncpg.create_pool(target_url, min_size=0, max_size=workers, command_timeout=60)
+        else:
+            pool = await CockroachConnectionPool.get_connection_pool()
+            if not pool:
+                raise Exception("Not connected to database")
+
+        try:
+            report = await replay_entries(pool, entries, workers, speed)
+        finally:
+            if target_url:
+                await pool.close()
+
+        return {"success": True, "path": path, **report}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 @mcp.tool()     
 async def get_query_history(ctx : Context, limit: int = 10) -> Dict[str, Any]:
     '''Get the history of executed queries.
@@ -278,7 +741,7 @@ async def get_query_history(ctx : Context, limit: int = 10) -> Dict[str, Any]:
         A list of the last executed queries.
     '''
     
-    query_history = CockroachConnectionPool.query_history
+    query_history = get_session_state(ctx).query_history
     return {
         "history": sorted(
             query_history[-limit:],
@@ -288,6 +751,49 @@ async def get_query_history(ctx : Context, limit: int = 10) -> Dict[str, Any]:
         "total_queries": len(query_history)
     }
 
+async def fetch_spilling(conn, query: str, params: List[Any], timeout: Optional[float],
+                         row_limit: int, page_size: int, follower_read: bool = False) -> tuple:
+    """Fetch a read through a cursor, keeping its first page in memory.
+
+    Once the result is larger than a page, all its rows are written to a spill file as they
+    arrive. Returns the first page, the spill file (or None) and whether rows were left out.
+    """
+    rows: List[Dict[str, Any]] = []
+    writer: Optional[SpillWriter] = None
+    count = 0
+    truncated = False
+    try:
+        async with conn.transaction():
+            if follower_read:
+                await conn.execute("SET TRANSACTION AS OF SYSTEM TIME follower_read_timestamp()")
+            async for record in conn.cursor(query, *params, prefetch=min(page_size, 1000), timeout=timeout):
+                if count == row_limit:
+                    truncated = True
+                    break
+                row = dict(record)
+                if count < page_size:
+                    rows.append(row)
+                else:
+                    if writer is None:
+                        writer = SpillWriter(list(rows[0].keys()), page_size)
+                        for kept in rows:
+                            writer.write(kept)
+                    if not writer.write(row):
+                        truncated = True
+                        break
+                count += 1
+    except BaseException:
+        if writer:
+            writer.discard()
+        raise
+
+    return rows, writer.close() if writer else None, truncated
+
+@mcp.resource(RESULT_URI, name="query_result_page", mime_type="application/json")
+def query_result_page(result_id: str, page: str) -> str:
+    """A page of a query result too large to be returned by execute_query, with the URI of the next page."""
+    return json.dumps(read_spill(result_id, int(page)), default=str)
+
 def format_result(rows: List[Dict], format: str) -> Union[str, List[Dict]]:
     if format == "csv":
         if not rows:
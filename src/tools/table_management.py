@@ -1,12 +1,24 @@
 from src.common.connection import CockroachConnectionPool
+from src.common.session import get_current_database
+from src.common.listing import listing_query, listing_result
+from src.common.sql import check_system_time, is_constant_set_clause, resolve_system_time
+from src.common.jobs import JOB_ACTIONS, get_job, submit_schema_change
+from src.common.schema import SCHEMA_URI, TABLE_URI, schema_cache
+from src.common.changefeed import changefeed_statement, notify_table_change, on_table_change, read_changefeed
+from src.common.ranges import get_primary_ranges, get_split_points, is_integer_type, key_spans, span_condition
 from mcp.server.fastmcp import Context
 from typing import Dict, Any, List, Optional
 from src.common.server import mcp
 from datetime import datetime
+import asyncio
+import base64
+import json
+import random
+import time
 import urllib.parse
 
 @mcp.tool()
-async def create_table(ctx: Context, table_name: str, columns: List[Dict[str, str]]) -> Dict[str, Any]:
+async def create_table(ctx: Context, table_name: str, columns: List[Dict[str, str]], detached: bool = False) -> Dict[str, Any]:
     """Enable the creation of new tables in the current database. You can instruct the AI to define table names, columns, and their types, streamlining database setup and schema evolution directly through natural language. 
     
     Args:
@@ -15,6 +27,7 @@ async def create_table(ctx: Context, table_name: str, columns: List[Dict[str, st
             - 'name' (str): column name (required)
             - 'datatype' (str): column datatype (required)
             - 'constraint' (str): column constraint (optional)
+        detached (bool): If True, return as soon as the schema change job is submitted, with its job ID to follow with get_job_status (default: False).
     
     Returns:
         A success message or an error message.
@@ -43,6 +56,9 @@ async def create_table(ctx: Context, table_name: str, columns: List[Dict[str, st
             col_defs.append(col_def)
         col_defs_str = ", ".join(col_defs)
         sql = f'CREATE TABLE IF NOT EXISTS "{table_name}" ({col_defs_str})'
+        if detached:
+            job = await submit_schema_change(sql, [table_name])
+            return {"success": True, **job, "message": f"Creation of table '{table_name}' {job['status']}."}
         async with pool.acquire() as conn:
             await conn.execute(sql)
         return {"success": True, "message": f"Table '{table_name}' created with columns: {col_defs_str}"}
@@ -51,7 +67,8 @@ async def create_table(ctx: Context, table_name: str, columns: List[Dict[str, st
 
 @mcp.tool()
 async def bulk_import(ctx: Context, table_name: str, file_url: str, format: str, 
-                    delimiter: str = ",", skip_header: bool = True) -> Dict[str, Any]:
+                    delimiter: str = ",", skip_header: bool = True, file_urls: Optional[List[str]] = None,
+                    detached: bool = False) -> Dict[str, Any]:
     """Bulk import data into a table from a file (CSV or Avro) stored in cloud or web storage. Supports S3, Azure Blob, Google Storage, HTTP/HTTPS URLs.
     
     Args:
@@ -60,9 +77,11 @@ async def bulk_import(ctx: Context, table_name: str, file_url: str, format: str,
         format (str): File format ('csv' or 'avro').
         delimiter (str): CSV delimiter (default: ',').
         skip_header (bool): Whether to skip the first row as header (default: True).
+        file_urls (List[str], optional): More data files, imported in the same job.
+        detached (bool): If True, return the import job ID at once instead of waiting for the import. Follow it with get_job_status and control it with manage_job (default: False).
     
     Returns:
-        A success message or an error message.
+        The import result (rows and bytes imported), or the job ID of a detached import, or an error message.
     
     Example:
         bulk_import(ctx, table_name="users", file_url="s3://bucket/data.csv", format="csv", delimiter=";", skip_header=True)
@@ -71,31 +90,334 @@ async def bulk_import(ctx: Context, table_name: str, file_url: str, format: str,
     if not pool:
         raise Exception("Not connected to database")
 
-    parsed = urllib.parse.urlparse(file_url)
-    if parsed.scheme not in ['s3', 'azure-blob', 'azure', 'gs', 'http', 'https']:
-        raise ValueError(f"Unsupported scheme: {parsed.scheme}")
+    urls = [file_url] + list(file_urls or [])
+    for url in urls:
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme not in ['s3', 'azure-blob', 'azure', 'gs', 'http', 'https']:
+            raise ValueError(f"Unsupported scheme: {parsed.scheme}")
+    data = ", ".join([f"'{url}'" for url in urls])
     
     try:            
         async with pool.acquire() as conn:
             if format == "csv":
+                options = [f"delimiter = '{delimiter}'", f"skip = '{1 if skip_header else 0}'"]
                 import_query = f"""
                 IMPORT INTO {table_name} 
-                CSV DATA ('{file_url}') 
-                WITH delimiter = '{delimiter}', skip = '{1 if skip_header else 0}'
+                CSV DATA ({data}) 
                 """
             elif format == "avro":
+                options = []
                 import_query = f"""
                 IMPORT INTO {table_name} 
-                AVRO DATA ('{file_url}') 
+                AVRO DATA ({data}) 
                 """
             else:
                 return {"success": False, "error": "Unsupported format"}
+
+            if detached:
+                options.append("DETACHED")
+            if options:
+                import_query += "WITH " + ", ".join(options)
             
-            result = await conn.execute(import_query)
-            return {"success": True, "result": result}
+            result = await conn.fetchrow(import_query)
+            if detached:
+                return {"success": True, "job_id": result["job_id"], "status": "running"}
+            return {"success": True, "result": dict(result) if result else None}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@mcp.tool()
+async def batched_mutation(ctx: Context, table_name: str, operation: str, where: str, set_clause: Optional[str] = None,
+                           batch_size: int = 1000, workers: int = 4, max_batches_per_second: Optional[float] = None,
+                           max_retries: int = 5, db_schema: str = "public") -> Dict[str, Any]:
+    """Delete or update many rows in small batches instead of one huge transaction, so that large cleanups do not cause contention or retries for foreground traffic.
+    The table is split along its range boundaries into primary key spans, processed by parallel workers. Each batch is its own transaction, retried on its own.
+    A batch whose commit outcome is unknown is only retried when running it twice is harmless: deletes, and updates that only assign constants. Otherwise its span is reported with an unknown outcome.
+    
+    Args:
+        table_name (str): Name of the table.
+        operation (str): 'delete' or 'update'.
+        where (str): SQL condition selecting the rows to delete or update, empty for all rows.
+        set_clause (str, optional): SET clause of an update, e.g. "status = 'archived'". Primary key columns must not be updated.
+        batch_size (int): Maximum number of rows per batch (default: 1000).
+        workers (int): Number of spans processed in parallel (default: 4).
+        max_batches_per_second (float, optional): Rate limit across all workers (default: no limit).
+        max_retries (int): Number of retries of a failing batch (default: 5).
+        db_schema (str): Schema name (default: "public").
+    
+    Returns:
+        The number of rows affected, batches run and retried, and the spans that failed, with "outcome": "unknown" when their last batch may have been applied.
+    """
+    if operation not in ("delete", "update"):
+        return {"success": False, "error": "Operation must be 'delete' or 'update'."}
+    if operation == "update" and not set_clause:
+        return {"success": False, "error": "An update requires a set_clause."}
+
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    try:
+        async with pool.acquire() as conn:
+            primary_key = await get_primary_key(conn, table_name, db_schema)
+            if not primary_key:
+                return {"success": False, "error": f"Table '{db_schema}.{table_name}' not found or has no primary key."}
+            leading = primary_key[0]
+            split_points = await get_split_points(conn, table_name, db_schema, leading["crdb_sql_type"], max_points=1024)
+
+        if leading["direction"].upper() == "DESC":
+            split_points.reverse()
+        spans = key_spans(split_points)
+        progress = {"rows_affected": 0, "batches": 0, "retries": 0, "spans_done": 0}
+        failed_spans = []
+        queue: asyncio.Queue = asyncio.Queue()
+        for span in spans:
+            queue.put_nowait(span)
+
+        # A batch that may have committed can only be run again when that changes nothing more
+        retried_errors = ("40001", "40003") if operation == "delete" or is_constant_set_clause(set_clause) else ("40001",)
+        rate_lock = asyncio.Lock()
+        next_batch_time = [time.monotonic()]
+
+        async def throttle():
+            if not max_batches_per_second:
+                return
+            async with rate_lock:
+                delay = next_batch_time[0] - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_batch_time[0] = max(next_batch_time[0], time.monotonic()) + 1 / max_batches_per_second
+
+        async def process_span(span):
+            last_key = None
+            while True:
+                query, params = build_mutation_batch(table_name, db_schema, primary_key, operation, where,
+                                                     set_clause, span, last_key, batch_size)
+                for attempt in range(max_retries + 1):
+                    await throttle()
+                    try:
+                        # A connection is only held for one batch, so foreground calls get their turn
+                        async with pool.acquire() as conn:
+                            last = await conn.fetchrow(query, *params)
+                        break
+                    except Exception as e:
+                        # Only transaction retry errors are retried: serialization failures and,
+                        # for idempotent batches, statements whose completion is unknown
+                        if attempt == max_retries or getattr(e, "sqlstate", None) not in retried_errors:
+                            raise
+                        progress["retries"] += 1
+                        await asyncio.sleep(min(5.0, 0.1 * 2 ** attempt))
+
+                affected = last["_batch_rows"] if last else 0
+                progress["batches"] += 1
+                progress["rows_affected"] += affected
+                if affected < batch_size:
+                    return
+                last_key = [last[f"_batch_last_{i}"] for i in range(len(primary_key))]
+
+        async def worker():
+            while not queue.empty():
+                span = queue.get_nowait()
+                try:
+                    await process_span(span)
+                except Exception as e:
+                    failed_span = {"start": span[0], "end": span[1], "error": str(e)}
+                    if getattr(e, "sqlstate", None) == "40003":
+                        failed_span["outcome"] = "unknown"
+                    failed_spans.append(failed_span)
+                progress["spans_done"] += 1
+                await ctx.report_progress(progress["spans_done"], len(spans))
+
+        await asyncio.gather(*[worker() for _ in range(max(1, min(workers, len(spans))))])
+
+        return {
+            "success": not failed_spans,
+            "rows_affected": progress["rows_affected"],
+            "batches": progress["batches"],
+            "retries": progress["retries"],
+            "spans": len(spans),
+            "failed_spans": failed_spans
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def build_mutation_batch(table_name: str, db_schema: str, primary_key: List[Dict[str, Any]], operation: str,
+                         where: str, set_clause: Optional[str], span, last_key: Optional[List[str]], batch_size: int):
+    """Build one batch of a batched mutation: the next `batch_size` matching rows of a span, in primary key order.
+
+    It returns no row when no row was affected, otherwise one row with the number of affected
+    rows and, as text, the last affected key in primary key order, where the next batch starts.
+    """
+    leading = primary_key[0]
+    condition, params = span_condition(f'"{leading["column_name"]}"', leading["crdb_sql_type"], span, 1)
+
+    key_columns = [f'"{col["column_name"]}"' for col in primary_key]
+    conditions = [f"({where})", condition] if where and where.strip() else [condition]
+    if last_key:
+        # Continue after the last key of the previous batch
+        conditions.append(keyset_condition(primary_key, len(params) + 1))
+        params += list(last_key)
+
+    target = f'"{db_schema}"."{table_name}"'
+    descending = [col["direction"].upper() == "DESC" for col in primary_key]
+    returning = ", ".join([f"{col} AS _batch_key_{i}" for i, col in enumerate(key_columns)])
+    order = ", ".join([f"{col} {'DESC' if descending[i] else 'ASC'}" for i, col in enumerate(key_columns)])
+    if operation == "delete":
+        mutation = f"DELETE FROM {target}"
+    else:
+        mutation = f"UPDATE {target} SET {set_clause}"
+    mutation += f" WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT {int(batch_size)} RETURNING {returning}"
+
+    # RETURNING does not follow the ORDER BY: the last key is found in primary key order by the database
+    keys = ", ".join([f"_batch_key_{i}::STRING AS _batch_last_{i}" for i in range(len(key_columns))])
+    reverse = ", ".join([f"_batch_key_{i} {'ASC' if descending[i] else 'DESC'}" for i in range(len(key_columns))])
+    query = f"WITH batch AS ({mutation}) SELECT count(*) OVER () AS _batch_rows, {keys} FROM batch ORDER BY {reverse} LIMIT 1"
+
+    return query, params
+
+@mcp.tool()
+async def table_stats(ctx: Context, table_name: str, exact: bool = False, as_of_system_time: str = "follower_read_timestamp()",
+                      workers: int = 8, max_age: float = 60, db_schema: str = "public") -> Dict[str, Any]:
+    """Get the row count and on-disk size of a table without a full count(*) scan.
+    By default, the row count is estimated from the live keys of the primary index in the range statistics. With exact, rows are counted range by range in parallel, at one point in time. Results are cached per table: exact counts are refreshed incrementally, by recounting only the ranges whose live key count changed. Reused counts keep the time they were taken at, so such a total is reported with exact False and the time of its oldest count.
+    
+    Args:
+        table_name (str): Name of the table.
+        exact (bool): If True, count the rows exactly (default: False).
+        as_of_system_time (str): Point in time of exact counts, e.g. '-10s' or 'follower_read_timestamp()', which lets followers serve the reads (default: 'follower_read_timestamp()').
+        workers (int): Number of ranges counted in parallel (default: 8).
+        max_age (float): Seconds during which a cached estimate is returned without being recomputed (default: 60).
+        db_schema (str): Schema name (default: "public").
+    
+    Returns:
+        The row count (estimated, exact, or combined from counts taken at several times), live and on-disk bytes, range count and per index sizes.
+    """
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    key = (get_current_database(ctx), db_schema, table_name)
+    cached = _table_stats_cache.get(key, {})
+    try:
+        if cached.get("sizes") and time.monotonic() - cached["sizes_time"] < max_age:
+            sizes = cached["sizes"]
+        else:
+            async with pool.acquire() as conn:
+                sizes = await get_table_sizes(conn, table_name, db_schema)
+            cached.update({"sizes": sizes, "sizes_time": time.monotonic()})
+            _table_stats_cache[key] = cached
+
+        result = {"success": True, "table": table_name, "schema": db_schema, **sizes, "exact": exact}
+        if exact:
+            result.update(await count_table_rows(pool, table_name, db_schema, as_of_system_time, workers, cached))
+        return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# Sizes and per span counts of each table, by (database, schema, table)
+_table_stats_cache: Dict[tuple, Dict[str, Any]] = {}
+
+@on_table_change
+def invalidate_table_stats(table: str, keys: List[Any]):
+    # The table changed under a changefeed: recompute its sizes on the next call
+    for (_, _, cached_table), cached in _table_stats_cache.items():
+        if cached_table == table.split(".")[-1]:
+            cached.pop("sizes", None)
+
+async def get_table_sizes(conn, table_name: str, db_schema: str) -> Dict[str, Any]:
+    """Sizes of a table and of each of its indexes, from the span statistics of their ranges."""
+    rows = await conn.fetch(f"""
+    SELECT 
+        r.index_name,
+        i.index_type = 'primary' AS is_primary,
+        count(*) AS range_count,
+        sum((r.span_stats->>'live_count')::INT) AS live_count,
+        sum((r.span_stats->>'live_bytes')::INT) AS live_bytes,
+        sum((r.span_stats->>'approximate_disk_bytes')::INT) AS disk_bytes
+    FROM [SHOW RANGES FROM TABLE "{db_schema}"."{table_name}" WITH INDEXES, DETAILS] r
+    LEFT JOIN crdb_internal.table_indexes i
+        ON i.descriptor_id = $1::REGCLASS::INT AND i.index_name = r.index_name
+    GROUP BY r.index_name, i.index_type
+    """, f'"{db_schema}"."{table_name}"')
+
+    indexes = [dict(row) for row in rows]
+    return {
+        "row_count_estimate": sum(i["live_count"] or 0 for i in indexes if i["is_primary"]),
+        "live_bytes": sum(i["live_bytes"] or 0 for i in indexes),
+        "disk_bytes": sum(i["disk_bytes"] or 0 for i in indexes),
+        "range_count": sum(i["range_count"] for i in indexes),
+        "indexes": indexes
+    }
+
+async def count_table_rows(pool, table_name: str, db_schema: str, as_of_system_time: str, workers: int,
+                           cached: Dict[str, Any]) -> Dict[str, Any]:
+    """Count the rows of a table exactly, one primary key span per range, in parallel.
+
+    Spans whose ranges kept the same live key counts since the cached count are not recounted.
+    Those counts keep their own timestamp: the live key counts are read now, not at the
+    counts' timestamp, so a total with reused counts is not exact.
+    """
+    async with pool.acquire() as conn:
+        primary_key = await get_primary_key(conn, table_name, db_schema)
+        if not primary_key:
+            raise Exception(f"Table '{db_schema}.{table_name}' not found or has no primary key.")
+        leading = primary_key[0]
+        ranges = await get_primary_ranges(conn, table_name, db_schema, leading["crdb_sql_type"], with_stats=True)
+        as_of = await resolve_system_time(conn, as_of_system_time)
+
+    descending = leading["direction"].upper() == "DESC"
+    spans = key_spans([r["start"] for r in (reversed(ranges) if descending else ranges)])
+    # Range r covers the span starting at its start key. The first span, before the first
+    # split point, lies in a range shared with other keys: it has no signature and is always
+    # counted, like every span of a descending key, whose range bounds do not match the spans,
+    # and every span starting at a key several ranges start at (it covers all of them).
+    signatures = {span: None for span in spans}
+    if not descending:
+        starts: Dict[str, List[Dict[str, Any]]] = {}
+        for r in ranges:
+            starts.setdefault(r["start"], []).append(r)
+        for span in spans[1:]:
+            if len(starts.get(span[0], ())) == 1:
+                signatures[span] = tuple(starts[span[0]][0]["live_counts"])
+
+    previous = cached.get("span_counts", {})
+    counts: Dict[tuple, Dict[str, Any]] = {}
+    to_count = []
+    for span in spans:
+        known = previous.get(span)
+        if known and signatures[span] is not None and known["signature"] == signatures[span]:
+            counts[span] = known
+        else:
+            to_count.append(span)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for span in to_count:
+        queue.put_nowait(span)
+
+    column = f'"{leading["column_name"]}"'
+    async def worker():
+        while not queue.empty():
+            span = queue.get_nowait()
+            condition, params = span_condition(column, leading["crdb_sql_type"], span, 1)
+            async with pool.acquire() as conn:
+                count = await conn.fetchval(
+                    f'SELECT count(*) FROM "{db_schema}"."{table_name}" AS OF SYSTEM TIME \'{as_of}\' WHERE {condition}',
+                    *params)
+            counts[span] = {"count": count, "signature": signatures[span], "as_of": as_of}
+
+    await asyncio.gather(*[worker() for _ in range(max(1, min(workers, len(to_count))))])
+    cached["span_counts"] = counts
+
+    return {
+        "row_count": sum(c["count"] for c in counts.values()),
+        "exact": len(to_count) == len(spans),
+        "oldest_as_of": min((c["as_of"] for c in counts.values()), default=as_of),
+        "as_of_system_time": as_of,
+        "spans": len(spans),
+        "spans_counted": len(to_count),
+        "spans_reused": len(spans) - len(to_count)
+    }
+
 @mcp.tool()
 async def drop_table(ctx: Context, table_name: str) -> Dict[str, Any]:
     """Facilitate the deletion of existing tables from the database. This tool is useful for cleaning up test environments or managing schema changes, always with the necessary confirmations for security.
@@ -117,13 +439,16 @@ async def drop_table(ctx: Context, table_name: str) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 @mcp.tool()
-async def create_index(ctx: Context, table_name: str, index_name: str, columns: List[str]) -> Dict[str, Any]:
+async def create_index(ctx: Context, table_name: str, index_name: str, columns: List[str],
+                       storing: Optional[List[str]] = None, detached: bool = False) -> Dict[str, Any]:
     """Create a new index on a specified table to improve query performance. This tool allows users to define indexes on one or more columns, enabling faster data retrieval and optimized execution plans for read-heavy workloads.
     
     Args:
         table_name (str): Name of the table.
         index_name (str): Name of the index.
         columns (List[str]): List of column names to include in the index.
+        storing (List[str], optional): Columns stored in the index without being indexed, so queries reading them avoid a lookup join.
+        detached (bool): If True, return as soon as the index backfill job is submitted, with its job ID to follow with get_job_status (default: False).
     
     Returns:
         A success message or an error message.
@@ -133,12 +458,65 @@ async def create_index(ctx: Context, table_name: str, index_name: str, columns:
         raise Exception("Not connected to database")
     try:
         cols = ', '.join([f'"{col}"' for col in columns])
+        query = f'CREATE INDEX "{index_name}" ON "{table_name}" ({cols})'
+        if storing:
+            query += ' STORING (' + ', '.join([f'"{col}"' for col in storing]) + ')'
+        if detached:
+            job = await submit_schema_change(query, [index_name, table_name])
+            return {"success": True, **job, "message": f"Creation of index '{index_name}' on table '{table_name}' {job['status']}."}
         async with pool.acquire() as conn:
-            await conn.execute(f'CREATE INDEX "{index_name}" ON "{table_name}" ({cols})')
+            await conn.execute(query)
         return {"success": True, "message": f"Index '{index_name}' created on table '{table_name}'."}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+@mcp.tool()
+async def get_job_status(ctx: Context, job_id: int) -> Dict[str, Any]:
+    """Get the status of a background job, such as a detached schema change or import, from SHOW JOBS.
+    
+    Args:
+        job_id (int): ID of the job.
+    
+    Returns:
+        The job status, fraction completed, elapsed time and estimated time remaining. Imports also report the rows and bytes ingested, and the rates per second overall and since the previous call.
+    """
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+    try:
+        async with pool.acquire() as conn:
+            job = await get_job(conn, job_id)
+        if not job:
+            return {"success": False, "error": f"Job {job_id} not found."}
+        return {"success": True, "job": job}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@mcp.tool()
+async def manage_job(ctx: Context, job_id: int, action: str) -> Dict[str, Any]:
+    """Pause, resume or cancel a background job, such as a detached import.
+    
+    Args:
+        job_id (int): ID of the job.
+        action (str): 'pause', 'resume' or 'cancel'.
+    
+    Returns:
+        The job status after the action, or an error message.
+    """
+    if action not in JOB_ACTIONS:
+        return {"success": False, "error": f"Invalid action: {action}. Expected one of {', '.join(JOB_ACTIONS)}."}
+
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute(f"{JOB_ACTIONS[action]} {int(job_id)}")
+            job = await get_job(conn, job_id)
+        return {"success": True, "job": job}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 @mcp.tool()
 async def drop_index(ctx: Context, index_name: str) -> Dict[str, Any]:
     """Drop an existing index.
@@ -201,11 +579,15 @@ async def drop_view(ctx: Context, view_name: str) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 @mcp.tool()
-async def list_tables(ctx: Context, db_schema: str = "public") -> Dict[str, Any]:
+async def list_tables(ctx: Context, db_schema: str = "public", columns: Optional[List[str]] = None,
+                      name_filter: Optional[str] = None, columnar: bool = False) -> Dict[str, Any]:
     """List all tables present in the connected Cockroach database instance. This is invaluable for AI to understand the database’s landscape and identify relevant data sources for a given query. 
 
     Args:
         db_schema (str): Schema name (default: "public").
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return tables whose name contains this text (case-insensitive).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
     
     Returns:
         The list of all tables present in the connected Cockroach database.
@@ -224,14 +606,15 @@ async def list_tables(ctx: Context, db_schema: str = "public") -> Dict[str, Any]
     LEFT JOIN crdb_internal.table_row_statistics s 
         ON t.table_name = s.table_name
     WHERE t.table_schema = $1
-    ORDER BY t.table_name
     """
+    query, params = listing_query(query, [db_schema], columns=columns, name_column="table_name",
+                                  name_filter=name_filter, order_by="table_name")
     
     async with pool.acquire() as conn:
-        rows = await conn.fetch(query, db_schema)
+        rows = await conn.fetch(query, *params)
     
     return {
-        "tables": [dict(row) for row in rows],
+        "tables": listing_result(rows, columnar),
         "schema": db_schema,
         "count": len(rows)
     }
@@ -248,7 +631,7 @@ async def describe_table(ctx: Context, table_name: str, db_schema: str = "public
         Table details including columns, constraints, indexes, and metadata.
     """
     pool = await CockroachConnectionPool.get_connection_pool()
-    database = CockroachConnectionPool.current_database
+    database = get_current_database(ctx)
     if not pool:
         raise Exception("Not connected to database")
     
@@ -308,12 +691,348 @@ async def describe_table(ctx: Context, table_name: str, db_schema: str = "public
         "metadata": dict(metadata) if metadata else None
     }
 
+@mcp.resource(SCHEMA_URI, name="database_schema", mime_type="application/json")
+async def database_schema(database: str) -> str:
+    """The tables of a database, with their columns, indexes and foreign keys, and its views. The version changes with any schema change in the database."""
+    return await schema_cache.read_schema(database)
+
+@mcp.resource(TABLE_URI, name="table_schema", mime_type="application/json")
+async def table_schema(database: str, schema: str, table: str) -> str:
+    """The columns, indexes and foreign keys of a table. The version is its descriptor version, which changes with any schema change of the table."""
+    return await schema_cache.read_table(database, schema, table)
+
+@mcp.tool()
+async def paginate_table(ctx: Context, table_name: str, page_size: int = 100, columns: Optional[List[str]] = None,
+                         where: Optional[str] = None, as_of_system_time: Optional[str] = None,
+                         continuation_token: Optional[str] = None, db_schema: str = "public") -> Dict[str, Any]:
+    """Read a table page by page, following its primary key. Unlike OFFSET, every page costs the same whatever its depth. Pass the returned continuation token to get the next page.
+
+    Args:
+        table_name (str): Name of the table.
+        page_size (int): Number of rows per page (default: 100).
+        columns (List[str], optional): Columns to return (default: all columns).
+        where (str, optional): SQL condition filtering the rows.
+        as_of_system_time (str, optional): Pin every page to the same point in time, so pages stay consistent. Accepts a relative interval (e.g. '-10s'), 'follower_read_timestamp()' or a timestamp. Relative values are resolved once, on the first page.
+        continuation_token (str, optional): Token returned by the previous page. The columns, filter and timestamp of the first page are kept.
+        db_schema (str): Schema name (default: "public").
+
+    Returns:
+        A page of rows, and the token of the next page (None after the last page).
+    """
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    try:
+        last_key = None
+        if continuation_token:
+            state = decode_continuation_token(continuation_token)
+            if state["table"] != table_name or state["schema"] != db_schema:
+                return {"success": False, "error": "The continuation token belongs to another table."}
+            columns, where, as_of_system_time, last_key = state["columns"], state["where"], state["as_of"], state["key"]
+            if as_of_system_time is not None:
+                check_system_time(as_of_system_time)
+
+        async with pool.acquire() as conn:
+            primary_key = await get_primary_key(conn, table_name, db_schema)
+            if not primary_key:
+                return {"success": False, "error": f"Table '{db_schema}.{table_name}' not found or has no primary key."}
+
+            if as_of_system_time and not continuation_token:
+                as_of_system_time = await resolve_system_time(conn, as_of_system_time)
+
+            query, params = build_keyset_query(table_name, db_schema, primary_key, page_size + 1,
+                                               columns, where, as_of_system_time, last_key)
+            rows = await conn.fetch(query, *params)
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        key_names = [f"_pagination_key_{i}" for i in range(len(primary_key))]
+        page = [{k: v for k, v in dict(row).items() if k not in key_names} for row in rows]
+
+        next_token = None
+        if has_more:
+            next_token = encode_continuation_token({
+                "table": table_name,
+                "schema": db_schema,
+                "columns": columns,
+                "where": where,
+                "as_of": as_of_system_time,
+                "key": [rows[-1][k] for k in key_names]
+            })
+
+        return {
+            "success": True,
+            "rows": page,
+            "row_count": len(page),
+            "primary_key": [col["column_name"] for col in primary_key],
+            "as_of_system_time": as_of_system_time,
+            "continuation_token": next_token
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@mcp.tool()
+async def sample_table(ctx: Context, table_name: str, sample_size: int = 100, spans: int = 10,
+                       columns: Optional[List[str]] = None, follower_reads: bool = False,
+                       db_schema: str = "public") -> Dict[str, Any]:
+    """Return a random sample of a table's rows without scanning it, unlike ORDER BY random(). Random key spans are drawn from the table's range boundaries, and a few consecutive rows are read from each.
+    
+    Args:
+        table_name (str): Name of the table.
+        sample_size (int): Number of rows to return (default: 100).
+        spans (int): Number of random spans the rows are read from; more spans give a more representative sample (default: 10).
+        columns (List[str], optional): Columns to return (default: all columns).
+        follower_reads (bool): If True, read slightly stale data that the closest replica can serve (default: False).
+        db_schema (str): Schema name (default: "public").
+    
+    Returns:
+        The sampled rows, and the spans they were read from.
+    """
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    try:
+        async with pool.acquire() as conn:
+            primary_key = await get_primary_key(conn, table_name, db_schema)
+            if not primary_key:
+                return {"success": False, "error": f"Table '{db_schema}.{table_name}' not found or has no primary key."}
+            leading = primary_key[0]
+            column = f'"{leading["column_name"]}"'
+            table = f'"{db_schema}"."{table_name}"'
+            points = await get_split_points(conn, table_name, db_schema, leading["crdb_sql_type"])
+            if leading["direction"].upper() == "DESC":
+                points.reverse()
+
+            integer_key = is_integer_type(leading["crdb_sql_type"])
+            if integer_key:
+                # The ends of the key space, read from both ends of the index
+                lowest = await conn.fetchval(f"SELECT {column}::STRING FROM {table} ORDER BY {column} ASC LIMIT 1")
+                highest = await conn.fetchval(f"SELECT {column}::STRING FROM {table} ORDER BY {column} DESC LIMIT 1")
+                if lowest is None:
+                    return {"success": True, "rows": [], "row_count": 0, "spans": []}
+
+            all_spans = key_spans(points)
+            picked = random.sample(all_spans, min(spans, len(all_spans)))
+            per_span = -(-sample_size // len(picked))
+            projection = ", ".join([f'"{col}"' for col in columns]) if columns else "*"
+            rows = []
+            span_starts = []
+
+            async with conn.transaction(readonly=True):
+                if follower_reads:
+                    await conn.execute("SET TRANSACTION AS OF SYSTEM TIME follower_read_timestamp()")
+                for start, end in picked:
+                    if integer_key:
+                        # Start at a random key of the span, not always at its first row
+                        low, high = int(start if start is not None else lowest), int(end if end is not None else int(highest) + 1)
+                        if high > low:
+                            start = str(random.randrange(low, high))
+                    condition, params = span_condition(column, leading["crdb_sql_type"], (start, end), 1)
+                    span_rows = await conn.fetch(
+                        f"SELECT {projection} FROM {table} WHERE {condition} ORDER BY {column} LIMIT {int(per_span)}",
+                        *params)
+                    rows.extend(span_rows)
+                    span_starts.append({"start": start, "end": end, "rows": len(span_rows)})
+
+        return {
+            "success": True,
+            "rows": [dict(row) for row in rows[:sample_size]],
+            "row_count": min(len(rows), sample_size),
+            "spans": span_starts,
+            "follower_reads": follower_reads
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@mcp.tool()
+async def tail_table(ctx: Context, table_name: str, duration: float = 30, max_events: int = 1000,
+                     batch_size: int = 100, resolved_interval: float = 1, cursor: Optional[str] = None,
+                     diff: bool = False, buffer_size: int = 1000, db_schema: str = "public") -> Dict[str, Any]:
+    """Watch the row changes of a table as they happen, instead of polling it, with a core changefeed.
+    Changes are streamed to the client in batches as log notifications, and returned at the end with the last resolved timestamp, below which all changes have been seen. Pass it as cursor to resume from there.
+    
+    Args:
+        table_name (str): Name of the table to watch.
+        duration (float): Seconds to watch the table for (default: 30).
+        max_events (int): Stop after this many changes (default: 1000).
+        batch_size (int): Maximum number of changes per notification (default: 100).
+        resolved_interval (float): Seconds between resolved timestamps; pending changes are also sent at each of them (default: 1).
+        cursor (str, optional): Resolved timestamp of a previous call to resume from; by default only changes made from now on are watched.
+        diff (bool): If True, also return the previous value of changed rows (default: False).
+        buffer_size (int): Maximum number of changes buffered before the changefeed is held back (default: 1000).
+        db_schema (str): Schema name (default: "public").
+    
+    Returns:
+        The changes seen, and the resolved timestamp to resume from.
+    """
+    pool = await CockroachConnectionPool.get_connection_pool()
+    if not pool:
+        raise Exception("Not connected to database")
+
+    table = f'"{db_schema}"."{table_name}"'
+    buffer: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer_size))
+    events: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+    resolved = cursor
+    notifications = 0
+
+    async def publish():
+        nonlocal batch, notifications
+        if not batch:
+            return
+        notify_table_change(table_name, [event["key"] for event in batch])
+        await ctx.log("info", json.dumps({"table": table_name, "changes": batch, "resolved": resolved}, default=str),
+                      logger_name="tail_table")
+        await ctx.report_progress(len(events), max_events)
+        notifications += 1
+        batch = []
+
+    conn = None
+    reader = None
+    try:
+        # The changefeed holds its connection for the whole call, so it does not take one from the pool
+        conn = await CockroachConnectionPool.connect()
+        experimental = False
+        reader = asyncio.create_task(read_changefeed(conn, changefeed_statement(table, resolved_interval, cursor, diff), buffer))
+        deadline = time.monotonic() + duration
+
+        while len(events) < max_events and time.monotonic() < deadline:
+            if reader.done() and buffer.empty():
+                error = reader.exception()
+                if error and not experimental and not events and "syntax" in str(error).lower():
+                    # Versions without sinkless CREATE CHANGEFEED
+                    experimental = True
+                    reader = asyncio.create_task(read_changefeed(
+                        conn, changefeed_statement(table, resolved_interval, cursor, diff, experimental=True), buffer))
+                    continue
+                if error:
+                    raise error
+                break
+
+            try:
+                event = await asyncio.wait_for(buffer.get(), timeout=min(0.5, max(0.0, deadline - time.monotonic())))
+            except asyncio.TimeoutError:
+                continue
+
+            if "resolved" in event:
+                resolved = event["resolved"]
+                await publish()
+                continue
+            events.append(event)
+            batch.append(event)
+            if len(batch) >= batch_size:
+                await publish()
+
+        await publish()
+        return {
+            "success": True,
+            "table": table_name,
+            "changes": events,
+            "change_count": len(events),
+            "notifications": notifications,
+            "resolved": resolved
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e), "changes": events, "resolved": resolved}
+    finally:
+        if reader and not reader.done():
+            reader.cancel()
+        if conn:
+            # A changefeed does not end on its own, closing the session stops it
+            conn.terminate()
+
+async def get_primary_key(conn, table_name: str, db_schema: str) -> List[Dict[str, Any]]:
+    """Return the primary key columns of a table, in index order, with their direction and type."""
+    rows = await conn.fetch(f"""
+    SELECT 
+        i.column_name,
+        i.direction,
+        c.crdb_sql_type
+    FROM [SHOW INDEXES FROM "{db_schema}"."{table_name}"] i
+    JOIN information_schema.table_constraints tc
+        ON tc.constraint_name = i.index_name
+        AND tc.table_name = $1 AND tc.table_schema = $2
+        AND tc.constraint_type = 'PRIMARY KEY'
+    JOIN information_schema.columns c
+        ON c.column_name = i.column_name
+        AND c.table_name = $1 AND c.table_schema = $2
+    WHERE NOT i.storing
+    ORDER BY i.seq_in_index
+    """, table_name, db_schema)
+
+    return [dict(row) for row in rows]
+
+def build_keyset_query(table_name: str, db_schema: str, primary_key: List[Dict[str, Any]], limit: int,
+                       columns: Optional[List[str]], where: Optional[str], as_of_system_time: Optional[str],
+                       last_key: Optional[List[str]]):
+    """Build a seek query starting right after `last_key`, in primary key order.
+
+    The key of each row is also selected as text, to be carried in the continuation token.
+    """
+    projection = ", ".join([f'"{col}"' for col in columns]) if columns else "*"
+    key_columns = [f'"{col["column_name"]}"' for col in primary_key]
+    projection += "".join([f", {col}::STRING AS _pagination_key_{i}" for i, col in enumerate(key_columns)])
+
+    query = f'SELECT {projection} FROM "{db_schema}"."{table_name}"'
+    if as_of_system_time:
+        query += f" AS OF SYSTEM TIME '{as_of_system_time}'"
+
+    conditions = []
+    params = []
+    if where:
+        conditions.append(f"({where})")
+    if last_key:
+        conditions.append(keyset_condition(primary_key, 1))
+        params = list(last_key)
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    order = [f"{col} {'DESC' if primary_key[i]['direction'].upper() == 'DESC' else 'ASC'}" for i, col in enumerate(key_columns)]
+    query += f" ORDER BY {', '.join(order)} LIMIT {int(limit)}"
+
+    return query, params
+
+def keyset_condition(primary_key: List[Dict[str, Any]], first_param: int) -> str:
+    """Condition selecting the rows after a key, in primary key order. The key is passed as text parameters, numbered from `first_param`."""
+    key_columns = [f'"{col["column_name"]}"' for col in primary_key]
+    casts = [f"${first_param + i}::STRING::{col['crdb_sql_type']}" for i, col in enumerate(primary_key)]
+    descending = [col["direction"].upper() == "DESC" for col in primary_key]
+    if all(descending) or not any(descending):
+        # Uniform direction: a tuple comparison the optimizer turns into a single span
+        operator = "<" if descending[0] else ">"
+        return f"({', '.join(key_columns)}) {operator} ({', '.join(casts)})"
+
+    # Mixed directions: (a > x) OR (a = x AND b < y) OR ...
+    alternatives = []
+    for i in range(len(key_columns)):
+        terms = [f"{key_columns[j]} = {casts[j]}" for j in range(i)]
+        terms.append(f"{key_columns[i]} {'<' if descending[i] else '>'} {casts[i]}")
+        alternatives.append("(" + " AND ".join(terms) + ")")
+    return "(" + " OR ".join(alternatives) + ")"
+
+def encode_continuation_token(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+def decode_continuation_token(token: str) -> Dict[str, Any]:
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid continuation token")
+
 @mcp.tool()   
-async def list_views(ctx: Context, db_schema: str = "public") -> Dict[str, Any]:
+async def list_views(ctx: Context, db_schema: str = "public", columns: Optional[List[str]] = None,
+                     name_filter: Optional[str] = None, columnar: bool = False) -> Dict[str, Any]:
     """List all views in a schema.
     
     Args:
         db_schema (str): Schema name (default: "public").
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return views whose name contains this text (case-insensitive).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
     
     Returns:
         All views in a schema
@@ -328,24 +1047,29 @@ async def list_views(ctx: Context, db_schema: str = "public") -> Dict[str, Any]:
         view_definition
     FROM information_schema.views
     WHERE table_schema = $1
-    ORDER BY table_name
     """
+    query, params = listing_query(query, [db_schema], columns=columns, name_column="view_name",
+                                  name_filter=name_filter, order_by="view_name")
     
     async with pool.acquire() as conn:
-        rows = await conn.fetch(query, db_schema)
+        rows = await conn.fetch(query, *params)
     
     return {
-        "views": [dict(row) for row in rows],
+        "views": listing_result(rows, columnar),
         "schema": db_schema,
         "count": len(rows)
     }
 
 @mcp.tool()    
-async def get_table_relationships(ctx: Context, table_name: Optional[str] = None) -> Dict[str, Any]:
+async def get_table_relationships(ctx: Context, table_name: Optional[str] = None, columns: Optional[List[str]] = None,
+                                  name_filter: Optional[str] = None, columnar: bool = False) -> Dict[str, Any]:
     """Get foreign key relationships for a table or all tables.
     
     Args:
         table_name (str, optional): Table name to filter relationships (default: None).
+        columns (List[str], optional): Columns to return (default: all columns).
+        name_filter (str, optional): Only return relationships whose table name contains this text (case-insensitive).
+        columnar (bool): If True, return column names once and rows as arrays, a much more compact response.
     
     Returns:
         List all relationships for a specific table or in a schema.
@@ -362,7 +1086,8 @@ async def get_table_relationships(ctx: Context, table_name: Optional[str] = None
         ccu.column_name AS foreign_column_name,
         rc.constraint_name,
         rc.update_rule,
-        rc.delete_rule
+        rc.delete_rule,
+        kcu.ordinal_position
     FROM information_schema.table_constraints AS tc
     JOIN information_schema.key_column_usage AS kcu
         ON tc.constraint_name = kcu.constraint_name
@@ -377,14 +1102,18 @@ async def get_table_relationships(ctx: Context, table_name: Optional[str] = None
     if table_name:
         query += " AND tc.table_name = $1"
         params.append(table_name)
-    
-    query += " ORDER BY tc.table_name, kcu.ordinal_position"
+
+    # ordinal_position is only selected for ordering
+    columns = columns or ["table_name", "column_name", "foreign_table_name", "foreign_column_name",
+                          "constraint_name", "update_rule", "delete_rule"]
+    query, params = listing_query(query, params, columns=columns, name_column="table_name",
+                                  name_filter=name_filter, order_by="table_name, ordinal_position")
     
     async with pool.acquire() as conn:
         rows = await conn.fetch(query, *params)
     
     return {
-        "relationships": [dict(row) for row in rows],
+        "relationships": listing_result(rows, columnar),
         "count": len(rows)
     }
 
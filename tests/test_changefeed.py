@@ -0,0 +1,42 @@
+import pytest
+from src.common.changefeed import changefeed_statement, decode_copy_field, parse_changefeed_row
+
+
+def test_changefeed_statement():
+    assert changefeed_statement('"public"."t"', 1) == \
+        "COPY (CREATE CHANGEFEED FOR TABLE \"public\".\"t\" WITH updated, resolved = '1.0s', no_initial_scan) TO STDOUT"
+
+
+def test_changefeed_statement_with_cursor():
+    statement = changefeed_statement("t", 0.5, "1700000000000000000.0000000001", diff=True, experimental=True)
+    assert statement == ("COPY (EXPERIMENTAL CHANGEFEED FOR t WITH updated, resolved = '0.5s', "
+                         "cursor = '1700000000000000000.0000000001', diff) TO STDOUT")
+
+
+@pytest.mark.parametrize("cursor", ["1' ; DROP TABLE t; --", "-10s", "1.", "now()", "1\n"])
+def test_changefeed_statement_rejects_invalid_cursors(cursor):
+    with pytest.raises(ValueError):
+        changefeed_statement("t", 1, cursor)
+
+
+def test_decode_copy_field():
+    assert decode_copy_field("\\N") is None
+    assert decode_copy_field("a\\tb\\\\c\\nd") == "a\tb\\c\nd"
+    assert decode_copy_field("\\101") == "A"
+
+
+def test_parse_changefeed_row_upsert():
+    row = 't\t[1]\t{"after": {"id": 1, "v": "a\\\\tb"}, "updated": "10.0"}'
+    assert parse_changefeed_row(row) == {
+        "table": "t", "key": [1], "operation": "upsert", "after": {"id": 1, "v": "a\tb"}, "updated": "10.0"
+    }
+
+
+def test_parse_changefeed_row_delete_with_diff():
+    event = parse_changefeed_row('t\t[1]\t{"after": null, "before": {"id": 1}, "updated": "11.0"}')
+    assert event["operation"] == "delete"
+    assert event["before"] == {"id": 1}
+
+
+def test_parse_changefeed_row_resolved():
+    assert parse_changefeed_row('\\N\t\\N\t{"resolved": "12.0"}') == {"resolved": "12.0"}
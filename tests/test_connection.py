@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from src.common.config import CRDB_CONFIG, POOL_SETTINGS
+from src.common.connection import CockroachConnectionPool, pool_size, reset_connection, workload_class
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(max_size, introspection, admin, min_size=5):
+        monkeypatch.setitem(CRDB_CONFIG, "pool_max_size", max_size)
+        monkeypatch.setitem(CRDB_CONFIG, "pool_min_size", min_size)
+        monkeypatch.setitem(CRDB_CONFIG, "introspection_pool_size", introspection)
+        monkeypatch.setitem(CRDB_CONFIG, "admin_pool_size", admin)
+    return set_budget
+
+
+def total(*workloads):
+    return sum(pool_size(workload)[1] for workload in workloads)
+
+
+def test_pool_size_splits_the_budget(budget):
+    budget(20, 4, 4)
+    assert pool_size("interactive") == (5, 12)
+    assert pool_size("introspection") == (0, 4)
+    assert pool_size("admin") == (0, 4)
+
+
+def test_pool_size_stays_within_a_small_budget(budget):
+    budget(3, 4, 4)
+    assert pool_size("interactive") == (1, 1)
+    assert total("interactive", "introspection", "admin") == 3
+
+
+def test_pool_size_allows_empty_classes(budget):
+    # A worker's share of 16 workers with a budget of 20
+    budget(1, 0, 0)
+    assert pool_size("interactive") == (1, 1)
+    assert pool_size("introspection") == (0, 0)
+    assert pool_size("admin") == (0, 0)
+
+
+class FakePool:
+    _closed = False
+
+    def __init__(self, url, **options):
+        self.url = url
+        self.options = options
+
+
+def test_switching_databases_without_an_admin_share(budget, monkeypatch):
+    import asyncpg
+
+    async def create_pool(url, **options):
+        if not options["max_size"]:
+            raise ValueError("max_size is expected to be greater than zero")
+        return FakePool(url, **options)
+
+    budget(20, 4, 0)
+    monkeypatch.setattr(asyncpg, "create_pool", create_pool)
+    monkeypatch.setattr(CockroachConnectionPool, "_pools", {})
+    monkeypatch.setattr(CockroachConnectionPool, "_building", {})
+    monkeypatch.setattr(CockroachConnectionPool, "database_url", "")
+    monkeypatch.setattr(CockroachConnectionPool, "current_database", "")
+    token = workload_class.set("admin")
+    try:
+        pool = asyncio.run(CockroachConnectionPool.refresh_connection_pool(
+            "localhost", 26257, "other", "root", None, "disable", None, None, None))
+    finally:
+        workload_class.reset(token)
+
+    assert pool.options["max_size"] == 16
+    assert CockroachConnectionPool._pools == {"interactive": pool}
+    assert CockroachConnectionPool.current_database == "other"
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, query):
+        self.statements.append(query)
+
+
+def test_released_connections_get_the_pool_session_back(monkeypatch):
+    monkeypatch.setitem(POOL_SETTINGS, "introspection", {"application_name": "mcp-cockroachdb/introspection",
+                                                         "statement_timeout": "60s", "search_path": "it's"})
+    conn = FakeConnection()
+    asyncio.run(reset_connection(conn, workload="introspection", database="defaultdb"))
+
+    assert conn.statements == [
+        "RESET ALL; "
+        'SET database = "defaultdb"; '
+        "SET application_name = 'mcp-cockroachdb/introspection'; "
+        "SET statement_timeout = '60s'; "
+        "SET search_path = 'it''s'"
+    ]
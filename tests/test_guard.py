@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from src.common.config import MCP_CONFIG
+from src.common.guard import QueryGuard, assess_plan
+from src.common.plan import parse_plan
+
+FULL_SCAN_PLAN = [
+    "distribution: full",
+    "vectorized: true",
+    "",
+    "• scan",
+    "  estimated row count: 500,000 (100% of the table; stats collected 2 minutes ago)",
+    "  table: orders@orders_pkey",
+    "  spans: FULL SCAN",
+    "",
+    "index recommendations: 1",
+    "1. type: index creation",
+    "   SQL command: CREATE INDEX ON orders (status);",
+]
+
+CROSS_JOIN_PLAN = [
+    "• cross join",
+    "│ estimated row count: 100",
+    "│",
+    "├── • scan",
+    "│     estimated row count: 10",
+    "│     table: a@a_pkey",
+    "│     spans: FULL SCAN",
+    "│",
+    "└── • scan",
+    "      estimated row count: 10",
+    "      table: b@b_pkey",
+    "      spans: [/1 - /10]",
+]
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setitem(MCP_CONFIG, "guard_full_scan_rows", 100000)
+    monkeypatch.setitem(MCP_CONFIG, "guard_max_rows", 10000000)
+
+
+def test_assess_plan_flags_large_full_scans():
+    verdict = assess_plan(parse_plan(FULL_SCAN_PLAN))
+    assert not verdict["allowed"]
+    assert verdict["reasons"] == ["full scan of orders (~500000 rows)"]
+    assert verdict["full_scan_tables"] == ["orders"]
+    assert verdict["suggested_indexes"] == ["CREATE INDEX ON orders (status);"]
+    assert verdict["limitable"]
+
+
+def test_assess_plan_flags_cross_joins():
+    verdict = assess_plan(parse_plan(CROSS_JOIN_PLAN))
+    assert verdict["reasons"] == ["cross join (~100 rows)"]
+    assert verdict["max_estimated_rows"] == 100
+    # The cross join reads its inputs whole, a LIMIT above it does not bound the scans
+    assert not verdict["limitable"]
+
+
+def test_assess_plan_flags_large_estimates(monkeypatch):
+    monkeypatch.setitem(MCP_CONFIG, "guard_full_scan_rows", 1000000)
+    monkeypatch.setitem(MCP_CONFIG, "guard_max_rows", 1000)
+    verdict = assess_plan(parse_plan(FULL_SCAN_PLAN))
+    assert verdict["reasons"] == ["an operator processes ~500000 rows, above 1000"]
+
+
+def test_assess_plan_sorted_scans_are_not_limitable():
+    sorted_plan = ["• sort", "│ estimated row count: 500,000", "│ order: +status", "│",
+                   "└── • scan", "      estimated row count: 500,000", "      table: orders@orders_pkey",
+                   "      spans: FULL SCAN"]
+    verdict = assess_plan(parse_plan(sorted_plan))
+    assert not verdict["allowed"] and not verdict["limitable"]
+
+
+def test_assess_plan_allows_small_plans(monkeypatch):
+    monkeypatch.setitem(MCP_CONFIG, "guard_full_scan_rows", 1000000)
+    assert assess_plan(parse_plan(FULL_SCAN_PLAN))["allowed"]
+
+
+class FakeConnection:
+    def __init__(self, plan=None):
+        self.plan = plan
+        self.explained = 0
+
+    async def fetch(self, query, *params, timeout=None):
+        self.explained += 1
+        if self.plan is None:
+            raise ValueError("cannot explain")
+        return [{"info": line} for line in self.plan]
+
+
+def test_query_guard_caches_verdicts():
+    guard, conn = QueryGuard(), FakeConnection(FULL_SCAN_PLAN)
+    first = asyncio.run(guard.check(conn, "SELECT * FROM orders", None, "db"))
+    second = asyncio.run(guard.check(conn, "SELECT *  FROM orders;", None, "db"))
+    assert (first["checked"], first["cached"], second["cached"]) == (True, False, True)
+    assert conn.explained == 1
+    assert guard.stats()["flagged"] == 1
+
+
+def test_query_guard_statements_that_cannot_be_explained():
+    assert asyncio.run(QueryGuard().check(FakeConnection(), "CREATE TABLE t (a INT)", None, "db")) is None
@@ -0,0 +1,17 @@
+from src.tools.cluster_monitoring import compare_hot_range_snapshots
+
+
+def hot_range(range_id, qps):
+    return {"range_id": range_id, "table_name": "t", "index_name": "t_pkey", "qps": qps}
+
+
+def test_no_previous_snapshot():
+    assert compare_hot_range_snapshots([hot_range(1, 10.0)], "qps", 1.5, None) == []
+
+
+def test_heating_and_new_ranges():
+    previous = {1: {"qps": 10.0}, 2: {"qps": 10.0}}
+    heating = compare_hot_range_snapshots(
+        [hot_range(1, 30.0), hot_range(2, 11.0), hot_range(3, 50.0), hot_range(4, 0.0)], "qps", 1.5, previous)
+
+    assert [(h["range_id"], h["new"], h["increase"]) for h in heating] == [(1, False, 20.0), (3, True, None)]
@@ -0,0 +1,22 @@
+import re
+from src.common.jobs import identifier_pattern
+
+
+def matches(name, description):
+    return re.search(identifier_pattern(name), description) is not None
+
+
+def test_identifier_pattern_matches_whole_names():
+    description = "CREATE INDEX idx ON defaultdb.public.items (name ASC)"
+    assert matches("idx", description)
+    assert matches("items", description)
+    assert not matches("item", description)
+    assert not matches("idx", "CREATE INDEX idx_2 ON defaultdb.public.items (name ASC)")
+    assert not matches("t", description)
+
+
+def test_identifier_pattern_matches_quoted_names():
+    description = 'CREATE INDEX "Idx ""a""" ON defaultdb.public."Order Items" (name ASC)'
+    assert matches('Idx "a"', description)
+    assert matches("Order Items", description)
+    assert not matches("Order", description)
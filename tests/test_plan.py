@@ -0,0 +1,71 @@
+from src.common.plan import diff_plans, normalize_query, parse_plan, parse_row_count
+
+PLAN = [
+    "distribution: local",
+    "vectorized: true",
+    "",
+    "• filter",
+    "│ estimated row count: 1,000",
+    "│ filter: status = 'open'",
+    "│",
+    "└── • scan",
+    "      estimated row count: 50,000 (100% of the table; stats collected 3 minutes ago)",
+    "      table: orders@orders_pkey",
+    "      spans: FULL SCAN",
+    "",
+    "index recommendations: 1",
+    "1. type: index creation",
+    "   SQL command: CREATE INDEX ON orders (status);",
+]
+
+INDEXED_PLAN = [
+    "distribution: local",
+    "vectorized: true",
+    "",
+    "• scan",
+    "  estimated row count: 1,000",
+    "  table: orders@orders_status_idx",
+    "  spans: [/'open' - /'open']",
+]
+
+
+def test_parse_row_count():
+    assert parse_row_count("50,000 (100% of the table; stats collected 3 minutes ago)") == 50000
+    assert parse_row_count(None) is None
+
+
+def test_parse_plan_tree():
+    plan = parse_plan(PLAN)
+    root = plan["root"]
+    assert (plan["distribution"], plan["vectorized"]) == ("local", True)
+    assert root["operator"] == "filter" and root["estimated_rows"] == 1000
+    assert root["attributes"]["filter"] == "status = 'open'"
+
+    [scan] = root["children"]
+    assert (scan["operator"], scan["table"], scan["index"]) == ("scan", "orders", "orders_pkey")
+    assert scan["estimated_rows"] == 50000 and scan["full_scan"]
+    assert plan["full_scan_tables"] == ["orders"]
+    assert plan["estimated_rows"] == 1000
+    assert plan["index_recommendations"] == ["CREATE INDEX ON orders (status);"]
+
+
+def test_plan_fingerprint_ignores_row_estimates():
+    changed = [line.replace("50,000", "60,000") for line in PLAN]
+    assert parse_plan(changed)["fingerprint"] == parse_plan(PLAN)["fingerprint"]
+    assert parse_plan(INDEXED_PLAN)["fingerprint"] != parse_plan(PLAN)["fingerprint"]
+
+
+def test_diff_plans():
+    diff = diff_plans(parse_plan(INDEXED_PLAN), parse_plan(PLAN))
+    assert not diff["same_plan"]
+    assert diff["new_full_scans"] == ["orders"]
+    assert [change["change"] for change in diff["changes"]] == ["operator changed", "operator added"]
+
+
+def test_parse_empty_plan():
+    plan = parse_plan([])
+    assert plan["root"] is None and plan["estimated_rows"] is None and not plan["full_scan"]
+
+
+def test_normalize_query():
+    assert normalize_query("SELECT  *\n FROM t; -- all") == "SELECT * FROM t"
@@ -0,0 +1,46 @@
+import asyncio
+import uuid
+from src.common.ranges import key_spans, valid_points
+
+
+def test_key_spans():
+    assert key_spans(["5", "9"]) == [(None, "5"), ("5", "9"), ("9", None)]
+
+
+def test_key_spans_without_split_points():
+    assert key_spans([]) == [(None, None)]
+
+
+def test_key_spans_deduplicates_repeated_split_points():
+    assert key_spans(["5", "5", "9"]) == [(None, "5"), ("5", "9"), ("9", None)]
+
+
+class FakeConnection:
+    """Casts points to a UUID-like type: only 36 character points are valid."""
+
+    def __init__(self):
+        self.queries = 0
+
+    async def fetchval(self, query, value):
+        self.queries += 1
+        points = value if isinstance(value, list) else [value]
+        if any(len(point) != 36 for point in points):
+            raise ValueError("invalid input syntax")
+        return len(points)
+
+
+def test_valid_points_integers_need_no_round_trip():
+    assert asyncio.run(valid_points(None, ["1", "-2", "x"], "INT8")) == {"1", "-2"}
+
+
+def test_valid_points_checks_all_points_at_once():
+    conn = FakeConnection()
+    points = [str(uuid.UUID(int=i)) for i in range(100)]
+    assert asyncio.run(valid_points(conn, points, "UUID")) == set(points)
+    assert conn.queries == 1
+
+
+def test_valid_points_falls_back_to_each_point():
+    conn = FakeConnection()
+    point = str(uuid.UUID(int=1))
+    assert asyncio.run(valid_points(conn, [point, "abc"], "UUID")) == {point}
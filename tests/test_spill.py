@@ -0,0 +1,61 @@
+import os
+import pytest
+from src.common.config import MCP_CONFIG
+from src.common.spill import SpillWriter, read_spill, result_uri
+
+
+@pytest.fixture(autouse=True)
+def spill_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(MCP_CONFIG, "spill_dir", str(tmp_path))
+    monkeypatch.setitem(MCP_CONFIG, "spill_ttl", 3600)
+    monkeypatch.setitem(MCP_CONFIG, "spill_budget", 1024 * 1024)
+    return tmp_path
+
+
+def spill(rows, page_size, columns=("id", "name")):
+    writer = SpillWriter(list(columns), page_size)
+    for row in rows:
+        if not writer.write(row):
+            break
+    return writer.close()
+
+
+def test_spilled_pages():
+    rows = [{"id": i, "name": f"row\n{i}"} for i in range(25)]
+    spilled = spill(rows, page_size=10)
+    assert spilled["row_count"] == 25 and not spilled["full"]
+
+    pages = [read_spill(spilled["result_id"], page) for page in range(3)]
+    assert [page["rows"] for page in pages] == [rows[:10], rows[10:20], rows[20:]]
+    assert pages[0]["pages"] == 3 and pages[0]["columns"] == ["id", "name"]
+    assert pages[0]["next_page_uri"] == result_uri(spilled["result_id"], 1)
+    assert pages[2]["next_page_uri"] is None
+
+
+def test_empty_spill_has_one_page():
+    page = read_spill(spill([], page_size=10)["result_id"], 0)
+    assert (page["rows"], page["pages"], page["row_count"]) == ([], 1, 0)
+
+
+def test_spill_stops_at_the_budget(monkeypatch):
+    monkeypatch.setitem(MCP_CONFIG, "spill_budget", 200)
+    spilled = spill([{"id": i, "name": "x" * 20} for i in range(100)], page_size=10)
+    assert spilled["full"] and 0 < spilled["row_count"] < 100
+    assert len(read_spill(spilled["result_id"], 0)["rows"]) == min(10, spilled["row_count"])
+
+
+def test_read_spill_rejects_bad_pages_and_ids(spill_dir):
+    result_id = spill([{"id": 1, "name": "a"}], page_size=10)["result_id"]
+    with pytest.raises(ValueError):
+        read_spill(result_id, 1)
+    with pytest.raises(ValueError):
+        read_spill("../" + result_id, 0)
+    with pytest.raises(ValueError):
+        read_spill("0" * 32, 0)
+
+
+def test_discarded_spill_leaves_no_files(spill_dir):
+    writer = SpillWriter(["id"], 10)
+    writer.write({"id": 1})
+    writer.discard()
+    assert os.listdir(spill_dir) == []
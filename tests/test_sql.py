@@ -0,0 +1,71 @@
+import pytest
+from src.common.sql import apply_row_limit, check_system_time, is_constant_set_clause, is_read_query, is_single_statement, scan_statement
+
+
+def test_scan_statement_strips_comments_and_semicolons():
+    statement, words = scan_statement("SELECT 1 -- one\n;;")
+    assert statement == "SELECT 1"
+    assert [word for word, _ in words] == ["select", ";", ";"]
+
+
+def test_scan_statement_ignores_quoted_text():
+    _, words = scan_statement("SELECT 'delete; from' AS \"update\", $$insert$$")
+    assert [word for word, _ in words] == ["select", "as"]
+
+
+def test_scan_statement_depth():
+    _, words = scan_statement("SELECT * FROM (SELECT a FROM t)")
+    assert ("a", 1) in words and ("from", 0) in words
+
+
+def test_is_single_statement():
+    assert is_single_statement("SELECT 1")
+    assert not is_single_statement("SELECT 1; SELECT 2")
+    assert is_single_statement("SELECT ';'")
+
+
+def test_is_read_query():
+    assert is_read_query("WITH t AS (SELECT 1) SELECT * FROM t")
+    assert is_read_query("SHOW TABLES")
+    assert not is_read_query("WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d")
+    assert not is_read_query("SELECT 1; DROP TABLE t")
+    assert not is_read_query("CREATE TABLE t (a INT)")
+
+
+def test_apply_row_limit_wraps_reads():
+    assert apply_row_limit("SELECT * FROM t LIMIT 5;", 11) == \
+        "SELECT * FROM (SELECT * FROM t LIMIT 5) AS limited_result LIMIT 11"
+    assert apply_row_limit("SHOW TABLES", 3) == "SELECT * FROM [SHOW TABLES] LIMIT 3"
+
+
+def test_apply_row_limit_skips_writes():
+    assert apply_row_limit("DELETE FROM t", 10) is None
+    assert apply_row_limit("SELECT 1; SELECT 2", 10) is None
+
+
+def test_apply_row_limit_skips_top_level_system_time():
+    assert apply_row_limit("SELECT * FROM t AS OF SYSTEM TIME '-10s'", 10) is None
+    assert apply_row_limit("SELECT * FROM t as   of system\ntime follower_read_timestamp()", 10) is None
+    # Not an AS OF SYSTEM TIME clause of the statement itself
+    assert apply_row_limit("SELECT 'as of system time' FROM t", 10) is not None
+
+
+def test_apply_row_limit_skips_show_forms_without_rows_source():
+    assert apply_row_limit("SHOW TRANSACTION ISOLATION LEVEL", 10) is None
+    assert apply_row_limit("SHOW search_path", 10) is None
+    assert apply_row_limit("SHOW RANGES FROM TABLE t", 10) == "SELECT * FROM [SHOW RANGES FROM TABLE t] LIMIT 10"
+
+
+def test_check_system_time():
+    assert check_system_time("2024-01-01 00:00:00") == "2024-01-01 00:00:00"
+    with pytest.raises(ValueError):
+        check_system_time("-10s' UNION SELECT 1 --")
+
+
+def test_is_constant_set_clause():
+    assert is_constant_set_clause("status = 'archived'")
+    assert is_constant_set_clause("status = 'it''s, done', \"Count\" = -1, archived = TRUE, note = NULL::STRING")
+    assert not is_constant_set_clause("n = n + 1")
+    assert not is_constant_set_clause("updated_at = now()")
+    assert not is_constant_set_clause("status = 'a', n = n + 1")
+    assert not is_constant_set_clause("status = other_column")
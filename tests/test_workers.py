@@ -0,0 +1,35 @@
+import pytest
+from src.common.config import CRDB_CONFIG
+from src.common.workers import split_pool_budget
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(max_size, introspection=4, admin=4):
+        monkeypatch.setitem(CRDB_CONFIG, "pool_max_size", max_size)
+        monkeypatch.setitem(CRDB_CONFIG, "introspection_pool_size", introspection)
+        monkeypatch.setitem(CRDB_CONFIG, "admin_pool_size", admin)
+    return set_budget
+
+
+def test_split_pool_budget(budget):
+    budget(20)
+    assert split_pool_budget(2) == {"pool_max_size": 10, "introspection_pool_size": 2, "admin_pool_size": 2}
+
+
+def test_split_pool_budget_keeps_a_connection_per_class(budget):
+    budget(24)
+    # 4 // 8 is 0, each worker still gets one introspection and one admin connection
+    assert split_pool_budget(8) == {"pool_max_size": 3, "introspection_pool_size": 1, "admin_pool_size": 1}
+
+
+def test_split_pool_budget_refuses_too_many_workers(budget):
+    budget(20)
+    with pytest.raises(ValueError):
+        split_pool_budget(8)
+    assert split_pool_budget(6)["pool_max_size"] == 3
+
+
+def test_split_pool_budget_without_admin_pool(budget):
+    budget(16, admin=0)
+    assert split_pool_budget(8) == {"pool_max_size": 2, "introspection_pool_size": 1, "admin_pool_size": 0}
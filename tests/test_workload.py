@@ -0,0 +1,65 @@
+import datetime
+import uuid
+from decimal import Decimal
+from src.common.workload import WorkloadRecorder, load_workload, run_log_path
+
+
+def test_run_log_path():
+    assert run_log_path("/tmp/workload.log.gz", 1700000000, 42) == "/tmp/workload.log.1700000000-42.gz"
+    assert run_log_path("workload.log", 1700000000, 42) == "workload.log.1700000000-42"
+
+
+def record(recorder, query, params=None):
+    with recorder.record(query, params):
+        pass
+
+
+def test_recorded_parameters_keep_their_types(tmp_path):
+    path = str(tmp_path / "workload.log.gz")
+    recorder = WorkloadRecorder(path)
+    params = [Decimal("1.10"), datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+              datetime.date(2024, 1, 2), uuid.UUID(int=7), b"\x00\x01", 3, "x", None]
+    record(recorder, "SELECT $1, $2, $3, $4, $5, $6, $7, $8", params)
+    recorder.close()
+
+    [entry] = load_workload(path)
+    assert entry["p"] == params
+    assert entry["t"] > 1_600_000_000
+
+
+def test_unencodable_parameters_are_not_replayed(tmp_path):
+    path = str(tmp_path / "workload.log")
+    recorder = WorkloadRecorder(path)
+    record(recorder, "SELECT $1", [object()])
+    record(recorder, "SELECT 1")
+    recorder.close()
+
+    assert [entry["q"] for entry in load_workload(path)] == ["SELECT 1"]
+
+
+def test_process_logs_are_merged_in_start_order(tmp_path):
+    path = str(tmp_path / "workload.log")
+    first, second = WorkloadRecorder(path), WorkloadRecorder.__new__(WorkloadRecorder)
+    second.path = run_log_path(path, 1, 99)
+    second.file, second.in_flight = open(second.path, "x"), 0
+    record(first, "SELECT 1")
+    record(second, "SELECT 2")
+    record(first, "SELECT 3")
+    first.close()
+    second.close()
+
+    assert first.path != second.path
+    assert [entry["q"] for entry in load_workload(path)] == ["SELECT 1", "SELECT 2", "SELECT 3"]
+    assert [entry["q"] for entry in load_workload(first.path)] == ["SELECT 1", "SELECT 3"]
+
+
+def test_replayed_statements_keep_their_system_time(tmp_path):
+    path = str(tmp_path / "workload.log")
+    recorder = WorkloadRecorder(path)
+    with recorder.record("SELECT * FROM (SELECT * FROM t) AS limited_result LIMIT 1001", None, "'-10s'"):
+        pass
+    recorder.close()
+
+    [entry] = load_workload(path)
+    assert entry["a"] == "'-10s'"
+    assert entry["q"].endswith("LIMIT 1001")